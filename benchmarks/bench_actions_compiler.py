@@ -0,0 +1,75 @@
+"""Benchmark: running the entities.yaml example rule (buero.switch.state on_update)
+
+    Compares the ActionsPhraser (parses the yaml strings on every update)
+    with the CompiledAction (compiled once, evaluated as closure tree).
+    The entity lookups/updates are replaced by dict operations, so only the interpreter cost is measured.
+    The rule uses the nested 'if' form and the temperature is served as string,
+    because the ActionsPhraser cannot handle the sibling 'if' keys and numeric/string comparisons.
+
+    Usage (from the repository root):
+        python -m benchmarks.bench_actions_compiler [updates]
+"""
+
+from purepyhome.modules.actions import actions_phraser, actions_compiler
+from purepyhome.modules.actions.actions_phraser import ActionsPhraser
+from purepyhome.modules.actions.actions_compiler import CompiledAction
+
+import logging
+import sys
+import time
+import types
+
+RULE = [
+    {"set": "$tmp = value"},
+    {"if": {
+        "condition": "$tmp == 'on' AND buero.temperature.temperature < '20'",
+        "then": [{"set": "buero.light.state = 'on'"}],
+        "else": [{"set": "buero.light.state = 'off'"}],
+    }},
+]
+
+STATES = {"buero.temperature.temperature": "18"}
+
+
+def get_entity(entity_id):
+    return types.SimpleNamespace(current_value=STATES[entity_id])
+
+
+def update_entity(sender, entity_id, value, callstack):
+    STATES[entity_id] = value
+
+
+def run_phraser(values: list, logger) -> None:
+    for value in values:
+        phraser = ActionsPhraser()
+        phraser.setup(logger, value, [])
+        phraser.phrase_action(RULE)
+
+
+def run_compiled(values: list, logger) -> None:
+    action = CompiledAction(RULE)
+    for value in values:
+        action.run(logger, value, [])
+
+
+def measure(label: str, run, values: list, logger) -> None:
+    start = time.perf_counter()
+    run(values, logger)
+    elapsed = time.perf_counter() - start
+    print(f'{label}: {len(values) / elapsed:10.0f} updates/sec ({STATES["buero.light.state"]})')
+
+
+if __name__ == '__main__':
+    n_updates = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    for module in (actions_phraser, actions_compiler):
+        module.get_entity = get_entity
+        module.update_entity = update_entity
+
+    logger = logging.getLogger('bench_actions_compiler')
+    logger.setLevel(logging.INFO)
+    values = ['on' if i % 2 else 'off' for i in range(n_updates)]
+
+    print(f'{n_updates} updates')
+    measure('ActionsPhraser (old)', run_phraser, values, logger)
+    measure('CompiledAction      ', run_compiled, values, logger)
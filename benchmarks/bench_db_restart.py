@@ -0,0 +1,102 @@
+"""Benchmark: startup time of a persistent SQLite database with 1M history rows
+
+    Fills a file database (WAL, synchronous=NORMAL, mmap) with 100 numeric entities of 10000 history slots each,
+    then measures a restart: idempotent schema creation, re-registering the entities (state and history are kept)
+    and the first read of an entity and of its history.
+    For comparison the old startup (drop_all + create_all, all history is lost) is measured as well.
+
+    Usage (from the repository root):
+        python -m benchmarks.bench_db_restart [entities] [history_depth]
+"""
+
+from purepyhome.core.db.sqlalchemy import db
+from purepyhome.core.db.entity_db import entity_db
+
+from datetime import datetime, timedelta
+from flask import Flask
+
+import os
+import sys
+import tempfile
+import time
+
+
+def create_app(path: str) -> Flask:
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_size': 5, 'connect_args': {'check_same_thread': False}}
+    app.config['SQLITE_PRAGMAS'] = {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'mmap_size': 268435456}
+    db.init_app(app)
+    entity_db.init_app(app)
+    entity_db.state_cache.clear()
+    entity_db.numeric_history.clear()
+    return app
+
+
+def fill(app: Flask, n_entities: int, depth: int) -> None:
+    with app.app_context():
+        db.create_all()
+    for i in range(n_entities):
+        entity_db.create_entity(f'bench.sensor{i}', 'numeric', depth)
+
+    start = datetime(2024, 1, 1)
+    with app.app_context():
+        connection = db.engine.raw_connection()
+        cursor = connection.cursor()
+        for i in range(n_entities):
+            cursor.executemany('INSERT INTO entity_historic (entity_id, slot, value, timestamp) VALUES (?, ?, ?, ?)',
+                               ((f'bench.sensor{i}', slot, str(20 + slot % 10), str(start + timedelta(seconds=slot))) for slot in range(depth)))
+        cursor.execute('UPDATE entity_data SET history_head = ?, value = ?', (depth, '21.5'))
+        connection.commit()
+        connection.close()
+
+
+def restart(path: str, n_entities: int, depth: int, reset: bool) -> dict:
+    times = {}
+    t0 = time.perf_counter()
+    app = create_app(path)
+    with app.app_context():
+        if reset:
+            db.drop_all()
+        db.create_all()
+    times['schema'] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for i in range(n_entities):
+        entity_db.create_entity(f'bench.sensor{i}', 'numeric', depth)
+    times['register'] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    entity_db.get_entity('bench.sensor0')
+    times['first_get'] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    history = entity_db.get_entity_history('bench.sensor0', output='array')
+    times['first_history'] = time.perf_counter() - t0
+    times['history_len'] = len(history.values) if history is not None else 0
+
+    with app.app_context():
+        db.engine.dispose()
+    return times
+
+
+if __name__ == '__main__':
+    n_entities = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    depth = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'bench.db')
+
+        t0 = time.perf_counter()
+        app = create_app(path)
+        fill(app, n_entities, depth)
+        with app.app_context():
+            db.engine.dispose()
+        print(f'filled {n_entities * depth} history rows in {time.perf_counter() - t0:.1f} s ({os.path.getsize(path) / 1e6:.0f} MB)')
+
+        for label, reset in (('restart (kept history)     ', False), ('drop_all + create_all (old)', True)):
+            times = restart(path, n_entities, depth, reset)
+            print(f'{label}: schema {times["schema"] * 1000:7.1f} ms, register {times["register"] * 1000:7.1f} ms, '
+                  f'first get {times["first_get"] * 1000:5.2f} ms, first history {times["first_history"] * 1000:6.1f} ms '
+                  f'({times["history_len"]} samples)')
@@ -0,0 +1,61 @@
+"""Benchmark: EntityDB updates/sec with and without the in-memory state cache
+
+    Creates a number of numeric entities in an in-memory SQLite database and runs
+    get_entity + update_entity (the same calls core.update_entity does) round robin.
+
+    Usage (from the repository root):
+        python -m benchmarks.bench_entity_state_cache [entities] [updates]
+"""
+
+from purepyhome.core.db.sqlalchemy import db
+from purepyhome.core.db.entity_db import EntityDB
+
+from flask import Flask
+
+import logging
+import sys
+import time
+
+
+def create_app() -> Flask:
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:///:memory:"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def run(use_state_cache: bool, n_entities: int, n_updates: int) -> None:
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+    entity_db = EntityDB(db, use_state_cache=use_state_cache)
+    entity_db.init_app(app)
+
+    entity_ids = [f'bench.sensor_{i}.value' for i in range(n_entities)]
+    for entity_id in entity_ids:
+        entity_db.create_entity(entity_id, 'numeric', 10)
+
+    start = time.perf_counter()
+    for i in range(n_updates):
+        entity_id = entity_ids[i % n_entities]
+        entity_db.get_entity(entity_id)
+        entity_db.update_entity(entity_id, float(i))
+    elapsed = time.perf_counter() - start
+
+    label = 'with state cache   ' if use_state_cache else 'without state cache'
+    print(f'{label}: {n_updates / elapsed:10.1f} updates/sec ({elapsed:.2f} s)')
+    if entity_db.state_cache is not None:
+        print(f'    cache stats: {entity_db.state_cache.stats()}')
+
+
+if __name__ == '__main__':
+    n_entities = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    n_updates = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+
+    logging.getLogger('purepyhome').setLevel(logging.WARNING)
+
+    run(False, n_entities, n_updates)
+    run(True, n_entities, n_updates)
@@ -0,0 +1,82 @@
+"""Benchmark: extracting the mapped keys from zigbee2mqtt JSON payloads
+
+    Compares the old per-key extraction (json.loads + key.split('.') for every mapped key)
+    with parsing the payload once and reading precompiled key paths (json module and orjson, if installed).
+
+    Usage (from the repository root):
+        python -m benchmarks.bench_mqtt_payload_decode [messages]
+"""
+
+from purepyhome.core.utils import get_nested_value, compile_key_path, get_compiled_value, orjson
+
+import json
+import random
+import sys
+import time
+
+
+def create_payload(i: int) -> str:
+    """A zigbee2mqtt payload of a combined climate/plug device (20 mapped fields)"""
+    return json.dumps({
+        "battery": 87 + i % 10,
+        "humidity": 40.5 + i % 7,
+        "linkquality": 120 + i % 50,
+        "power_outage_count": 3,
+        "pressure": 1012.3,
+        "temperature": 21.4 + (i % 30) / 10,
+        "voltage": 2995,
+        "device_temperature": 28,
+        "state": "ON" if i % 2 else "OFF",
+        "power": 12.5 + i % 3,
+        "current": 0.06,
+        "energy": 1.52 + i / 1000,
+        "child_lock": "UNLOCK",
+        "led_disabled_night": False,
+        "power_outage_memory": True,
+        "auto_off": False,
+        "overload_protection": 2300,
+        "color": {"x": 0.3131, "y": 0.3232, "hue": 250 + i % 10, "saturation": 80},
+        "update": {"state": "idle", "installed_version": 12, "latest_version": 12},
+        "last_seen": "2024-05-01T12:00:00+02:00",
+    })
+
+
+KEYS = ["battery", "humidity", "linkquality", "power_outage_count", "pressure", "temperature", "voltage",
+        "device_temperature", "state", "power", "current", "energy", "child_lock", "led_disabled_night",
+        "power_outage_memory", "overload_protection", "color.x", "color.y", "color.hue", "update.state"]
+
+
+def per_key(payloads: list) -> None:
+    for data in payloads:
+        for key in KEYS:
+            get_nested_value(json.loads(data), key)
+
+
+def parse_once(payloads: list, loads) -> None:
+    key_paths = [compile_key_path(key) for key in KEYS]
+    for data in payloads:
+        payload = loads(data)
+        for key_path in key_paths:
+            get_compiled_value(payload, key_path)
+
+
+def measure(label: str, run, payloads: list) -> None:
+    start = time.perf_counter()
+    run(payloads)
+    elapsed = time.perf_counter() - start
+    print(f'{label}: {len(payloads) / elapsed:10.0f} messages/sec')
+
+
+if __name__ == '__main__':
+    n_messages = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+
+    random.seed(1)
+    payloads = [create_payload(random.randrange(1000)) for _ in range(n_messages)]
+
+    print(f'{n_messages} payloads with {len(KEYS)} mapped keys')
+    measure('json.loads per key (old)       ', per_key, payloads)
+    measure('json.loads once + compiled keys', lambda p: parse_once(p, json.loads), payloads)
+    if orjson is not None:
+        measure('orjson once + compiled keys    ', lambda p: parse_once(p, orjson.loads), payloads)
+    else:
+        print('orjson not installed, skipped')
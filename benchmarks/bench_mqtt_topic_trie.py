@@ -0,0 +1,96 @@
+"""Benchmark: routing MQTT messages against registered topic filters
+
+    Registers 5k topic filters (exact topics, + and # wildcards) in a TopicTrie and
+    routes 100k messages, compared to a linear scan that checks every filter per message.
+
+    Usage (from the repository root):
+        python -m benchmarks.bench_mqtt_topic_trie [filters] [messages]
+"""
+
+from purepyhome.modules.mqtt.topic_trie import TopicTrie
+
+import random
+import sys
+import time
+
+
+def linear_match(filters: list, topic: str) -> list:
+    result = []
+    topic_levels = topic.split('/')
+    for topic_filter, filter_levels in filters:
+        for i, level in enumerate(filter_levels):
+            if level == '#':
+                result.append(topic_filter)
+                break
+            if i >= len(topic_levels) or (level != '+' and level != topic_levels[i]):
+                break
+        else:
+            if len(filter_levels) == len(topic_levels):
+                result.append(topic_filter)
+    return result
+
+
+def create_filters(n_filters: int) -> list:
+    filters = set()
+    i = 0
+    while len(filters) < n_filters:
+        device = f'device_{i % (n_filters // 4)}'
+        kind = i % 10
+        if kind < 6:
+            filters.add(f'zigbee2mqtt/{device}/state_{i % 9}')
+        elif kind == 6:
+            filters.add(f'sensors/room_{i % 400}/temperature')
+        elif kind == 7:
+            filters.add(f'zigbee2mqtt/+/state_{i % 50}')
+        elif kind == 8:
+            filters.add(f'sensors/room_{i % 200}/#')
+        else:
+            filters.add(f'home/{device}/+/value')
+        i += 1
+    return sorted(filters)
+
+
+def create_topics(n_messages: int, n_filters: int) -> list:
+    random.seed(42)
+    topics = []
+    for _ in range(n_messages):
+        device = f'device_{random.randrange(n_filters // 4)}'
+        kind = random.randrange(3)
+        if kind == 0:
+            topics.append(f'zigbee2mqtt/{device}/state_{random.randrange(9)}')
+        elif kind == 1:
+            topics.append(f'sensors/room_{random.randrange(300)}/temperature')
+        else:
+            topics.append(f'home/{device}/light/value')
+    return topics
+
+
+if __name__ == '__main__':
+    n_filters = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    n_messages = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+
+    filters = create_filters(n_filters)
+    topics = create_topics(n_messages, n_filters)
+
+    trie = TopicTrie()
+    for topic_filter in filters:
+        trie.add(topic_filter, topic_filter)
+
+    start = time.perf_counter()
+    minimal = trie.minimal_filters()
+    print(f'minimal subscriptions: {len(minimal)} of {len(filters)} filters ({(time.perf_counter() - start) * 1000:.1f} ms)')
+
+    start = time.perf_counter()
+    matches = 0
+    for topic in topics:
+        matches += len(trie.match(topic))
+    elapsed = time.perf_counter() - start
+    print(f'topic trie : {n_messages / elapsed:12.0f} messages/sec ({matches} matches)')
+
+    split_filters = [(topic_filter, topic_filter.split('/')) for topic_filter in filters]
+    n_linear = min(n_messages, 2_000)
+    start = time.perf_counter()
+    for topic in topics[:n_linear]:
+        linear_match(split_filters, topic)
+    elapsed = time.perf_counter() - start
+    print(f'linear scan: {n_linear / elapsed:12.0f} messages/sec (measured on {n_linear} messages)')
@@ -0,0 +1,51 @@
+"""Benchmark: memory footprint and build time of a numeric entity history export
+
+    Compares the list-of-dicts EntityHistoryInfo built from the history table rows
+    (db_entry_history_to_info, one float() parse and one dict per sample) with the
+    columnar float64/int64 arrays exported from a NumericHistoryBuffer.
+
+    Usage (from the repository root):
+        python -m benchmarks.bench_numeric_history_memory [depth]
+"""
+
+from purepyhome.core.db.convert import db_entry_history_to_info
+from purepyhome.core.db.numeric_history import NumericHistoryBuffer, datetime_to_epoch_us
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import sys
+import time
+import tracemalloc
+
+
+def measure(label: str, build) -> None:
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f'{label}: {current / 1024:10.1f} KiB retained, {peak / 1024:10.1f} KiB peak, {elapsed * 1000:8.2f} ms')
+    return result
+
+
+if __name__ == '__main__':
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    now = datetime.now()
+    samples = [(20.0 + (i % 100) / 10, now - timedelta(seconds=i)) for i in range(depth)]
+
+    # rows as they come out of the history table (values stored as strings)
+    rows = [SimpleNamespace(value=str(value), timestamp=timestamp) for value, timestamp in samples]
+    entry_info = SimpleNamespace(entity_id='bench.sensor.value', data_type='numeric', history_depth=depth)
+
+    buffer = NumericHistoryBuffer(depth)
+    for value, timestamp in reversed(samples):
+        buffer.append(value, datetime_to_epoch_us(timestamp))
+
+    print(f'history depth: {depth} samples')
+    measure('list of dicts (EntityHistoryInfo)', lambda: db_entry_history_to_info(rows, entry_info))
+    measure('float64/int64 arrays             ', buffer.to_arrays)
+    print(f'history buffer size: {buffer.nbytes() / 1024:.1f} KiB')
@@ -0,0 +1,94 @@
+"""Benchmark: fan-out of the update_entity signal to the modules
+
+    1000 entities and 10 modules, every module handles the updates of a share of the entities
+    (like the MQTT publisher for the entities with a sink or the actions for the entities triggering rules),
+    half of the entities (sensors without sink and actions) are handled by no module at all.
+    Compares:
+        - broadcast: a blinker signal, every module is called for every update and looks up the entity in its own map
+        - routed: the UpdateDispatcher, only the modules subscribed to the entity are called
+        - routed with patterns: as routed, the modules subscribe to an id pattern (<room>.*) instead of the entity ids
+    Reported are the updates per second over all entities and over the sensor entities only.
+
+    Usage (from the repository root):
+        python -m benchmarks.bench_update_fanout [iterations]
+"""
+
+from purepyhome.core.signals.update_entity import UpdateDispatcher
+
+from blinker import Signal
+
+import sys
+import time
+
+ENTITIES = 1000
+MODULES = 10
+ENTITIES_PER_ROOM = 50
+
+
+class Module:
+    def __init__(self, entity_ids):
+        self.map = {entity_id: True for entity_id in entity_ids}
+        self.handled = 0
+
+    def on_update_entity(self, sender, **kwargs):
+        if kwargs.get('entity_id') in self.map:
+            self.handled += 1
+
+    def on_routed_update_entity(self, sender, **kwargs):
+        self.handled += 1
+
+
+def entity_id(index: int) -> str:
+    return f'room{index // ENTITIES_PER_ROOM}.entity{index}'
+
+
+def module_entities(module: int) -> list:
+    # the first half of the entities are sinks, each module handles the rooms with room % MODULES == module
+    return [entity_id(index) for index in range(ENTITIES // 2) if (index // ENTITIES_PER_ROOM) % MODULES == module]
+
+
+def broadcast(modules):
+    signal = Signal()
+    for module in modules:
+        signal.connect(module.on_update_entity)
+    return signal
+
+
+def routed(modules):
+    dispatcher = UpdateDispatcher('update_entity')
+    for number, module in enumerate(modules):
+        for entity in module_entities(number):
+            dispatcher.subscribe(module.on_routed_update_entity, entity)
+    return dispatcher
+
+
+def routed_patterns(modules):
+    dispatcher = UpdateDispatcher('update_entity')
+    for number, module in enumerate(modules):
+        for room in {entity.split('.')[0] for entity in module_entities(number)}:
+            dispatcher.subscribe_pattern(module.on_routed_update_entity, room + '.*')
+    return dispatcher
+
+
+def measure(signal, entity_ids: list, iterations: int) -> float:
+    send = signal.send
+    start = time.perf_counter()
+    for i in range(iterations):
+        send(None, entity_id=entity_ids[i % len(entity_ids)], value=i, last_value=None, callstack=[])
+    return iterations / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+    all_ids = [entity_id(index) for index in range(ENTITIES)]
+    sensor_ids = all_ids[ENTITIES // 2:]
+
+    for name, build in (('broadcast', broadcast), ('routed', routed), ('routed with patterns', routed_patterns)):
+        modules = [Module(module_entities(number)) for number in range(MODULES)]
+        signal = build(modules)
+        measure(signal, all_ids, len(all_ids))      # warm up (computes the receiver lists)
+
+        all_rate = measure(signal, all_ids, iterations)
+        sensor_rate = measure(signal, sensor_ids, iterations)
+        print(f'{name:22s}: all entities {all_rate:10.0f} updates/s, sensors only {sensor_rate:10.0f} updates/s')
@@ -0,0 +1,76 @@
+"""Benchmark: type correction and database conversion of entity values for all ENTITY_DATA_TYPES
+
+    Runs the full update path of a value (correct -> to_db -> from_db) for every data type:
+        - by type string: check_and_correct_value_type / convert_to_db_str / convert_from_db_str (codec lookup per call)
+        - by codec: the codec resolved once, as kept in the state cache of an entity
+    For the color type the cached color string parsing is compared with the uncached parsing as well.
+    The time, date and trigger types are declared but not implemented, they are listed for completeness.
+
+    Usage (from the repository root):
+        python -m benchmarks.bench_value_codecs [iterations]
+"""
+
+from purepyhome.core.data_types.creation_info import ENTITY_DATA_TYPES
+from purepyhome.core.data_types.codecs import get_value_codec, UnsupportedCodec
+from purepyhome.core.data_types.datatype_correction import check_and_correct_value_type
+from purepyhome.core.data_types.color import color_str_to_rgb_tuple
+from purepyhome.core.db.convert import convert_to_db_str, convert_from_db_str
+
+import sys
+import time
+
+SAMPLE_VALUES = {
+    'string': ['on', 'off', 42],
+    'numeric': ['21.5', 18, 19.25],
+    'bool': ['true', False, 1],
+    'color': ['hsl(120, 100, 50)', 'rgb(0,255,0)', '#00ff00', '20,10,250', (1, 2, 3)],
+}
+
+
+def measure(run, iterations: int) -> float:
+    start = time.perf_counter()
+    run(iterations)
+    return iterations / (time.perf_counter() - start)
+
+
+def by_type_string(data_type: str, values: list):
+    def run(iterations):
+        for i in range(iterations):
+            value = check_and_correct_value_type(values[i % len(values)], data_type)
+            convert_from_db_str(convert_to_db_str(value, data_type), data_type)
+    return run
+
+
+def by_codec(codec, values: list):
+    def run(iterations):
+        correct, to_db, from_db = codec.correct, codec.to_db, codec.from_db
+        for i in range(iterations):
+            from_db(to_db(correct(values[i % len(values)])))
+    return run
+
+
+def color_parsing(parse, values: list):
+    def run(iterations):
+        for i in range(iterations):
+            parse(values[i % len(values)])
+    return run
+
+
+if __name__ == '__main__':
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+    for data_type in ENTITY_DATA_TYPES:
+        codec = get_value_codec(data_type)
+        if isinstance(codec, UnsupportedCodec):
+            print(f'{data_type:8s}: not implemented')
+            continue
+
+        values = SAMPLE_VALUES[data_type]
+        old = measure(by_type_string(data_type, values), iterations)
+        new = measure(by_codec(codec, values), iterations)
+        print(f'{data_type:8s}: by type string {old:10.0f} values/s, by codec {new:10.0f} values/s ({new / old:.2f}x)')
+
+    color_strings = [value for value in SAMPLE_VALUES['color'] if isinstance(value, str)]
+    uncached = measure(color_parsing(color_str_to_rgb_tuple.__wrapped__, color_strings), iterations)
+    cached = measure(color_parsing(color_str_to_rgb_tuple, color_strings), iterations)
+    print(f'color parsing: uncached {uncached:10.0f} strings/s, cached {cached:10.0f} strings/s ({cached / uncached:.2f}x)')
@@ -1,17 +1,24 @@
 from .logger import get_logger
 
 from .data_types.creation_info import EntityCreationInfo, check_entity_creation_info
-from .data_types.state_info import EntityStateInfo, EntityHistoryInfo
-from .data_types.datatype_correction import check_and_correct_value_type
+from .data_types.state_info import EntityStateInfo, EntityHistoryInfo, EntityHistorySeries
 
 from .signals.register_entity import _register_entity
 from .signals.update_entity import _update_entity
 from .signals.remove_entity import _remove_entity
 from .db.entity_db import entity_db
+from .update_coalescer import UpdateCoalescer
+from .tracing import tracer
+
+from datetime import datetime
+from itertools import count
 
 
 logger = get_logger()
 
+# sequence number of the committed updates (passed as seq with the update_entity signal, increasing over all entities)
+_update_seq = count(1)
+
 def create_entity(new_entity: EntityCreationInfo) -> None:
     """Creates an entity in the database and emits the register_entity signal
         The Function checks the EntityCreationInfo for errors before creating the entity.
@@ -29,52 +36,156 @@ def create_entity(new_entity: EntityCreationInfo) -> None:
         return
 
     entity_db.create_entity(new_entity.entity_id, new_entity.data_type, new_entity.history_depth)
+    update_coalescer.configure(new_entity.entity_id, new_entity.coalesce_ms, new_entity.min_delta)
 
     _register_entity.send(None, new_entity=new_entity)
     
 
-def update_entity(sender: str, entity_id: str, value, callstack: list) -> None:
+def update_entity(sender: str, entity_id: str, value, callstack: list) -> int:
     """Updates an entity value in the database and emits the update_entity signal.
-        It uses the callstack to prevent infinite loops.
-        It also checks if the entity exists.
+        It checks if the entity exists.
+        (Loops between actions are rejected when the actions are registered, see the actions rule engine.)
         The Function accepts the value in any type and tries to convert it to the correct type if possible/needed.
+        Updates of entities with coalesce_ms/min_delta set may be merged or dropped (see update_coalescer).
 
     Args:
         sender (str): The sender requesting the update
         entity_id (str): The entity id
         value (any): The new value 
-        callstack (list): The callstack to prevent infinite loops
+        callstack (list): The senders that led to this update (the sender is appended before emitting the signal)
+    Returns:
+        int: The sequence number of the committed update, None if the update was invalid, suppressed or deferred
+    """
+
+    logger.debug('Updating entity %s with value %s', entity_id, value)
+
+    update = _prepare_update(entity_id, value)
+    if update is None:
+        return None
+
+    corr_value, current_value = update
+    if _is_filtered(sender, entity_id, corr_value, current_value, callstack):
+        return None
+
+    started = tracer.start()
+    entity_db.update_entity(entity_id, corr_value)
+    seq = next(_update_seq)
+    tracer.stop('db.write', started)
+    
+    callstack.append(sender)
+    _update_entity.send(None, entity_id=entity_id, value=corr_value, last_value=current_value, callstack=callstack, seq=seq)
+    return seq
+
+
+def update_entities(sender: str, updates: list, callstack: list) -> None:
+    """Updates several entity values in a single database transaction and emits the update_entity signal for each of them.
+        Works like update_entity, but is meant for sources that update multiple entities at once (e.g. one MQTT payload).
+
+    Args:
+        sender (str): The sender requesting the update
+        updates (list): A list of (entity_id, value) tuples
+        callstack (list): The senders that led to this update (the sender is appended before emitting the signal)
     Returns:
         None
     """
 
-    logger.info(f'Updating entity {entity_id} with value {value}')
+    logger.debug('Updating %d entities', len(updates))
+
+    prepared = []
+    for entity_id, value in updates:
+        update = _prepare_update(entity_id, value)
+        if update is not None and not _is_filtered(sender, entity_id, *update, callstack):
+            prepared.append((entity_id, *update))
 
-    # check for circular reference
-    if sender in callstack:
-        logger.error(f'Error: Circular reference detected: {callstack}')
+    if not prepared:
         return
 
+    started = tracer.start()
+    entity_db.update_many([(entity_id, corr_value) for entity_id, corr_value, _ in prepared])
+    seqs = [next(_update_seq) for _ in prepared]
+    tracer.stop('db.write', started)
+
+    callstack.append(sender)
+    for (entity_id, corr_value, current_value), seq in zip(prepared, seqs):
+        _update_entity.send(None, entity_id=entity_id, value=corr_value, last_value=current_value, callstack=list(callstack), seq=seq)
+
+
+def _prepare_update(entity_id: str, value) -> tuple:
+    """Checks that the entity exists and corrects the value type for an update
+
+    Args:
+        entity_id (str): The entity id
+        value (any): The new value
+    Returns:
+        update (tuple): (corrected value, current value) or None if the update is invalid
+    """
+
     # get the entity from the database
     entity = entity_db.get_entity(entity_id)
 
     # check if the entity exists
     if entity is None:
         logger.error(f'Error: Entity {entity_id} not found')
-        return
+        return None
     
     # correct the value type if needed
     try:
-        corr_value = check_and_correct_value_type(value, entity.data_type)
+        corr_value = entity.codec.correct(value)
     except ValueError as e:
         logger.error(f'Error: {e}')
+        return None
+
+    return corr_value, entity.current_value
+
+
+def _is_filtered(sender: str, entity_id: str, corr_value, current_value, callstack: list) -> bool:
+    """Applies the deadband (min_delta) and coalescing (coalesce_ms) settings of an entity to an update
+
+    Args:
+        sender (str): The sender requesting the update
+        entity_id (str): The entity id
+        corr_value (any): The new (type corrected) value
+        current_value (any): The current value of the entity
+        callstack (list): The callstack of the update
+    Returns:
+        bool: True if the update must not be committed now (suppressed or deferred by the coalescer)
+    """
+
+    if update_coalescer.is_suppressed(entity_id, corr_value, current_value):
+        logger.debug('Update of entity %s suppressed (below min_delta)', entity_id)
+        return True
+
+    if update_coalescer.defer(sender, entity_id, corr_value, list(callstack)):
+        logger.debug('Update of entity %s coalesced', entity_id)
+        return True
+
+    return False
+
+
+def _commit_coalesced_update(sender: str, entity_id: str, value, callstack: list) -> None:
+    """Commits the latest value of a coalesced burst of updates (called by the update_coalescer when the window ends)
+
+    Args:
+        sender (str): The sender of the latest update
+        entity_id (str): The entity id
+        value (any): The latest (type corrected) value
+        callstack (list): The callstack of the latest update
+    Returns:
+        None
+    """
+
+    entity = entity_db.get_entity(entity_id)
+    if entity is None:
         return
 
-    current_value = entity.current_value
-    entity_db.update_entity(entity_id, corr_value)
-    
+    entity_db.update_entity(entity_id, value)
+    seq = next(_update_seq)
+
     callstack.append(sender)
-    _update_entity.send(None, entity_id=entity_id, value=corr_value, last_value=current_value, callstack=callstack)
+    _update_entity.send(None, entity_id=entity_id, value=value, last_value=entity.current_value, callstack=callstack, seq=seq)
+
+
+update_coalescer = UpdateCoalescer(_commit_coalesced_update)
 
 
 def remove_entity(entity_id: str) -> None:
@@ -87,6 +198,8 @@ def remove_entity(entity_id: str) -> None:
     """
 
     entity_db.remove_entity(entity_id)
+    update_coalescer.remove(entity_id)
+    _update_entity.remove_entity(entity_id)
 
     _remove_entity.send(None, entity_id=entity_id)
 
@@ -104,14 +217,35 @@ def get_entity(entity_id: str) -> EntityStateInfo:
     return entity_db.get_entity(entity_id)
 
 
-def get_entity_history(entity_id: str) -> EntityHistoryInfo:
-    """Gets the history of an entity from the database
+def get_entity_history(entity_id: str, output: str = 'info', since: datetime = None, until: datetime = None, limit: int = None) -> EntityHistoryInfo:
+    """Gets the history of an entity from the database, optionally only a time window of it
         (Wrapper for the entity_db.get_entity_history function)
 
     Args:
         entity_id (str): The entity id
+        output (str): 'info' (default), or 'array'/'numpy' to get the history of a numeric entity as EntityHistoryArrays
+        since (datetime): Only entries with a timestamp >= since (optional)
+        until (datetime): Only entries with a timestamp <= until (optional)
+        limit (int): The maximum number of (newest) entries (optional)
     Returns:
         history (EntityHistoryInfo): The info about the entities history
     """
 
-    return entity_db.get_entity_history(entity_id)
+    return entity_db.get_entity_history(entity_id, output=output, since=since, until=until, limit=limit)
+
+
+
+def get_entity_history_downsampled(entity_id: str, since: datetime, until: datetime = None, max_points: int = 500) -> EntityHistorySeries:
+    """Gets a time window of the history of a numeric entity reduced to a point budget (eg. for charts)
+        (Wrapper for the entity_db.get_entity_history_downsampled function)
+
+    Args:
+        entity_id (str): The entity id
+        since (datetime): The start of the window
+        until (datetime): The end of the window (default: now)
+        max_points (int): The maximum number of points (default 500)
+    Returns:
+        series (EntityHistorySeries): The downsampled history (raw samples or 1 min / 1 h / 1 day buckets)
+    """
+
+    return entity_db.get_entity_history_downsampled(entity_id, since, until=until, max_points=max_points)
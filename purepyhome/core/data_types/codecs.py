@@ -0,0 +1,186 @@
+from purepyhome.core.data_types.creation_info import ENTITY_DATA_TYPES
+from purepyhome.core.data_types.color import color_str_to_rgb_tuple
+
+from abc import ABC, abstractmethod
+
+"""This file provides the value codecs of the entity data types
+    A codec bundles the type correction of new values and the conversion to/from the database string of one data type.
+    The codec of an entity is resolved once (when the entity is created or loaded) and kept with its cached state,
+    so an update does not need to walk the type string through if/elif chains.
+"""
+
+class ValueCodec(ABC):
+    """ValueCodec class
+        Base class of the value codecs
+
+        Attributes:
+            data_type: The data type handled by the codec
+            default: The value used if the database holds no value
+
+        Functions:
+            correct: Checks the type of a value and corrects it if needed and possible
+            to_db: Converts a (corrected) value to the database string
+            from_db: Converts a database string to a value
+    """
+
+    data_type = None
+    default = None
+
+    @abstractmethod
+    def correct(self, value):
+        ...
+
+    @abstractmethod
+    def to_db(self, value) -> str:
+        ...
+
+    @abstractmethod
+    def from_db(self, value):
+        ...
+
+
+class StringCodec(ValueCodec):
+    data_type = 'string'
+    default = ''
+
+    def correct(self, value):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            return value
+        return str(value)
+
+    def to_db(self, value) -> str:
+        if isinstance(value, str):
+            return value
+        raise ValueError(f'Value {value} not of type string')
+
+    def from_db(self, value):
+        if value is None:
+            return self.default
+        return value
+
+
+class NumericCodec(ValueCodec):
+    data_type = 'numeric'
+    default = 0.0
+
+    def correct(self, value):
+        if value is None:
+            return None
+        if isinstance(value, (int, float)):
+            return value
+        if isinstance(value, str):
+            return float(value)
+        raise ValueError(f'Value {value} not of type numeric and cannot be converted')
+
+    def to_db(self, value) -> str:
+        if isinstance(value, str):
+            value = float(value)
+        if isinstance(value, (float, int)):
+            return str(float(value))
+        raise ValueError(f'Value {value} not of type numeric')
+
+    def from_db(self, value):
+        if value is None:
+            return self.default
+        return float(value)
+
+
+class BoolCodec(ValueCodec):
+    data_type = 'bool'
+    default = False
+
+    TRUE_STRINGS = frozenset(('true', '1', 't', 'y', 'yes'))
+
+    def correct(self, value):
+        if value is None:
+            return None
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str):
+            return value.lower() in self.TRUE_STRINGS
+        if isinstance(value, int):
+            return value == 1
+        raise ValueError(f'Value {value} not of type bool and cannot be converted')
+
+    def to_db(self, value) -> str:
+        if isinstance(value, bool):
+            return "True" if value else "False"
+        raise ValueError(f'Value {value} not of type bool')
+
+    def from_db(self, value):
+        if value is None:
+            return self.default
+        return value == "True"
+
+
+class ColorCodec(ValueCodec):
+    data_type = 'color'
+    default = (0, 0, 0)
+
+    def correct(self, value):
+        if value is None:
+            return None
+        if isinstance(value, tuple) and len(value) == 3 and all(isinstance(x, int) for x in value):
+            return value
+        if isinstance(value, str):
+            return color_str_to_rgb_tuple(value)
+        raise ValueError(f'Value {value} not of type color and cannot be converted')
+
+    def to_db(self, value) -> str:
+        if isinstance(value, tuple) and len(value) == 3 and all(isinstance(i, int) for i in value):
+            return f'{value[0]},{value[1]},{value[2]}'
+        raise ValueError(f'Value {value} not of type color (tuple of 3 ints)')
+
+    def from_db(self, value):
+        if value is None:
+            return self.default
+        return tuple(int(x) for x in value.split(','))
+
+
+class UnsupportedCodec(ValueCodec):
+    """Codec of the data types that are declared but not implemented yet (time, date, trigger)
+        The time type raises NotImplementedError, the others ValueError (as before the codecs).
+    """
+
+    def __init__(self, data_type: str):
+        self.data_type = data_type
+
+    def __raise(self):
+        if self.data_type == 'time':
+            raise NotImplementedError('Time type not implemented')
+        raise ValueError(f'Type {self.data_type} not implemented')
+
+    def correct(self, value):
+        if value is None:
+            return None
+        self.__raise()
+
+    def to_db(self, value) -> str:
+        self.__raise()
+
+    def from_db(self, value):
+        self.__raise()
+
+
+VALUE_CODECS = {codec.data_type: codec for codec in (StringCodec(), NumericCodec(), BoolCodec(), ColorCodec())}
+for _data_type in ENTITY_DATA_TYPES:
+    VALUE_CODECS.setdefault(_data_type, UnsupportedCodec(_data_type))
+
+
+def get_value_codec(data_type: str) -> ValueCodec:
+    """Gets the codec of a data type
+
+    Args:
+        data_type (str): The data type (one of ENTITY_DATA_TYPES)
+    Returns:
+        ValueCodec: The codec of the data type
+    Raises:
+        ValueError: If the data type is unknown
+    """
+
+    codec = VALUE_CODECS.get(data_type)
+    if codec is None:
+        raise ValueError(f'Type {data_type} not in {ENTITY_DATA_TYPES}')
+    return codec
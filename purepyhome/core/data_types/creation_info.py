@@ -38,6 +38,9 @@ class EntityCreationInfo:
 
     actions: dict
 
+    coalesce_ms: int = 0                # merge updates arriving within this window into one update carrying the latest value (0 = off)
+    min_delta: float = 0.0              # numeric entities: drop updates that differ less than this from the current value (0 = off)
+
 
 def check_entity_creation_info(entity_creation_info: EntityCreationInfo):
 
@@ -62,6 +65,15 @@ def check_entity_creation_info(entity_creation_info: EntityCreationInfo):
     if entity_creation_info.history_depth < 0:
         raise ValueError(f'Invalid history depth: {entity_creation_info.history_depth}')
     
+    if not isinstance(entity_creation_info.coalesce_ms, int) or entity_creation_info.coalesce_ms < 0:
+        raise ValueError(f'Invalid coalesce_ms: {entity_creation_info.coalesce_ms}')
+
+    if not isinstance(entity_creation_info.min_delta, (int, float)) or entity_creation_info.min_delta < 0:
+        raise ValueError(f'Invalid min_delta: {entity_creation_info.min_delta}')
+
+    if entity_creation_info.min_delta > 0 and entity_creation_info.data_type != 'numeric':
+        raise ValueError(f'min_delta is only supported for numeric entities')
+    
     if entity_creation_info.data_source.source_type not in ENTITY_DATA_SOURCE_TYPES:
         raise ValueError(f'Invalid data source type: {entity_creation_info.data_source.source_type}')
     
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 @dataclass
 class EntityStateInfo:
@@ -10,6 +10,8 @@ class EntityStateInfo:
     last_value: any                     # the last value of the entity
     timestamp: int                      # the timestamp of the last value
 
+    codec: any = field(default=None, repr=False, compare=False)  # the value codec of the data type (see data_types.codecs)
+
 
 @dataclass
 class EntityHistoryInfo:
@@ -18,4 +20,27 @@ class EntityHistoryInfo:
     data_type: str                      # the type of data: string, numeric, bool, color, time, date, trigger
 
     history: list                       # a list of historical values
-    history_depth: int                  # the number of historical values to keep
\ No newline at end of file
+    history_depth: int                  # the number of historical values to keep
+
+
+@dataclass
+class EntityHistoryArrays:
+    entity_id: str                      # a unique string identifier for the entity
+
+    data_type: str                      # the type of data (always numeric)
+
+    values: any                         # the historical values as float64 array (array.array('d') or numpy.ndarray), newest first
+    timestamps: any                     # the timestamps as int64 epoch microseconds (array.array('q') or numpy.ndarray), newest first
+    history_depth: int                  # the number of historical values to keep
+
+
+@dataclass
+class EntityHistorySeries:
+    entity_id: str                      # a unique string identifier for the entity
+
+    resolution: int                     # the bucket size in seconds (0 for raw samples)
+
+    timestamps: any                     # the timestamps (bucket starts) as int64 epoch microseconds (array.array('q')), oldest first
+    values: any                         # the mean value of each bucket (the value for raw samples) as float64 array, oldest first
+    mins: any                           # the minimum value of each bucket as float64 array, oldest first (a copy of values for raw samples)
+    maxs: any                           # the maximum value of each bucket as float64 array, oldest first (a copy of values for raw samples)
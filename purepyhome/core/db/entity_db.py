@@ -1,39 +1,79 @@
 from purepyhome.core.logger import get_logger
 
-from purepyhome.core.data_types.state_info import EntityStateInfo, EntityHistoryInfo
+from purepyhome.core.data_types.state_info import EntityStateInfo, EntityHistoryInfo, EntityHistoryArrays, EntityHistorySeries
+from purepyhome.core.data_types.codecs import get_value_codec
 
 from .sqlalchemy import db
-from .models import EntityData, EntityHistoric
-from .convert import convert_to_db_str, db_entry_to_info, db_entries_to_id_list, db_entry_history_to_info
+from .models import EntityData, EntityHistoric, EntityRollup
+from .convert import convert_from_db_str, db_entry_to_info, db_entries_to_id_list, db_entry_history_to_info
+from .state_cache import EntityStateCache, CachedEntityState
+from .numeric_history import NumericHistoryBuffer, datetime_to_epoch_us
+from .rollup import ROLLUP_RESOLUTIONS, RollupBucket, rollup_bucket_start, lttb_indices
+from purepyhome.core.tracing import tracer
 
+from sqlalchemy import bindparam, update
+
+from array import array
 from datetime import datetime
 from contextlib import contextmanager
+import threading
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 logger = get_logger()
 
+# prebuilt statement for the rollup updates (one per resolution on every numeric update), avoids building an ORM query each time
+_UPDATE_ROLLUP = update(EntityRollup.__table__) \
+    .where(EntityRollup.__table__.c.entity_id == bindparam('b_entity_id'),
+           EntityRollup.__table__.c.resolution == bindparam('b_resolution'),
+           EntityRollup.__table__.c.bucket == bindparam('b_bucket')) \
+    .values(min=bindparam('min'), max=bindparam('max'), sum=bindparam('sum'), count=bindparam('count'))
+
 class EntityDB:
     """EntityDB class
         It handles the temporary storage of entity states
+        The current states are kept in an in-memory state cache, the database rows are written through on every update
 
         Attributes:
             db: SQLAlchemy database object used to interact with the database
             app: Flask app object
+            state_cache: In-memory cache of the current entity states (None if disabled)
+            numeric_history: Columnar in-memory history buffers of the numeric entities (loaded on first use)
+            rollups: The open rollup buckets of the numeric entities (entity id -> resolution -> RollupBucket)
 
         Functions:
             init_app: Initialize the app object
             @contextmanager __current_app_context: Context manager for the app object
+            @contextmanager unit_of_work: Groups all database writes inside the block into a single transaction
             create_entity: Create an entity in the database
             update_entity: Update an entity in the database
+            update_many: Update several entities in a single transaction
+            remove_entity: Remove an entity from the database
             get_entity: Get an entity from the database
             get_all_entity_ids: Get all entity ids from the database
             get_all_entity_history: Get all entities from the database
-            __add_entity_history: Add an entity to the history table
-            __purge_entity_history: Cleans up the history table for an entity
+            get_entity_history: Get the history (or a time window of it) of an entity, optionally as float64/int64 arrays
+            __get_entity_history_range: Get a time window of the history of an entity from the database
+            get_entity_history_downsampled: Get a time window of the history of a numeric entity reduced to a point budget
+            __write_entity_update: Writes the new value and the history entry of an entity (without committing)
+            __add_entity_history: Writes a value into the history ring buffer of an entity
+            __update_rollups: Adds a value to the rollup buckets of a numeric entity
+            __commit: Commits the session, unless a unit of work is active
+            __get_numeric_history: Gets (or loads) the columnar history buffer of a numeric entity
+            __cache_entity: Adds the state of a database entry to the state cache
     """
 
-    def __init__(self, db):
+    def __init__(self, db, use_state_cache: bool = True):
         self.db = db
         self.app = None
+        self.state_cache = EntityStateCache() if use_state_cache else None
+        self.numeric_history = {}
+        self.rollups = {}
+        self._unit_of_work = threading.local()
+        self._write_lock = threading.Lock()
 
 
     def init_app(self, app):
@@ -44,10 +84,15 @@ class EntityDB:
 
     @contextmanager
     def __current_app_context(self):
+
+        # inside a unit of work the app context (and session) is already active,
+        # errors are handled (and the transaction rolled back) by the unit of work
+        if getattr(self._unit_of_work, 'depth', 0) > 0:
+            yield
+            return
         
         if self.app is None:
-            logger.error("Flask app not initialized")
-            return
+            raise RuntimeError('Flask app not initialized')
 
         try:
             with self.app.app_context():
@@ -57,8 +102,54 @@ class EntityDB:
             return
 
 
+    @contextmanager
+    def unit_of_work(self):
+        """Context manager that groups all database writes inside the with block into a single transaction
+            The session is committed once when the outermost unit of work is left. 
+            If an error occurs the transaction is rolled back and the touched entities are dropped from the state cache,
+            so they get reloaded from the database on the next access.
+            Units of work can be nested, the inner ones join the outer transaction.
+            Raises a RuntimeError if the app is not initialized.
+            The units of work of different threads run one after another (SQLite has a single writer anyway),
+            so concurrent updates of an entity do not read the same cached state and history slot.
+        """
+
+        if getattr(self._unit_of_work, 'depth', 0) > 0:
+            self._unit_of_work.depth += 1
+            try:
+                yield
+            finally:
+                self._unit_of_work.depth -= 1
+            return
+
+        if self.app is None:
+            raise RuntimeError('Flask app not initialized')
+
+        with self._write_lock:
+            self._unit_of_work.touched = set()
+            try:
+                with self.app.app_context():
+                    self._unit_of_work.depth = 1
+                    try:
+                        yield
+                        self.db.session.commit()
+                    except Exception as e:
+                        self.db.session.rollback()
+                        for entity_id in self._unit_of_work.touched:
+                            self.numeric_history.pop(entity_id, None)
+                            self.rollups.pop(entity_id, None)
+                            if self.state_cache is not None:
+                                self.state_cache.remove(entity_id)
+                        logger.error(f'Error working on db, transaction rolled back: {e}')
+            finally:
+                self._unit_of_work.depth = 0
+                self._unit_of_work.touched = set()
+
+
     def create_entity(self, entity_id: str, data_type: str, history_depth: int) -> None:
         """Create an entity in the database
+            If the entity already exists (persistent database), its state and history are kept.
+            If the data type changed the state and history are reset, if only the history depth changed the history is reset.
         
         Args:
             entity_id (str): The entity id
@@ -69,15 +160,40 @@ class EntityDB:
         """
 
         with self.__current_app_context():
-            entity = EntityData(entity_id=entity_id, data_type=data_type, history_depth=history_depth)
-            self.db.session.add(entity)
-            self.db.session.commit()
-            
-        logger.info(f'Created db entity {entity_id}')
+            entity = EntityData.query.filter_by(entity_id=entity_id).first()
+            new_history = True
+
+            if entity is None:
+                entity = EntityData(entity_id=entity_id, data_type=data_type, history_depth=history_depth)
+                self.db.session.add(entity)
+                logger.info(f'Created db entity {entity_id}')
+            elif entity.data_type != data_type or entity.history_depth != history_depth:
+                if entity.data_type != data_type:
+                    entity.value = None
+                    entity.last_value = None
+                EntityHistoric.query.filter_by(entity_id=entity_id).delete()
+                EntityRollup.query.filter_by(entity_id=entity_id).delete()
+                entity.data_type = data_type
+                entity.history_depth = history_depth
+                entity.history_head = 0
+                logger.info(f'Reset db entity {entity_id} (data type or history depth changed)')
+            else:
+                new_history = False
+                logger.info(f'Loaded existing db entity {entity_id}')
+
+            self.__commit()
+            self.__cache_entity(entity)
+
+            # an existing history is loaded into the columnar buffer on first use
+            self.numeric_history.pop(entity_id, None)
+            self.rollups.pop(entity_id, None)
+            if new_history and data_type == 'numeric' and history_depth > 0:
+                self.numeric_history[entity_id] = NumericHistoryBuffer(history_depth)
 
 
     def update_entity(self, entity_id: str, new_value: any) -> None:
         """Update an entity in the database
+            The new value and the history entry are written in a single transaction
         
         Args:
             entity_id (str): The entity id
@@ -86,30 +202,49 @@ class EntityDB:
             None
         """
 
-        with self.__current_app_context():
-            entity = EntityData.query.filter_by(entity_id=entity_id).first()
-            if entity:
-                entity_data_type = entity.data_type
-                new_value = convert_to_db_str(new_value, entity_data_type)
-                old_value = entity.value
-                old_timestamp = entity.timestamp
-                history_depth = entity.history_depth
-
-                entity.value = new_value
-                entity.timestamp = datetime.now()
-            else:
-                logger.error(f'Entity {entity_id} not found')
+        with self.unit_of_work():
+            self.__write_entity_update(entity_id, new_value)
 
-            self.db.session.commit()
 
-        self.__add_entity_history(entity_id, old_value, old_timestamp)
-        self.__purge_entity_history(entity_id, history_depth)
-        
-        logger.info(f'Updated db entity {entity_id} with value {new_value}')
+    def update_many(self, updates: list) -> None:
+        """Update several entities in the database in a single transaction
+
+        Args:
+            updates (list): A list of (entity_id, new_value) tuples
+        Returns:
+            None
+        """
+
+        with self.unit_of_work():
+            for entity_id, new_value in updates:
+                self.__write_entity_update(entity_id, new_value)
+
+
+    def remove_entity(self, entity_id: str) -> None:
+        """Remove an entity and its history from the database
+
+        Args:
+            entity_id (str): The entity id
+        Returns:
+            None
+        """
+
+        if self.state_cache is not None:
+            self.state_cache.remove(entity_id)
+        self.numeric_history.pop(entity_id, None)
+        self.rollups.pop(entity_id, None)
+
+        with self.__current_app_context():
+            EntityHistoric.query.filter_by(entity_id=entity_id).delete()
+            EntityRollup.query.filter_by(entity_id=entity_id).delete()
+            EntityData.query.filter_by(entity_id=entity_id).delete()
+            self.__commit()
+
+        logger.info(f'Removed db entity {entity_id}')
 
 
     def get_entity(self, entity_id) -> EntityStateInfo:
-        """Get an entity from the database
+        """Get an entity from the state cache (or the database if the entity is not cached)
             
         Args:
             entity_id (str): The entity id
@@ -117,9 +252,15 @@ class EntityDB:
             entity (EntityStateInfo): The info about the entities current state
         """
 
+        if self.state_cache is not None:
+            entity = self.state_cache.get_info(entity_id)
+            if entity:
+                return entity
+
         with self.__current_app_context():
             entity = EntityData.query.filter_by(entity_id=entity_id).first()
             if entity:
+                self.__cache_entity(entity)
                 return db_entry_to_info(entity)
             else:
                 logger.error(f'Entity {entity_id} not found')
@@ -160,44 +301,363 @@ class EntityDB:
                 return None
 
 
-    def __add_entity_history(self, entity_id: str, value: str, timestamp: datetime):
-        """Add an entity to the history table
-        
+    def get_entity_history(self, entity_id: str, output: str = 'info', since: datetime = None, until: datetime = None, limit: int = None):
+        """Get the history of an entity, optionally only a time window of it (newest first)
+            The window is read with a range scan on the (entity_id, timestamp) index.
+            For numeric entities the history can be returned as columnar arrays (newest first),
+            which are served from the in-memory history buffer without building a dict per sample.
+
+        Args:
+            entity_id (str): The entity id
+            output (str): 'info' for an EntityHistoryInfo, 'array' for array.array buffers or 'numpy' for numpy arrays
+            since (datetime): Only entries with a timestamp >= since (optional)
+            until (datetime): Only entries with a timestamp <= until (optional)
+            limit (int): The maximum number of (newest) entries (optional)
+        Returns:
+            history (EntityHistoryInfo | EntityHistoryArrays): The entity history
+        """
+
+        if limit is not None and (not isinstance(limit, int) or limit < 0):
+            raise ValueError(f'Invalid history limit: {limit}')
+
+        if output == 'info':
+            if since is None and until is None and limit is None:
+                return self.get_all_entity_history(entity_id)
+            return self.__get_entity_history_range(entity_id, since, until, limit)
+
+        if output not in ('array', 'numpy'):
+            raise ValueError(f'Invalid history output: {output}')
+
+        if output == 'numpy' and numpy is None:
+            raise ImportError('NumPy is required for the numpy history output')
+
+        buffer = self.__get_numeric_history(entity_id)
+        if buffer is None:
+            logger.error(f'Entity {entity_id} has no numeric history')
+            return None
+
+        values, timestamps = buffer.to_arrays(since=None if since is None else datetime_to_epoch_us(since),
+                                              until=None if until is None else datetime_to_epoch_us(until),
+                                              limit=limit)
+        if output == 'numpy':
+            values = numpy.frombuffer(values, dtype=numpy.float64)
+            timestamps = numpy.frombuffer(timestamps, dtype=numpy.int64)
+
+        return EntityHistoryArrays(entity_id=entity_id,
+                                   data_type='numeric',
+                                   values=values,
+                                   timestamps=timestamps,
+                                   history_depth=buffer.capacity
+                                   )
+
+
+    def __get_entity_history_range(self, entity_id: str, since: datetime, until: datetime, limit: int) -> EntityHistoryInfo:
+        """Gets a time window of the history of an entity from the database (indexed range scan, newest first)
+
+        Args:
+            entity_id (str): The entity id
+            since (datetime): Only entries with a timestamp >= since (None for no lower bound)
+            until (datetime): Only entries with a timestamp <= until (None for no upper bound)
+            limit (int): The maximum number of (newest) entries (None for no limit)
+        Returns:
+            history (EntityHistoryInfo): The entity history info (the history list may be empty)
+        """
+
+        with self.__current_app_context():
+            entry_info = EntityData.query.filter_by(entity_id=entity_id).first()
+            if entry_info is None:
+                logger.error(f'Entity {entity_id} not found')
+                return None
+
+            query = EntityHistoric.query.filter_by(entity_id=entity_id)
+            if since is not None:
+                query = query.filter(EntityHistoric.timestamp >= since)
+            if until is not None:
+                query = query.filter(EntityHistoric.timestamp <= until)
+            query = query.order_by(EntityHistoric.timestamp.desc())
+            if limit is not None:
+                query = query.limit(limit)
+
+            return db_entry_history_to_info(query.all(), entry_info)
+
+
+    def get_entity_history_downsampled(self, entity_id: str, since: datetime, until: datetime = None, max_points: int = 500) -> EntityHistorySeries:
+        """Get a time window of the history of a numeric entity, reduced to at most max_points points (oldest first)
+            The raw samples are used if they cover the whole window, otherwise the finest rollup resolution
+            whose number of buckets fits the point budget. If there are still more points than max_points,
+            they are reduced with the LTTB algorithm.
+
+        Args:
+            entity_id (str): The entity id
+            since (datetime): The start of the window
+            until (datetime): The end of the window (default: now)
+            max_points (int): The point budget (>= 3)
+        Returns:
+            series (EntityHistorySeries): The downsampled history, or None if the entity has no numeric history
+        """
+
+        if not isinstance(max_points, int) or max_points < 3:
+            raise ValueError(f'Invalid point budget: {max_points}')
+        if until is None:
+            until = datetime.now()
+
+        buffer = self.__get_numeric_history(entity_id)
+        if buffer is None:
+            logger.error(f'Entity {entity_id} has no numeric history')
+            return None
+
+        # the raw samples can be used if the buffer holds the complete history or reaches back to the start of the window
+        raw_covers = len(buffer) < buffer.capacity or buffer.oldest_timestamp() <= datetime_to_epoch_us(since)
+
+        if raw_covers:
+            values, timestamps = buffer.to_arrays(since=datetime_to_epoch_us(since), until=datetime_to_epoch_us(until))
+            values.reverse()
+            timestamps.reverse()
+
+            # the history holds the previous values, the current value completes the series
+            # (an entity with an empty history was never updated, its value is the default with the creation time of the row)
+            entity = self.get_entity(entity_id) if len(buffer) > 0 else None
+            if entity is not None and entity.timestamp is not None and since <= entity.timestamp <= until:
+                values.append(entity.current_value)
+                timestamps.append(datetime_to_epoch_us(entity.timestamp))
+            resolution, mins, maxs = 0, array('d', values), array('d', values)
+        else:
+            window = (until - since).total_seconds()
+            resolution = next((r for r in ROLLUP_RESOLUTIONS if window / r <= max_points), max(ROLLUP_RESOLUTIONS))
+
+            with self.__current_app_context():
+                rows = self.db.session.query(EntityRollup.bucket, EntityRollup.min, EntityRollup.max, EntityRollup.sum, EntityRollup.count) \
+                                      .filter(EntityRollup.entity_id == entity_id,
+                                              EntityRollup.resolution == resolution,
+                                              EntityRollup.bucket >= rollup_bucket_start(since, resolution),
+                                              EntityRollup.bucket <= until) \
+                                      .order_by(EntityRollup.bucket.asc()).all()
+
+            timestamps = array('q', (datetime_to_epoch_us(row[0]) for row in rows))
+            values = array('d', (row[3] / row[4] for row in rows))
+            mins = array('d', (row[1] for row in rows))
+            maxs = array('d', (row[2] for row in rows))
+
+        if len(timestamps) > max_points:
+            indices = lttb_indices(timestamps, values, max_points)
+            timestamps = array('q', (timestamps[i] for i in indices))
+            mins = array('d', (mins[i] for i in indices))
+            maxs = array('d', (maxs[i] for i in indices))
+            values = array('d', (values[i] for i in indices))
+
+        return EntityHistorySeries(entity_id=entity_id,
+                                   resolution=resolution,
+                                   timestamps=timestamps,
+                                   values=values,
+                                   mins=mins,
+                                   maxs=maxs
+                                   )
+
+
+    def __write_entity_update(self, entity_id: str, new_value: any) -> None:
+        """Writes the new value and the history entry of an entity (without committing)
+            Must be called inside a unit of work
+
+        Args:
+            entity_id (str): The entity id
+            new_value (any): The new value of the entity
+        Returns:
+            None
+        """
+
+        timestamp = datetime.now()
+        cached = self.state_cache.get(entity_id) if self.state_cache is not None else None
+
+        if cached:
+            # the cache knows the current state, so the row can be updated without reading it first
+            self._unit_of_work.touched.add(entity_id)
+            data_type, codec = cached.data_type, cached.codec
+            new_value = codec.to_db(new_value)
+            old_value, old_timestamp, old_current_value = cached.db_value, cached.timestamp, cached.current_value
+            history_depth, history_head = cached.history_depth, cached.history_head
+            new_history_head = history_head + 1 if history_depth > 0 else history_head
+            
+            EntityData.query.filter_by(entity_id=entity_id).update({'value': new_value, 
+                                                                    'last_value': old_value, 
+                                                                    'history_head': new_history_head,
+                                                                    'timestamp': timestamp})
+
+            cached.last_value = cached.current_value
+            cached.current_value = codec.from_db(new_value)
+            cached.db_value = new_value
+            cached.history_head = new_history_head
+            cached.timestamp = timestamp
+        else:
+            entity = EntityData.query.filter_by(entity_id=entity_id).first()
+            if entity is None:
+                logger.error(f'Entity {entity_id} not found')
+                return
+
+            data_type, codec = entity.data_type, get_value_codec(entity.data_type)
+            new_value = codec.to_db(new_value)
+            old_value, old_timestamp = entity.value, entity.timestamp
+            old_current_value = codec.from_db(old_value)
+            history_depth, history_head = entity.history_depth, entity.history_head
+
+            if history_depth > 0:
+                entity.history_head += 1
+            entity.last_value = entity.value
+            entity.value = new_value
+            entity.timestamp = timestamp
+            self.__cache_entity(entity)
+            self._unit_of_work.touched.add(entity_id)
+
+        if history_depth > 0:
+            started = tracer.start()
+            self.__add_entity_history(entity_id, old_value, old_timestamp, history_depth, history_head)
+
+            # keep the columnar history in sync (if it is not loaded yet, it is loaded from the table on first use)
+            if data_type == 'numeric' and entity_id in self.numeric_history:
+                self.numeric_history[entity_id].append(old_current_value, datetime_to_epoch_us(old_timestamp))
+
+            if data_type == 'numeric':
+                self.__update_rollups(entity_id, codec.from_db(new_value), timestamp)
+
+            tracer.stop('db.history', started)
+
+        logger.debug('Updated db entity %s with value %s', entity_id, new_value)
+
+
+    def __add_entity_history(self, entity_id: str, value: str, timestamp: datetime, history_depth: int, history_head: int):
+        """Writes a value into the history ring buffer of an entity (without committing)
+            The slot history_head % history_depth is inserted while the buffer fills up and overwritten afterwards,
+            so adding a value (and dropping the oldest one) is a single statement
+
         Args:
             entity_id (str): The entity id
             value (str): The value of the entity
             timestamp (datetime): The timestamp of the entity
+            history_depth (int): The history depth of the entity
+            history_head (int): The number of history entries written so far
         Returns:
             None
         """
 
-        with self.__current_app_context():
-            entity = EntityHistoric(entity_id=entity_id, value=value, timestamp=timestamp)
-            self.db.session.add(entity)
-            self.db.session.commit()
+        slot = history_head % history_depth
+
+        updated = 0
+        if history_head >= history_depth:
+            updated = EntityHistoric.query.filter_by(entity_id=entity_id, slot=slot).update({'value': value, 'timestamp': timestamp})
+        if not updated:
+            self.db.session.add(EntityHistoric(entity_id=entity_id, slot=slot, value=value, timestamp=timestamp))
             
-        logger.info(f'Added db entity history {entity_id}')
+        logger.debug('Added db entity history %s', entity_id)
 
 
-    def __purge_entity_history(self, entity_id: str, history_depth: int):
-        """Cleans up the history table for an entity so that only the last history_depth entries are kept
-        
+    def __update_rollups(self, entity_id: str, value: float, timestamp: datetime) -> None:
+        """Adds a value to the 1 min / 1 h / 1 day rollup buckets of a numeric entity (without committing)
+            The open bucket of each resolution is kept in memory, so adding a value is a single (prebuilt) UPDATE per resolution.
+            When a new bucket is opened, the buckets older than the retention of the resolution are deleted.
+
         Args:
             entity_id (str): The entity id
-            history_depth (int): The history depth of the entity
+            value (float): The new value
+            timestamp (datetime): The timestamp of the new value
         Returns:
             None
         """
 
-        with self.__current_app_context():
-            entity = EntityHistoric.query.filter_by(entity_id=entity_id).order_by(EntityHistoric.timestamp.desc()).all()
-            if entity:
-                if len(entity) > history_depth:
-                    for i in range(history_depth, len(entity)):
-                        self.db.session.delete(entity[i])
-                        self.db.session.commit()
+        buckets = self.rollups.setdefault(entity_id, {})
+
+        for resolution, retention in ROLLUP_RESOLUTIONS.items():
+            start = rollup_bucket_start(timestamp, resolution)
+            bucket = buckets.get(resolution)
+
+            if bucket is None or bucket.start != start:
+                # the bucket may already be stored (eg. after a restart)
+                row = EntityRollup.query.filter_by(entity_id=entity_id, resolution=resolution, bucket=start).first()
+                if row is not None:
+                    bucket = RollupBucket(start=start, min=row.min, max=row.max, sum=row.sum, count=row.count, stored=True)
+                else:
+                    bucket = RollupBucket(start=start, min=value, max=value, sum=0.0, count=0, stored=False)
+                    if retention is not None:
+                        EntityRollup.query.filter(EntityRollup.entity_id == entity_id,
+                                                  EntityRollup.resolution == resolution,
+                                                  EntityRollup.bucket < start - retention).delete()
+                buckets[resolution] = bucket
+
+            bucket.add(value)
+
+            if bucket.stored:
+                self.db.session.execute(_UPDATE_ROLLUP, {'b_entity_id': entity_id, 'b_resolution': resolution, 'b_bucket': start,
+                                                         'min': bucket.min, 'max': bucket.max, 'sum': bucket.sum, 'count': bucket.count})
             else:
-                logger.error(f'Entity {entity_id} not found in history table')
+                self.db.session.add(EntityRollup(entity_id=entity_id, resolution=resolution, bucket=start,
+                                                 min=bucket.min, max=bucket.max, sum=bucket.sum, count=bucket.count))
+                # the prebuilt UPDATE is a Core statement and does not autoflush, so the row is inserted now
+                # (otherwise a second value in the same unit of work would update nothing and the first values would be committed)
+                self.db.session.flush()
+                bucket.stored = True
+
+
+    def __commit(self) -> None:
+        """Commits the session, unless a unit of work is active (then the unit of work commits when it is left)
+        """
+
+        if getattr(self._unit_of_work, 'depth', 0) > 0:
+            return
+        self.db.session.commit()
+
+
+    def __get_numeric_history(self, entity_id: str) -> NumericHistoryBuffer:
+        """Gets the columnar history buffer of a numeric entity, loads it from the history table if needed
+
+        Args:
+            entity_id (str): The entity id
+        Returns:
+            buffer (NumericHistoryBuffer): The history buffer, or None if the entity is not numeric or keeps no history
+        """
+
+        buffer = self.numeric_history.get(entity_id)
+        if buffer is not None:
+            return buffer
+
+        with self.__current_app_context():
+            entity = EntityData.query.filter_by(entity_id=entity_id).first()
+            if entity is None or entity.data_type != 'numeric' or entity.history_depth <= 0:
+                return None
+
+            rows = self.db.session.query(EntityHistoric.value, EntityHistoric.timestamp) \
+                                  .filter_by(entity_id=entity_id) \
+                                  .order_by(EntityHistoric.timestamp.asc()).all()
+
+            buffer = NumericHistoryBuffer(entity.history_depth)
+            for value, timestamp in rows:
+                buffer.append(convert_from_db_str(value, 'numeric'), datetime_to_epoch_us(timestamp))
+
+            self.numeric_history[entity_id] = buffer
+            return buffer
+
+
+    def __cache_entity(self, entity: EntityData) -> None:
+        """Adds the state of a database entry to the state cache (if the cache is enabled)
+
+        Args:
+            entity (EntityData): The database entry
+        Returns:
+            None
+        """
+
+        if self.state_cache is None:
+            return
+
+        codec = get_value_codec(entity.data_type)
+        self.state_cache.put(CachedEntityState(entity_id=entity.entity_id,
+                                               data_type=entity.data_type,
+                                               history_depth=entity.history_depth,
+                                               history_head=entity.history_head,
+                                               current_value=codec.from_db(entity.value),
+                                               last_value=codec.from_db(entity.last_value),
+                                               db_value=entity.value,
+                                               timestamp=entity.timestamp,
+                                               codec=codec
+                                               ))
+
 
     def dbg_printout_db(self):
         """Prints out the database contents
@@ -212,7 +672,7 @@ class EntityDB:
             histories = EntityHistoric.query.all()
             logger.info(f'Histories: {len(histories)}')
             for history in histories:
-                logger.info(f'History: {history.entity_id} = {history.value} @{history.timestamp}')
+                logger.info(f'History: {history.entity_id}[{history.slot}] = {history.value} @{history.timestamp}')
             logger.info(f'=========    End of database contents    =========')
 
 
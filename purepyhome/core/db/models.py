@@ -5,6 +5,10 @@ from sqlalchemy.sql import func
 """This file provides the EntityData and EntityHistoric model for the SQLAlchemy DB
     The EntityData model and table is used to store the current state and metadata of an entity
     The EntityHistoric model and table is used to store the historic values of an entity
+        The history of an entity is a ring buffer of history_depth slots, EntityData.history_head counts the written entries
+        so the next slot to (over)write is history_head % history_depth
+        The (entity_id, timestamp) index serves the history queries (ordered by timestamp, optionally limited to a time range)
+    The EntityRollup model and table is used to store the aggregated history of numeric entities (see rollup.py)
 """
 
 class EntityData(db.Model):
@@ -18,6 +22,7 @@ class EntityData(db.Model):
     value = db.Column(db.String(80), nullable=True)
     last_value = db.Column(db.String(80), nullable=True)
     history_depth = db.Column(db.Integer, nullable=False)
+    history_head = db.Column(db.Integer, nullable=False, default=0)
 
     timestamp = db.Column(db.DateTime(timezone=True), server_default=func.now())
 
@@ -33,8 +38,12 @@ class EntityHistoric(db.Model):
     """
 
     __tablename__ = 'entity_historic'
+    __table_args__ = (db.UniqueConstraint('entity_id', 'slot'),
+                      db.Index('ix_entity_historic_entity_id_timestamp', 'entity_id', 'timestamp'))
+
     id = db.Column(db.Integer, primary_key=True)
-    entity_id = db.Column(db.String(80), unique=True, nullable=False)
+    entity_id = db.Column(db.String(80), nullable=False)
+    slot = db.Column(db.Integer, nullable=False)
     value = db.Column(db.String(80), nullable=True)
 
     timestamp = db.Column(db.DateTime(timezone=True))
@@ -42,4 +51,27 @@ class EntityHistoric(db.Model):
     def __repr__(self):
         """EntityHistoric model representation
         """
-        return f'<Historic of {self.entity_id} = {self.value} @{self.timestamp}>'
\ No newline at end of file
+        return f'<Historic of {self.entity_id} = {self.value} @{self.timestamp}>'
+
+class EntityRollup(db.Model):
+    """EntityRollup model for SQLAlchemy DB
+        The min/max/sum/count of the values of a numeric entity within a time bucket (1 min, 1 h or 1 day)
+    """
+
+    __tablename__ = 'entity_rollup'
+    __table_args__ = (db.UniqueConstraint('entity_id', 'resolution', 'bucket'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    entity_id = db.Column(db.String(80), nullable=False)
+    resolution = db.Column(db.Integer, nullable=False)
+    bucket = db.Column(db.DateTime(timezone=True), nullable=False)
+
+    min = db.Column(db.Float, nullable=False)
+    max = db.Column(db.Float, nullable=False)
+    sum = db.Column(db.Float, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        """EntityRollup model representation
+        """
+        return f'<Rollup of {self.entity_id} [{self.resolution}s @{self.bucket}] = {self.sum / self.count if self.count else None}>'
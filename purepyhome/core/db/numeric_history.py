@@ -0,0 +1,117 @@
+from array import array
+from datetime import datetime
+
+import bisect
+import math
+
+"""This file provides the columnar in-memory history buffer for numeric entities
+    The values are stored as float64 and the timestamps as int64 epoch microseconds in array.array buffers,
+    so exporting a history does not need to parse strings or build one dict per sample.
+"""
+
+def datetime_to_epoch_us(timestamp: datetime) -> int:
+    """Converts a datetime to epoch microseconds (None -> 0)
+
+    Args:
+        timestamp (datetime): The timestamp
+    Returns:
+        int: The timestamp in microseconds since the epoch
+    """
+
+    if timestamp is None:
+        return 0
+    return int(timestamp.timestamp() * 1_000_000)
+
+
+class NumericHistoryBuffer:
+    """NumericHistoryBuffer class
+        A fixed capacity ring buffer of (float64 value, int64 timestamp) samples
+
+        Attributes:
+            capacity: The maximum number of samples (the history depth)
+            values: array('d') holding the values, in ring buffer order
+            timestamps: array('q') holding the epoch microsecond timestamps, in ring buffer order
+            head: The number of samples appended so far
+
+        Functions:
+            append: Appends a sample, overwriting the oldest one if the buffer is full
+            to_arrays: Returns the samples as arrays, newest first
+            oldest_timestamp: Returns the timestamp of the oldest sample
+            nbytes: Returns the memory used by the sample buffers
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.values = array('d', bytes(8 * capacity))
+        self.timestamps = array('q', bytes(8 * capacity))
+        self.head = 0
+
+
+    def __len__(self) -> int:
+        return min(self.head, self.capacity)
+
+
+    def append(self, value: float, timestamp: int) -> None:
+        """Appends a sample, overwriting the oldest one if the buffer is full
+
+        Args:
+            value (float): The value (None is stored as NaN)
+            timestamp (int): The timestamp in epoch microseconds
+        Returns:
+            None
+        """
+
+        slot = self.head % self.capacity
+        self.values[slot] = math.nan if value is None else value
+        self.timestamps[slot] = timestamp
+        self.head += 1
+
+
+    def to_arrays(self, since: int = None, until: int = None, limit: int = None) -> tuple:
+        """Returns the samples as arrays, newest first (same order as the history table queries)
+            The time window is found by bisecting the timestamps (the samples are appended in time order)
+
+        Args:
+            since (int): Only samples with a timestamp >= since, in epoch microseconds (optional)
+            until (int): Only samples with a timestamp <= until, in epoch microseconds (optional)
+            limit (int): The maximum number of (newest) samples (optional)
+        Returns:
+            tuple: (values array('d'), timestamps array('q'))
+        """
+
+        count = len(self)
+        if count < self.capacity:
+            values = self.values[:count]
+            timestamps = self.timestamps[:count]
+        else:
+            split = self.head % self.capacity
+            values = self.values[split:] + self.values[:split]
+            timestamps = self.timestamps[split:] + self.timestamps[:split]
+
+        if since is not None or until is not None or limit is not None:
+            start = 0 if since is None else bisect.bisect_left(timestamps, since)
+            end = len(timestamps) if until is None else bisect.bisect_right(timestamps, until)
+            if limit is not None:
+                start = max(start, end - limit)
+            values = values[start:end]
+            timestamps = timestamps[start:end]
+
+        values.reverse()
+        timestamps.reverse()
+        return values, timestamps
+
+
+    def oldest_timestamp(self) -> int:
+        """Returns the timestamp of the oldest sample in epoch microseconds (None if the buffer is empty)
+        """
+
+        if self.head == 0:
+            return None
+        return self.timestamps[0 if self.head <= self.capacity else self.head % self.capacity]
+
+
+    def nbytes(self) -> int:
+        """Returns the memory used by the sample buffers in bytes
+        """
+
+        return self.values.itemsize * len(self.values) + self.timestamps.itemsize * len(self.timestamps)
@@ -0,0 +1,104 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+"""This file provides the helpers of the history rollups of numeric entities
+    For every numeric entity that keeps a history, the min/max/sum/count of its values are aggregated
+    into buckets of 1 minute, 1 hour and 1 day. The buckets are updated incrementally with every update,
+    so a chart over a long time range reads a few hundred buckets instead of scanning the raw samples.
+    Long ranges are reduced to a point budget with the Largest-Triangle-Three-Buckets (LTTB) algorithm.
+"""
+
+# bucket size in seconds -> how long the buckets are kept (None = forever)
+ROLLUP_RESOLUTIONS = {60: timedelta(days=7),
+                      3600: timedelta(days=365),
+                      86400: None
+                      }
+
+
+@dataclass
+class RollupBucket:
+    start: datetime                     # the start of the bucket
+    min: float
+    max: float
+    sum: float
+    count: int
+    stored: bool                        # whether the bucket row exists in the database
+
+
+    def add(self, value: float) -> None:
+        """Adds a value to the aggregates of the bucket
+        """
+
+        if self.count == 0:
+            self.min = value
+            self.max = value
+        else:
+            self.min = min(self.min, value)
+            self.max = max(self.max, value)
+        self.sum += value
+        self.count += 1
+
+
+def rollup_bucket_start(timestamp: datetime, resolution: int) -> datetime:
+    """Returns the start of the bucket a timestamp belongs to (aligned to local minutes, hours and days)
+
+    Args:
+        timestamp (datetime): The timestamp
+        resolution (int): The bucket size in seconds (one of ROLLUP_RESOLUTIONS)
+    Returns:
+        datetime: The start of the bucket
+    """
+
+    if resolution == 60:
+        return timestamp.replace(second=0, microsecond=0)
+    if resolution == 3600:
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    if resolution == 86400:
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f'Invalid rollup resolution: {resolution}')
+
+
+def lttb_indices(xs, ys, threshold: int) -> list:
+    """Selects the indices of the points kept by the Largest-Triangle-Three-Buckets downsampling
+
+    Args:
+        xs: The x values (timestamps), ascending
+        ys: The y values
+        threshold (int): The number of points to keep (>= 3)
+    Returns:
+        list: The indices of the kept points (ascending, always including the first and last point)
+    """
+
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    indices = [0]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+
+    for i in range(threshold - 2):
+        # the average point of the next bucket is the third corner of the triangles
+        next_start = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        next_count = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / next_count
+        avg_y = sum(ys[next_start:next_end]) / next_count
+
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        ax, ay = xs[a], ys[a]
+
+        max_area = -1.0
+        selected = start
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > max_area:
+                max_area = area
+                selected = j
+
+        indices.append(selected)
+        a = selected
+
+    indices.append(n - 1)
+    return indices
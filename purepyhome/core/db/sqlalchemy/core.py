@@ -1,14 +1,40 @@
-
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+
+import re
 
 class PurePyHomeSQLAlchemy(SQLAlchemy):
     """ Custom SQLAlchemy class for PurePyHome
 
-    This class is a custom Wrapper around the SQLAlchemy class. 
+    This class is a custom Wrapper around the SQLAlchemy class.
     It can be used to add custom functionality to the SQLAlchemy class if needed.
+
+    For SQLite databases the pragmas in app.config['SQLITE_PRAGMAS'] (eg. journal_mode: WAL, synchronous: NORMAL, mmap_size)
+    are set on every new connection of the pool.
     """
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-db = PurePyHomeSQLAlchemy()
\ No newline at end of file
+
+    def init_app(self, app) -> None:
+        super().init_app(app)
+
+        pragmas = app.config.get('SQLITE_PRAGMAS', {})
+        for name, value in pragmas.items():
+            if not re.fullmatch(r'[a-z_]+', str(name)) or not re.fullmatch(r'[A-Za-z0-9_-]+', str(value)):
+                raise ValueError(f'Invalid SQLite pragma: {name} = {value}')
+
+        with app.app_context():
+            engine = self.engine
+            if engine.dialect.name == 'sqlite' and pragmas:
+                event.listen(engine, 'connect', lambda dbapi_connection, connection_record: _set_sqlite_pragmas(dbapi_connection, pragmas))
+
+
+def _set_sqlite_pragmas(dbapi_connection, pragmas: dict) -> None:
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
+
+db = PurePyHomeSQLAlchemy()
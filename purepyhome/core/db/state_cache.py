@@ -0,0 +1,138 @@
+from purepyhome.core.data_types.state_info import EntityStateInfo
+from purepyhome.core.data_types.codecs import ValueCodec
+
+from dataclasses import dataclass
+from datetime import datetime
+
+"""This file provides the in-memory state cache used by the EntityDB
+    The cache holds the current state of every known entity, so that reads and updates
+    do not need to query the SQL database. The SQL rows are written through by the EntityDB.
+"""
+
+@dataclass
+class CachedEntityState:
+    entity_id: str                      # a unique string identifier for the entity
+
+    data_type: str                      # the type of data: string, numeric, bool, color, time, date, trigger
+    history_depth: int                  # the number of historical values to keep
+    history_head: int                   # the number of historical values written so far (next ring buffer slot = head % depth)
+
+    current_value: any                  # the current value of the entity
+    last_value: any                     # the last value of the entity
+    db_value: str                       # the current value as stored in the database (used for the history)
+    timestamp: datetime                 # the timestamp of the current value
+
+    codec: ValueCodec                   # the value codec of the data type (resolved once when the entity is cached)
+
+
+class EntityStateCache:
+    """EntityStateCache class
+        It keeps the current state of all entities in a dict, keyed by the entity id
+
+        Attributes:
+            entries: A dictionary that maps entity ids to CachedEntityState objects
+            hits: Number of lookups that were served from the cache
+            misses: Number of lookups that were not found in the cache
+
+        Functions:
+            put: Adds or replaces the state of an entity
+            get: Gets the cached state entry of an entity
+            get_info: Gets the cached state of an entity as EntityStateInfo
+            remove: Removes an entity from the cache
+            clear: Removes all entities from the cache
+            stats: Returns the hit/miss counters of the cache
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+
+    def put(self, entry: CachedEntityState) -> None:
+        """Adds or replaces the state of an entity
+
+        Args:
+            entry (CachedEntityState): The state of the entity
+        Returns:
+            None
+        """
+
+        self.entries[entry.entity_id] = entry
+
+
+    def get(self, entity_id: str) -> CachedEntityState:
+        """Gets the cached state entry of an entity and updates the hit/miss counters
+
+        Args:
+            entity_id (str): The entity id
+        Returns:
+            entry (CachedEntityState): The cached state, or None if the entity is not cached
+        """
+
+        entry = self.entries.get(entity_id)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+
+    def get_info(self, entity_id: str) -> EntityStateInfo:
+        """Gets the cached state of an entity as EntityStateInfo
+
+        Args:
+            entity_id (str): The entity id
+        Returns:
+            entity (EntityStateInfo): The info about the entities current state, or None if the entity is not cached
+        """
+
+        entry = self.get(entity_id)
+        if entry is None:
+            return None
+
+        return EntityStateInfo(entity_id=entry.entity_id,
+                               data_type=entry.data_type,
+                               current_value=entry.current_value,
+                               last_value=entry.last_value,
+                               timestamp=entry.timestamp,
+                               codec=entry.codec
+                               )
+
+
+    def remove(self, entity_id: str) -> None:
+        """Removes an entity from the cache
+
+        Args:
+            entity_id (str): The entity id
+        Returns:
+            None
+        """
+
+        self.entries.pop(entity_id, None)
+
+
+    def clear(self) -> None:
+        """Removes all entities from the cache and resets the counters
+        """
+
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+    def stats(self) -> dict:
+        """Returns the hit/miss counters of the cache
+
+        Args:
+            None
+        Returns:
+            stats (dict): size, hits, misses and hit_ratio of the cache
+        """
+
+        lookups = self.hits + self.misses
+        return {'size': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0
+                }
@@ -1,4 +1,7 @@
+import atexit
 import logging
+import logging.handlers
+import queue
 
 LOG_LEVEL_COLORS = {
     logging.DEBUG: '\033[94m',    # Blue
@@ -18,90 +21,135 @@ LOGGER_COLORS = {
 }
 
 
+DEFAULT_LOGGING_CONFIG = {'level': 'INFO',            # level of all loggers without an own level
+                          'levels': {'sqlalchemy': 'WARNING'},   # logger name -> level (eg. purepyhome.module.mqtt_subscriber: WARNING)
+                          'queue': True              # write the log output from a background thread (QueueHandler/QueueListener)
+                          }
+
+_console_handler = None     # the handler writing to the console (formats the records)
+_root_handler = None        # the handler attached to the root logger (the console handler or a QueueHandler)
+_queue_listener = None      # the listener passing the queued records to the console handler
+
+
 class PurePyHomeLoggerFormatter(logging.Formatter):
     """ Custom logging formatter for PurePyHome
-
+        The colored prefix is built once per logger name and level.
     """
 
+    def __init__(self):
+        super().__init__()
+        self.prefixes = {}
+
+
     def format(self, record):
-        log_level_color = LOG_LEVEL_COLORS.get(record.levelno, '\033[0m')
-
-        if record.name.startswith('purepyhome'):
-            logger_name_color = LOGGER_COLORS['purepyhome']
-        else:
-            logger_name_color = LOGGER_COLORS.get(record.name, '\033[0m')
-        
-        formatted_message = f"{logger_name_color}[{record.name}]{log_level_color}[{record.levelname}]\033[0m {record.msg}"
+        prefix = self.prefixes.get((record.name, record.levelno))
+        if prefix is None:
+            log_level_color = LOG_LEVEL_COLORS.get(record.levelno, '\033[0m')
+
+            if record.name.startswith('purepyhome'):
+                logger_name_color = LOGGER_COLORS['purepyhome']
+            else:
+                logger_name_color = LOGGER_COLORS.get(record.name, '\033[0m')
+
+            prefix = f"{logger_name_color}[{record.name}]{log_level_color}[{record.levelname}]\033[0m "
+            self.prefixes[(record.name, record.levelno)] = prefix
+
+        formatted_message = prefix + record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            formatted_message += '\n' + record.exc_text
         return formatted_message
 
 
-def setup_logger():
+def setup_logger(log_config: dict = None):
     """Setup the logger for PurePyHome
+        All log records are passed to a console handler on the root logger. With 'queue' enabled the handler
+        only puts the records into a queue, a QueueListener thread formats and writes them, so the threads
+        handling messages never block on the console.
+        Can be called again (eg. once the config file is loaded), the previous setup is replaced.
     
     Args:
-        None
+        log_config (dict): The logging section of the config file (see DEFAULT_LOGGING_CONFIG)
     Returns:
         None
     """
-    
-    # Setup logging: create console handler
-    console_handler = logging.StreamHandler()
 
-    # Set global log level
-    console_handler.setLevel(logging.DEBUG)
+    global _console_handler, _root_handler, _queue_listener
 
-    # Set custom formatter
-    console_handler.setFormatter(PurePyHomeLoggerFormatter())
+    log_config = {**DEFAULT_LOGGING_CONFIG, **(log_config or {})}
+    levels = {**DEFAULT_LOGGING_CONFIG['levels'], **(log_config.get('levels') or {})}
 
+    # check the levels before the previous setup is replaced
+    root_level = _get_level(log_config['level'])
+    levels = {name: _get_level(level) for name, level in levels.items()}
 
-    # ROOT logger
     root_logger = logging.getLogger()
-    root_logger.setLevel(logging.DEBUG)
-    root_logger.addHandler(console_handler)
-
-    # Flask logger
-    app_logger = logging.getLogger('app')
-    app_logger.setLevel(logging.DEBUG)
-    app_logger.addHandler(console_handler)
-
-    # Application logger
-    application_logger = logging.getLogger('purepyhome')
-    application_logger.setLevel(logging.DEBUG)
-    application_logger.addHandler(console_handler)
-
-    # Eventlet logger
-    eventlet_wsgi_logger = logging.getLogger('eventlet.wsgi')
-    eventlet_wsgi_logger.setLevel(logging.DEBUG)
-    eventlet_wsgi_logger.addHandler(console_handler)
-
-    eventlet_wsgi_http_logger = logging.getLogger('eventlet.wsgi.http')
-    eventlet_wsgi_http_logger.setLevel(logging.DEBUG)
-    eventlet_wsgi_http_logger.addHandler(console_handler)
-
-    # Imported Flask modules
-    mqtt_logger = logging.getLogger('flask_mqtt')
-    mqtt_logger.setLevel(logging.DEBUG)
-    mqtt_logger.addHandler(console_handler)
-
-    socketio_logger = logging.getLogger('socketio')
-    socketio_logger.setLevel(logging.DEBUG)
-    socketio_logger.addHandler(console_handler)
-
-    sqlalchemy_logger = logging.getLogger('sqlalchemy')
-    sqlalchemy_logger.setLevel(logging.WARNING)
-    sqlalchemy_logger.addHandler(console_handler)
-
-    app_logger.propagate = False
-    application_logger.propagate = False
-    eventlet_wsgi_logger.propagate = False
-    eventlet_wsgi_http_logger.propagate = False
-    mqtt_logger.propagate = False
-    socketio_logger.propagate = False
-    sqlalchemy_logger.propagate = False
+
+    # remove a previous setup
+    _stop_queue_listener()
+    if _root_handler is not None:
+        root_logger.removeHandler(_root_handler)
+
+    # Setup logging: create console handler with the custom formatter
+    _console_handler = logging.StreamHandler()
+    _console_handler.setFormatter(PurePyHomeLoggerFormatter())
+
+    if log_config.get('queue'):
+        log_queue = queue.Queue(-1)      # (not SimpleQueue, its blocking get is not patched by eventlet)
+        _root_handler = logging.handlers.QueueHandler(log_queue)
+        _queue_listener = logging.handlers.QueueListener(log_queue, _console_handler, respect_handler_level=True)
+        _queue_listener.start()
+    else:
+        _root_handler = _console_handler
+
+    # ROOT logger: all loggers propagate to it
+    root_logger.setLevel(root_level)
+    root_logger.addHandler(_root_handler)
+
+    # per logger levels
+    for name in ('app', 'purepyhome', 'eventlet.wsgi', 'eventlet.wsgi.http', 'flask_mqtt', 'socketio', 'sqlalchemy'):
+        logger = logging.getLogger(name)
+        logger.setLevel(logging.NOTSET)
+        logger.propagate = True
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level)
+
+
+@atexit.register
+def _stop_queue_listener() -> None:
+    """Stops the queue listener (writes the queued records), called on exit and when the logger is set up again
+    """
+
+    global _queue_listener
+
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
+
+
+def _get_level(level) -> int:
+    """Gets a log level from its name (eg. 'INFO') or number
+
+    Args:
+        level (str | int): The log level
+    Returns:
+        int: The log level
+    Raises:
+        ValueError: If the level is unknown
+    """
+
+    if isinstance(level, int):
+        return level
+    level_no = logging.getLevelName(str(level).upper())
+    if not isinstance(level_no, int):
+        raise ValueError(f'Unknown log level: {level}')
+    return level_no
 
 
 def get_logger() -> logging.Logger:
     """Get the main logger for PurePyHome
+        The level is set by setup_logger (from the logging section of the config file)
 
     Args:
         None
@@ -109,9 +157,7 @@ def get_logger() -> logging.Logger:
         logging.Logger: The main logger for PurePyHome
     """
 
-    logger = logging.getLogger('purepyhome')
-    logger.setLevel(logging.DEBUG)
-    return logger
+    return logging.getLogger('purepyhome')
 
 
 def get_module_logger(module_name: str) -> logging.Logger:
@@ -126,6 +172,4 @@ def get_module_logger(module_name: str) -> logging.Logger:
 
     logger_name = f'purepyhome.module.{module_name}'
 
-    logger = logging.getLogger(logger_name)
-    logger.setLevel(logging.DEBUG)
-    return logger
\ No newline at end of file
+    return logging.getLogger(logger_name)
@@ -0,0 +1,269 @@
+from purepyhome.core.logger import get_logger
+from purepyhome.core.tracing import tracer
+
+from concurrent.futures import ThreadPoolExecutor
+
+import threading
+import time
+
+try:
+    from eventlet import GreenPool
+except ImportError:
+    GreenPool = None
+
+logger = get_logger()
+
+"""This file provides the pool the update_entity receivers are run on concurrently (see UpdateDispatcher)
+    The receivers of an update are started together on the pool and the sender waits until all of them are done,
+    but at most the timeout of each receiver, so an update takes as long as its slowest receiver instead of the sum.
+    A receiver that raises is logged and does not affect the others. A receiver that times out is logged and keeps
+    running, the next update of the same entity for this receiver waits until it is done (order per entity and receiver),
+    but not beyond its own timeout: then it is skipped and counted as timed out, so a hanging receiver holds one worker only.
+    Updates sent from a pool worker (eg. by an action) run their receivers directly on the worker, so the pool
+    can not run out of workers waiting for each other. They are ordered after the running calls of the same receiver
+    and entity as well, but wait at most the receiver timeout (and not for a call the worker is running itself).
+"""
+
+RECEIVER_POOL_MODES = ["serial", "threads", "green"]
+
+
+class _ReceiverCall:
+    """A receiver call running on the pool
+    """
+
+    __slots__ = ('receiver', 'deadline', 'previous', 'skipped', 'done')
+
+    def __init__(self, receiver, deadline, previous):
+        self.receiver = receiver
+        self.deadline = deadline
+        self.previous = previous
+        self.skipped = False
+        self.done = threading.Event()
+
+
+class ReceiverPool:
+    """ReceiverPool class
+        It runs the receivers of a signal concurrently on a ThreadPoolExecutor or an eventlet GreenPool
+
+        Attributes:
+            mode: The pool type: threads or green
+            workers: The number of workers
+            timeout: The default receiver timeout in seconds
+            timeouts: A dictionary that maps receiver names (<class>.<method>) to their timeout in seconds
+            inflight: A dictionary that maps (receiver, entity id) to the latest not finished call
+
+        Functions:
+            run: Runs the receivers of an update and waits until they are done (or timed out)
+            run_inline: Runs the receivers of an update sent from a pool worker on the worker
+            in_worker: Checks if the current thread is a pool worker
+            stats: Returns the number of calls, errors and timeouts
+            shutdown: Stops the pool (waits for the running calls)
+            __spawn: Starts a function on the pool
+            __call: Runs a receiver on a worker
+            __run_call: Runs a receiver after the previous call of the receiver for the same entity
+    """
+
+    def __init__(self, mode: str = 'threads', workers: int = 8, timeout_ms: int = 1000, timeouts_ms: dict = None):
+        if mode not in ["threads", "green"]:
+            raise ValueError(f'Receiver pool mode {mode} not in ["threads", "green"]')
+        if mode == "green" and GreenPool is None:
+            raise ValueError(f'Receiver pool mode green requires eventlet')
+        if workers < 1:
+            raise ValueError(f'Receiver pool workers must be at least 1')
+
+        self.mode = mode
+        self.workers = workers
+        self.timeout = timeout_ms / 1000
+        self.timeouts = {name: ms / 1000 for name, ms in (timeouts_ms or {}).items()}
+        self.inflight = {}
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._calls = 0
+        self._errors = 0
+        self._timeouts = 0
+
+        if mode == "threads":
+            self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='update-receiver')
+        else:
+            self._pool = GreenPool(workers)
+
+
+    def run(self, receivers: tuple, sender, **kwargs) -> None:
+        """Runs the receivers of an update concurrently and waits until they are done (or timed out)
+
+        Args:
+            receivers (tuple): The receivers
+            sender: The sender of the signal
+            kwargs: The signal parameters (with entity_id)
+        Returns:
+            None
+        """
+
+        entity_id = kwargs['entity_id']
+        ingress = tracer.get_ingress()
+        now = time.monotonic()
+
+        calls = []
+        with self._lock:
+            for receiver in receivers:
+                call = _ReceiverCall(receiver, now + self.__timeout(receiver), self.inflight.get((receiver, entity_id)))
+                self.inflight[(receiver, entity_id)] = call
+                self._calls += 1
+                calls.append(call)
+
+        # spawned without the lock: a full green pool blocks the spawn until a worker is done (and takes the lock)
+        for call in calls:
+            self.__spawn(self.__call, call, entity_id, ingress, sender, kwargs)
+
+        for call in calls:
+            # a skipped call is set done when its deadline passed, it is counted here as well (once)
+            if not call.done.wait(max(0.0, call.deadline - time.monotonic())) or call.skipped:
+                with self._lock:
+                    self._timeouts += 1
+                logger.warning(f'Receiver {_receiver_name(call.receiver)} did not finish the update of entity {entity_id} '
+                               f'within {self.__timeout(call.receiver) * 1000:.0f} ms')
+
+
+    def run_inline(self, receivers: tuple, sender, **kwargs) -> None:
+        """Runs the receivers of an update sent from a pool worker one after another on the worker
+            (each after the previous call of the receiver for the same entity)
+
+        Args:
+            receivers (tuple): The receivers
+            sender: The sender of the signal
+            kwargs: The signal parameters (with entity_id)
+        Returns:
+            None
+        """
+
+        entity_id = kwargs['entity_id']
+        for receiver in receivers:
+            with self._lock:
+                call = _ReceiverCall(receiver, None, self.inflight.get((receiver, entity_id)))
+                self.inflight[(receiver, entity_id)] = call
+                self._calls += 1
+            self.__run_call(call, entity_id, sender, kwargs)
+
+
+    def in_worker(self) -> bool:
+        """Checks if the current thread is a pool worker
+        """
+
+        return getattr(self._local, 'worker', False)
+
+
+    def stats(self) -> dict:
+        """Returns the number of receiver calls, errors and timeouts
+
+        Args:
+            None
+        Returns:
+            dict: calls, errors, timeouts and inflight counts
+        """
+
+        with self._lock:
+            return {'calls': self._calls, 'errors': self._errors, 'timeouts': self._timeouts, 'inflight': len(self.inflight)}
+
+
+    def shutdown(self) -> None:
+        """Stops the pool, waits for the running calls
+        """
+
+        if self.mode == "threads":
+            self._pool.shutdown(wait=True)
+        else:
+            self._pool.waitall()
+
+
+    def __timeout(self, receiver) -> float:
+        return self.timeouts.get(_receiver_name(receiver), self.timeout)
+
+
+    def __spawn(self, function, *args) -> None:
+        if self.mode == "threads":
+            self._pool.submit(function, *args)
+        else:
+            self._pool.spawn_n(function, *args)
+
+
+    def __call(self, call, entity_id, ingress, sender, kwargs) -> None:
+        """Runs a receiver on a worker
+        """
+
+        self._local.worker = True
+        self._local.running = []
+        tracer.set_ingress(ingress)
+        try:
+            self.__run_call(call, entity_id, sender, kwargs)
+        finally:
+            tracer.set_ingress(0)
+            self._local.worker = False
+
+
+    def __run_call(self, call, entity_id, sender, kwargs) -> None:
+        """Runs a receiver after the previous call of the receiver for the same entity is done
+            A pooled call is skipped if the previous call is not done by its deadline.
+            A call sent from a worker does not wait for a call the worker is running itself and waits at most
+            the receiver timeout (calls of other workers may wait for it)
+        """
+
+        running = self._local.running
+        running.append(call)
+        try:
+            previous = call.previous
+            if call.deadline is not None:
+                if previous is not None and not previous.done.wait(max(0.0, call.deadline - time.monotonic())):
+                    call.skipped = True
+                    logger.warning(f'Receiver {_receiver_name(call.receiver)} skipped an update of entity {entity_id}, '
+                                   f'the previous one is still running')
+                    return
+            elif previous is not None and not _waits_for(previous, running):
+                if not previous.done.wait(self.__timeout(call.receiver)):
+                    logger.warning(f'Receiver {_receiver_name(call.receiver)} runs an update of entity {entity_id} '
+                                   f'before the previous one is done')
+            tracer.call_receivers((call.receiver,), sender, **kwargs)
+        except Exception as e:
+            with self._lock:
+                self._errors += 1
+            logger.error(f'Error in receiver {_receiver_name(call.receiver)} for entity {entity_id}: {e}')
+        finally:
+            running.pop()
+            call.previous = None
+            call.done.set()
+            with self._lock:
+                if self.inflight.get((call.receiver, entity_id)) is call:
+                    del self.inflight[(call.receiver, entity_id)]
+
+
+def _waits_for(previous, running: list) -> bool:
+    # true if the chain of not finished calls before previous contains a call of the running list
+    while previous is not None and not previous.done.is_set():
+        if previous in running:
+            return True
+        previous = previous.previous
+    return False
+
+
+def _receiver_name(receiver) -> str:
+    return getattr(receiver, '__qualname__', repr(receiver))
+
+
+def create_receiver_pool(config: dict):
+    """Creates the receiver pool from the dispatch configuration
+
+    Args:
+        config (dict): {mode: serial|threads|green, workers, timeout_ms, timeouts_ms: {<class>.<method>: ms}}
+    Returns:
+        ReceiverPool: The pool, or None for the serial mode
+    Raises:
+        ValueError: If the configuration is invalid
+    """
+
+    mode = config.get('mode', 'serial')
+    if mode not in RECEIVER_POOL_MODES:
+        raise ValueError(f'Dispatch mode {mode} not in {RECEIVER_POOL_MODES}')
+    if mode == 'serial':
+        return None
+
+    return ReceiverPool(mode, config.get('workers', 8), config.get('timeout_ms', 1000), config.get('timeouts_ms', {}))
@@ -1,27 +1,253 @@
 from purepyhome.core.logger import get_logger
+from purepyhome.core.tracing import tracer
+from purepyhome.core.signals.receiver_pool import create_receiver_pool
 
-from blinker import Namespace
-
-_entity_signals = Namespace()
+from fnmatch import fnmatchcase
+import threading
 
 logger = get_logger()
 
 
 """
     Signal used to update entities all over the application in a standardized way
+    Unlike the other signals it is not a blinker broadcast: receivers subscribe per entity id or per id pattern
+    (fnmatch style, eg. 'buero.*', '*' for all entities) and an update only calls the receivers of its entity.
+    The receiver list of an entity is computed once and kept until the subscriptions or the entity change.
+    By default the receivers run one after another on the sending thread, optionally they run concurrently
+    on a thread or green pool (config key dispatch, see receiver_pool).
 """
 
-_update_entity = _entity_signals.signal('update_entity', """
-                                            Signal emitted when an entity is updated""")
+class UpdateDispatcher:
+    """UpdateDispatcher class
+        It routes the update_entity signal to the receivers subscribed to the updated entity
+
+        Attributes:
+            name: The name of the signal
+            entity_receivers: A dictionary that maps entity ids to the receivers subscribed to them
+            pattern_receivers: A list of (pattern, receiver) subscriptions
+            routes: A dictionary that maps entity ids to their receiver list (tuple, in subscription order of the receivers)
+            pool: The ReceiverPool running the receivers concurrently (None runs them one after another)
+
+        Functions:
+            init_app: Reads the dispatch configuration and creates the receiver pool
+            subscribe: Subscribes a receiver to an entity id
+            unsubscribe: Unsubscribes a receiver from an entity id
+            subscribe_pattern: Subscribes a receiver to all entity ids matching a pattern
+            unsubscribe_pattern: Unsubscribes a receiver from a pattern
+            receivers_for_entity: Returns the receiver list of an entity
+            remove_entity: Drops the receiver list of a removed entity
+            send: Calls the receivers of the updated entity
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.entity_receivers = {}
+        self.pattern_receivers = []
+        self.routes = {}
+        self.pool = None
+
+        self._lock = threading.Lock()
+        self._order = {}
+
+
+    def init_app(self, app):
+        """Reads the dispatch configuration (app.config['SIGNAL_DISPATCH']) and creates the receiver pool
+            (an invalid configuration is logged and the receivers run one after another)
+
+        Args:
+            app: The Flask app
+        Returns:
+            None
+        """
+
+        try:
+            self.pool = create_receiver_pool(app.config.get('SIGNAL_DISPATCH', {}))
+        except ValueError as e:
+            logger.error(f'Error creating the receiver pool of {self.name}: {e}')
+            self.pool = None
+            return
+
+        if self.pool is not None:
+            logger.info(f'Running the {self.name} receivers on a {self.pool.mode} pool ({self.pool.workers} workers, '
+                        f'timeout {self.pool.timeout * 1000:.0f} ms)')
+
+
+    def subscribe(self, receiver, entity_id: str) -> None:
+        """Subscribes a receiver to an entity id (subscribing twice has no effect)
+
+        Args:
+            receiver: The signal handler, called with (sender, **kwargs)
+            entity_id (str): The entity id
+        Returns:
+            None
+        """
+
+        with self._lock:
+            receivers = self.entity_receivers.setdefault(entity_id, [])
+            if receiver not in receivers:
+                self._order.setdefault(receiver, len(self._order))
+                receivers.append(receiver)
+                self.routes.pop(entity_id, None)
+
+
+    def unsubscribe(self, receiver, entity_id: str) -> None:
+        """Unsubscribes a receiver from an entity id
+
+        Args:
+            receiver: The signal handler
+            entity_id (str): The entity id
+        Returns:
+            None
+        """
+
+        with self._lock:
+            receivers = self.entity_receivers.get(entity_id)
+            if receivers is None or receiver not in receivers:
+                return
+            receivers.remove(receiver)
+            if len(receivers) == 0:
+                del self.entity_receivers[entity_id]
+            self.routes.pop(entity_id, None)
+
+
+    def subscribe_pattern(self, receiver, pattern: str) -> None:
+        """Subscribes a receiver to all entity ids matching a pattern (fnmatch style, case sensitive)
+
+        Args:
+            receiver: The signal handler, called with (sender, **kwargs)
+            pattern (str): The pattern, eg. 'buero.*' or '*'
+        Returns:
+            None
+        """
+
+        with self._lock:
+            if (pattern, receiver) not in self.pattern_receivers:
+                self._order.setdefault(receiver, len(self._order))
+                self.pattern_receivers.append((pattern, receiver))
+                self.routes = {}
+
+
+    def unsubscribe_pattern(self, receiver, pattern: str) -> None:
+        """Unsubscribes a receiver from a pattern
+
+        Args:
+            receiver: The signal handler
+            pattern (str): The pattern
+        Returns:
+            None
+        """
+
+        with self._lock:
+            if (pattern, receiver) in self.pattern_receivers:
+                self.pattern_receivers.remove((pattern, receiver))
+                self.routes = {}
+
+
+    def receivers_for_entity(self, entity_id: str) -> tuple:
+        """Returns the receiver list of an entity (computed on the first update after a change of the subscriptions)
+
+        Args:
+            entity_id (str): The entity id
+        Returns:
+            tuple: The receivers, in the order they first subscribed
+        """
 
+        receivers = self.routes.get(entity_id)
+        if receivers is not None:
+            return receivers
 
-def connect_to_update_entity(signal_handler):
+        with self._lock:
+            matched = list(self.entity_receivers.get(entity_id, ()))
+            for pattern, receiver in self.pattern_receivers:
+                if receiver not in matched and fnmatchcase(entity_id, pattern):
+                    matched.append(receiver)
+            receivers = tuple(sorted(matched, key=self._order.__getitem__))
+            self.routes[entity_id] = receivers
+        return receivers
+
+
+    def remove_entity(self, entity_id: str) -> None:
+        """Drops the receiver list of a removed entity (the subscriptions are kept by their receivers)
+
+        Args:
+            entity_id (str): The entity id
+        Returns:
+            None
+        """
+
+        self.routes.pop(entity_id, None)
+
+
+    def send(self, sender, **kwargs) -> None:
+        """Calls the receivers of the updated entity (kwargs['entity_id']) with (sender, **kwargs)
+            (with tracing enabled the duration of every receiver is recorded).
+            With a pool they run concurrently, updates sent from a pool worker run their receivers on the worker.
+
+        Args:
+            sender: The sender of the signal
+            kwargs: The signal parameters (entity_id, value, last_value, callstack, seq)
+        Returns:
+            None
+        """
+
+        receivers = self.receivers_for_entity(kwargs['entity_id'])
+        if not receivers:
+            return
+
+        pool = self.pool
+        if pool is None:
+            tracer.call_receivers(receivers, sender, **kwargs)
+        elif pool.in_worker():
+            pool.run_inline(receivers, sender, **kwargs)
+        else:
+            pool.run(receivers, sender, **kwargs)
+
+
+_update_entity = UpdateDispatcher('update_entity')
+
+
+def init_update_entity(app):
+    """Reads the dispatch configuration of the update_entity signal (see UpdateDispatcher.init_app)
+
+    Args:
+        app: The Flask app
+    Returns:
+        None
+    """
+
+    _update_entity.init_app(app)
+
+
+def connect_to_update_entity(signal_handler, entity_id: str = None, pattern: str = None):
     """Connects a signal handler to the update_entity signal
+        for the updates of one entity, of the entities matching a pattern, or (without both) of all entities
+
+    Args:
+        signal_handler: The signal handler
+        entity_id (str): The entity id
+        pattern (str): The entity id pattern (fnmatch style)
+    Returns:
+        None
+    """
+
+    if entity_id is not None:
+        _update_entity.subscribe(signal_handler, entity_id)
+    else:
+        _update_entity.subscribe_pattern(signal_handler, pattern if pattern is not None else '*')
+
+
+def disconnect_from_update_entity(signal_handler, entity_id: str = None, pattern: str = None):
+    """Disconnects a signal handler from the update_entity signal (the counterpart of connect_to_update_entity)
 
     Args:
         signal_handler: The signal handler
+        entity_id (str): The entity id
+        pattern (str): The entity id pattern (fnmatch style)
     Returns:
         None
     """
 
-    _update_entity.connect(signal_handler)
\ No newline at end of file
+    if entity_id is not None:
+        _update_entity.unsubscribe(signal_handler, entity_id)
+    else:
+        _update_entity.unsubscribe_pattern(signal_handler, pattern if pattern is not None else '*')
@@ -1,14 +1,43 @@
 
 from flask_socketio import SocketIO
 
+from .logger import get_logger
+
+logger = get_logger()
+
 class PurePyHomeSocketIO(SocketIO):
     """ Custom SocketIO class for PurePyHome
 
     This class is a custom Wrapper around the Flask SocketIO class.
     It can be used to add custom functionality to the Flask SocketIO class if needed.
+    Socket.IO keeps a single handler per event, so modules that need to know about disconnecting clients
+    register with on_client_disconnect instead of handling the disconnect event themselves.
     """
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self._disconnect_handlers = []
+
+
+    def on_client_disconnect(self, handler) -> None:
+        """Registers a function that is called when a client disconnects (with the arguments of the disconnect event)
+
+        Args:
+            handler: The function
+        Returns:
+            None
+        """
+
+        if len(self._disconnect_handlers) == 0:
+            self.on_event('disconnect', self.__on_disconnect)
+        self._disconnect_handlers.append(handler)
+
+
+    def __on_disconnect(self, *args):
+        for handler in self._disconnect_handlers:
+            try:
+                handler(*args)
+            except Exception as e:
+                logger.error(f'Error handling disconnect in {handler}: {e}')
 
-socketio = PurePyHomeSocketIO()
\ No newline at end of file
+socketio = PurePyHomeSocketIO()
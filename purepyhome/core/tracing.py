@@ -0,0 +1,302 @@
+from purepyhome.core.logger import get_logger
+
+import threading
+import time
+
+logger = get_logger()
+
+"""This file provides the latency tracing of the update pipeline
+    An MQTT message is stamped with a monotonic ingress time when it is received, the time travels with the message
+    through the ingest queue and is kept per thread while the message is handled (also for the updates made by actions).
+    The stages of the pipeline record their duration into HDR-style histograms:
+        ingest.wait, mqtt.handle, mqtt.decode, mqtt.convert, db.write, db.history,
+        signal.<receiver>, actions, mqtt.publish, ui.emit
+    and the sinks record the end-to-end latency from the ingress: e2e.mqtt_publish, e2e.ui_emit.
+    When tracing is disabled, start() returns 0 and stop() returns immediately, so a traced stage costs two calls.
+"""
+
+HISTOGRAM_SUB_BUCKET_BITS = 4       # 16 sub-buckets per power of 2 -> values are recorded with < 6.25% error
+HISTOGRAM_BUCKETS = 512             # covers values up to ~2^35 us (~9.5 hours), larger values go into the last bucket
+
+PROMETHEUS_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class LatencyHistogram:
+    """LatencyHistogram class
+        A log-linear (HDR-style) histogram of durations in microseconds:
+        values below 16 us are counted exactly, above the buckets grow with the value (16 per power of 2).
+
+        Attributes:
+            counts: The number of recorded values per bucket
+            count: The number of recorded values
+            total: The sum of the recorded values (us)
+            max: The largest recorded value (us)
+
+        Functions:
+            record: Records a duration
+            percentile: Returns the value below which a percentage of the recorded values lie
+            reset: Removes all recorded values
+    """
+
+    def __init__(self):
+        self.counts = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+
+    def record(self, value_us: int) -> None:
+        """Records a duration
+
+        Args:
+            value_us (int): The duration in microseconds
+        Returns:
+            None
+        """
+
+        if value_us < 0:
+            value_us = 0
+        self.counts[min(_bucket_index(value_us), HISTOGRAM_BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += value_us
+        if value_us > self.max:
+            self.max = value_us
+
+
+    def percentile(self, percentile: float) -> int:
+        """Returns the value below which a percentage of the recorded values lie
+            (the upper bound of the bucket, at most the largest recorded value)
+
+        Args:
+            percentile (float): The percentile (0-100)
+        Returns:
+            int: The value in microseconds (0 if nothing was recorded)
+        """
+
+        if self.count == 0:
+            return 0
+
+        rank = max(1, round(self.count * percentile / 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(_bucket_upper_bound(index), self.max)
+        return self.max
+
+
+    def reset(self) -> None:
+        """Removes all recorded values
+        """
+
+        self.counts = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+
+def _bucket_index(value: int) -> int:
+    if value < (1 << HISTOGRAM_SUB_BUCKET_BITS):
+        return value
+    shift = value.bit_length() - HISTOGRAM_SUB_BUCKET_BITS - 1
+    return ((shift + 1) << HISTOGRAM_SUB_BUCKET_BITS) + (value >> shift) - (1 << HISTOGRAM_SUB_BUCKET_BITS)
+
+
+def _bucket_upper_bound(index: int) -> int:
+    if index < (1 << HISTOGRAM_SUB_BUCKET_BITS):
+        return index
+    shift = (index >> HISTOGRAM_SUB_BUCKET_BITS) - 1
+    sub_bucket = (index & ((1 << HISTOGRAM_SUB_BUCKET_BITS) - 1)) + (1 << HISTOGRAM_SUB_BUCKET_BITS)
+    return ((sub_bucket + 1) << shift) - 1
+
+
+class Tracer:
+    """Tracer class
+        It records the durations of the pipeline stages into a histogram per stage
+
+        Attributes:
+            enabled: Whether the tracing is enabled (app.config['TRACING']['enabled'])
+            histograms: A dictionary that maps stage names to LatencyHistogram objects
+
+        Functions:
+            init_app: Reads the tracing configuration
+            ingress: Returns the ingress time for a new message (0 if disabled)
+            set_ingress: Sets the ingress time of the message handled by the current thread
+            get_ingress: Gets the ingress time of the message handled by the current thread
+            start: Returns the start time of a stage (0 if disabled)
+            stop: Records the duration of a stage
+            stop_e2e: Records the end-to-end latency from an ingress time
+            call_receivers: Calls signal receivers, recording the duration of every receiver
+            snapshot: Returns the statistics of all stages
+            reset: Removes all recorded values
+            prometheus_lines: Returns the stage latencies in the Prometheus text format
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.histograms = {}
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+
+    def init_app(self, app):
+        """Reads the tracing configuration (app.config['TRACING'])
+
+        Args:
+            app: The Flask app
+        Returns:
+            None
+        """
+
+        self.enabled = bool(app.config.get('TRACING', {}).get('enabled', False))
+        if self.enabled:
+            logger.info(f'Latency tracing enabled')
+
+
+    def ingress(self) -> int:
+        """Returns the ingress time for a new message
+
+        Returns:
+            int: The monotonic time in ns, or 0 if tracing is disabled
+        """
+
+        return time.perf_counter_ns() if self.enabled else 0
+
+
+    def set_ingress(self, ingress: int) -> None:
+        """Sets the ingress time of the message handled by the current thread (0 clears it)
+        """
+
+        self._local.ingress = ingress
+
+
+    def get_ingress(self) -> int:
+        """Gets the ingress time of the message handled by the current thread (0 if there is none)
+        """
+
+        return getattr(self._local, 'ingress', 0)
+
+
+    def start(self) -> int:
+        """Returns the start time of a stage
+
+        Returns:
+            int: The monotonic time in ns, or 0 if tracing is disabled
+        """
+
+        return time.perf_counter_ns() if self.enabled else 0
+
+
+    def stop(self, stage: str, started: int) -> None:
+        """Records the duration of a stage (nothing is recorded if started is 0)
+
+        Args:
+            stage (str): The name of the stage
+            started (int): The start time returned by start()
+        Returns:
+            None
+        """
+
+        if started:
+            self.__record(stage, time.perf_counter_ns() - started)
+
+
+    def stop_e2e(self, stage: str, ingress: int = None) -> None:
+        """Records the end-to-end latency from an ingress time (by default the one of the current thread)
+
+        Args:
+            stage (str): The name of the sink (eg. e2e.mqtt_publish)
+            ingress (int): The ingress time, None uses the ingress time of the current thread
+        Returns:
+            None
+        """
+
+        if ingress is None:
+            ingress = self.get_ingress() if self.enabled else 0
+        if ingress:
+            self.__record(stage, time.perf_counter_ns() - ingress)
+
+
+    def call_receivers(self, receivers, sender, **kwargs) -> None:
+        """Calls signal receivers with (sender, **kwargs). With tracing enabled
+            the duration of each is recorded as signal.<receiver>.
+
+        Args:
+            receivers: The receivers
+            sender: The sender of the signal
+            kwargs: The signal parameters
+        Returns:
+            None
+        """
+
+        if not self.enabled:
+            for receiver in receivers:
+                receiver(sender, **kwargs)
+            return
+
+        for receiver in receivers:
+            started = time.perf_counter_ns()
+            receiver(sender, **kwargs)
+            self.__record('signal.' + getattr(receiver, '__qualname__', repr(receiver)), time.perf_counter_ns() - started)
+
+
+    def snapshot(self) -> dict:
+        """Returns the statistics of all stages
+
+        Args:
+            None
+        Returns:
+            dict: stage -> {count, sum (us), max (us), p50, p90, p99, p999 (us)}
+        """
+
+        with self._lock:
+            return {stage: {'count': histogram.count,
+                            'sum': histogram.total,
+                            'max': histogram.max,
+                            'p50': histogram.percentile(50),
+                            'p90': histogram.percentile(90),
+                            'p99': histogram.percentile(99),
+                            'p999': histogram.percentile(99.9)
+                            }
+                    for stage, histogram in sorted(self.histograms.items())}
+
+
+    def reset(self) -> None:
+        """Removes all recorded values
+        """
+
+        with self._lock:
+            self.histograms = {}
+
+
+    def prometheus_lines(self) -> list:
+        """Returns the stage latencies in the Prometheus text format (as summary with quantiles)
+
+        Args:
+            None
+        Returns:
+            list: The lines
+        """
+
+        lines = ['# HELP purepyhome_stage_latency_seconds Latency of the stages of the update pipeline',
+                 '# TYPE purepyhome_stage_latency_seconds summary']
+        with self._lock:
+            for stage, histogram in sorted(self.histograms.items()):
+                for quantile in PROMETHEUS_QUANTILES:
+                    lines.append(f'purepyhome_stage_latency_seconds{{stage="{stage}",quantile="{quantile}"}} '
+                                 f'{histogram.percentile(quantile * 100) / 1e6}')
+                lines.append(f'purepyhome_stage_latency_seconds_sum{{stage="{stage}"}} {histogram.total / 1e6}')
+                lines.append(f'purepyhome_stage_latency_seconds_count{{stage="{stage}"}} {histogram.count}')
+        return lines
+
+
+    def __record(self, stage: str, duration_ns: int) -> None:
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = LatencyHistogram()
+            histogram.record(duration_ns // 1000)
+
+
+tracer = Tracer()
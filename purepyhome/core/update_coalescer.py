@@ -0,0 +1,162 @@
+from .logger import get_logger
+
+import threading
+import time
+
+logger = get_logger()
+
+"""This file provides the update coalescer used by the core
+    Entities can opt in to two kinds of update filtering (entity config keys):
+        coalesce_ms: at most one update per coalesce_ms window is committed,
+                     updates arriving inside the window are merged and the latest value is committed when the window ends
+        min_delta:   (numeric entities) updates that differ less than min_delta from the current value are suppressed
+"""
+
+class UpdateCoalescer:
+    """UpdateCoalescer class
+        It keeps the coalescing settings of the entities and the pending (merged) updates
+
+        Attributes:
+            commit: Function called with (sender, entity_id, value, callstack) to commit a merged update
+            settings: A dictionary that maps entity ids to (coalesce window in seconds, min_delta)
+            pending: A dictionary that maps entity ids to the latest pending (sender, value, callstack)
+            window_end: A dictionary that maps entity ids to the end of their current coalescing window (monotonic time)
+
+        Functions:
+            configure: Sets the coalescing settings of an entity
+            remove: Removes an entity (pending updates are discarded)
+            is_suppressed: Checks if an update is inside the deadband of an entity
+            defer: Takes over an update if it falls into the coalescing window of an entity
+            stats: Returns the number of coalesced and suppressed updates
+            __flush: Commits the pending update of an entity when its window ends
+    """
+
+    def __init__(self, commit):
+        self.commit = commit
+        self.settings = {}
+        self.pending = {}
+        self.window_end = {}
+
+        self._lock = threading.Lock()
+        self._coalesced = 0
+        self._suppressed = 0
+
+
+    def configure(self, entity_id: str, coalesce_ms: int, min_delta: float) -> None:
+        """Sets the coalescing settings of an entity (entities without settings are not filtered at all)
+
+        Args:
+            entity_id (str): The entity id
+            coalesce_ms (int): The coalescing window in milliseconds (0 disables coalescing)
+            min_delta (float): The deadband for numeric values (0 disables the deadband)
+        Returns:
+            None
+        """
+
+        if coalesce_ms > 0 or min_delta > 0:
+            self.settings[entity_id] = (coalesce_ms / 1000, min_delta)
+        else:
+            self.settings.pop(entity_id, None)
+
+
+    def remove(self, entity_id: str) -> None:
+        """Removes an entity, pending updates are discarded
+
+        Args:
+            entity_id (str): The entity id
+        Returns:
+            None
+        """
+
+        with self._lock:
+            self.settings.pop(entity_id, None)
+            self.pending.pop(entity_id, None)
+            self.window_end.pop(entity_id, None)
+
+
+    def is_suppressed(self, entity_id: str, value, current_value) -> bool:
+        """Checks if an update is inside the deadband (min_delta) of an entity
+
+        Args:
+            entity_id (str): The entity id
+            value (any): The new (type corrected) value
+            current_value (any): The current value of the entity
+        Returns:
+            bool: True if the update should be dropped
+        """
+
+        settings = self.settings.get(entity_id)
+        if settings is None or settings[1] <= 0:
+            return False
+
+        if not isinstance(value, (int, float)) or not isinstance(current_value, (int, float)):
+            return False
+
+        if abs(value - current_value) < settings[1]:
+            self._suppressed += 1
+            return True
+        return False
+
+
+    def defer(self, sender: str, entity_id: str, value, callstack: list) -> bool:
+        """Takes over an update if it falls into the current coalescing window of an entity.
+            The first update of a window is committed directly (returns False) and opens the window,
+            all further updates inside the window replace the pending value, which is committed when the window ends.
+
+        Args:
+            sender (str): The sender requesting the update
+            entity_id (str): The entity id
+            value (any): The new (type corrected) value
+            callstack (list): The callstack of the update
+        Returns:
+            bool: True if the update was deferred, False if it should be committed now
+        """
+
+        settings = self.settings.get(entity_id)
+        if settings is None or settings[0] <= 0:
+            return False
+
+        now = time.monotonic()
+        with self._lock:
+            if entity_id not in self.pending and now >= self.window_end.get(entity_id, 0.0):
+                self.window_end[entity_id] = now + settings[0]
+                return False
+
+            if entity_id in self.pending:
+                self._coalesced += 1
+            else:
+                timer = threading.Timer(self.window_end[entity_id] - now, self.__flush, args=(entity_id,))
+                timer.daemon = True
+                timer.start()
+            self.pending[entity_id] = (sender, value, callstack)
+            return True
+
+
+    def stats(self) -> dict:
+        """Returns the number of coalesced (merged) and suppressed (deadband) updates
+
+        Args:
+            None
+        Returns:
+            dict: coalesced, suppressed and pending counts
+        """
+
+        return {'coalesced': self._coalesced, 'suppressed': self._suppressed, 'pending': len(self.pending)}
+
+
+    def __flush(self, entity_id: str) -> None:
+        """Commits the pending update of an entity when its coalescing window ends and opens the next window
+        """
+
+        with self._lock:
+            update = self.pending.pop(entity_id, None)
+            settings = self.settings.get(entity_id)
+            if update is None or settings is None:
+                return
+            self.window_end[entity_id] = time.monotonic() + settings[0]
+
+        sender, value, callstack = update
+        try:
+            self.commit(sender, entity_id, value, callstack)
+        except Exception as e:
+            logger.error(f'Error committing coalesced update of entity {entity_id}: {e}')
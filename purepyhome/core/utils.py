@@ -1,3 +1,9 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 def get_nested_value(obj: dict, key: str) -> any:
     """Get a nested value from a dictionary using a dot-separated key.
@@ -21,6 +27,56 @@ def get_nested_value(obj: dict, key: str) -> any:
         return None
 
 
+def compile_key_path(key: str) -> tuple:
+    """Compile a dot-separated key into a tuple of keys, so it does not need to be split for every lookup.
+            eg. compile_key_path('a.b.c') -> ('a', 'b', 'c'), compile_key_path('') -> ()
+
+    Args:
+        key (str): The dot-separated key
+    Returns:
+        tuple: The keys of every level
+    """
+
+    if key == "":
+        return ()
+    return tuple(key.split('.'))
+
+
+def get_compiled_value(obj: dict, key_path: tuple) -> any:
+    """Get a nested value from a dictionary using a compiled key path (see compile_key_path).
+            eg. get_compiled_value({'a': {'b': {'c': 1}}}, ('a', 'b', 'c')) -> 1
+
+    Args:
+        obj (dict): The dictionary to search in
+        key_path (tuple): The compiled key path
+    Returns:
+        any: The value found in the dictionary, or None if not found
+    """
+
+    try:
+        for key in key_path:
+            obj = obj[key]
+        return obj
+    except (KeyError, TypeError, IndexError):
+        return None
+
+
+def json_loads(data) -> any:
+    """Parse a JSON document (str or bytes). Uses orjson if it is installed, the json module otherwise.
+
+    Args:
+        data (str | bytes): The JSON document
+    Returns:
+        any: The parsed document
+    Raises:
+        ValueError: If the document is not valid JSON
+    """
+
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
 def nest_data_to_object(key: str, value: any) -> dict:
     """Nest a value in a dictionary using a dot-separated key.
         The value can be multiple levels deep in the dictionary.
@@ -1,67 +1,294 @@
+from purepyhome.core.utils import json_loads, nest_data_to_object
 from purepyhome.core.logger import get_logger
 
+from abc import ABC, abstractmethod
+
 logger = get_logger()
 
-VALID_DATA_CONVERTERS = ['str_to_bool']
-
-def str_to_bool(value: str, info: dict) -> bool:
-
-    # check if value is of type str
-    if not isinstance(value, str):
-        raise ValueError(f'Value {value} not of type str')
-    
-    # check if info dict provides the necessary information ('true' and 'false' keys)
-    if 'true' not in info or 'false' not in info:
-        raise ValueError(f'Info dict does not provide the necessary information (true and false keys)')
-    
-    # check if the keys are of type str
-    if not isinstance(info['true'], str) or not isinstance(info['false'], str):
-        raise ValueError(f'Info dict keys true and false not of type str')
-    
-    # convert the string to bool
-    if value.lower() == info['true'].lower():
-        return True
-    elif value.lower() == info['false'].lower():
-        return False
-    else:
-        raise ValueError(f'Value {value} not convertible to bool with true: {info["true"]} and false: {info["false"]}')
-
-def str_to_bool_reverse(value: bool, info: dict) -> str:
-    
-    # check if value is of type bool
-    if not isinstance(value, bool):
-        raise ValueError(f'Value {value} not of type bool')
-    
-    # check if info dict provides the necessary information ('true' and 'false' keys)
-    if 'true' not in info or 'false' not in info:
-        raise ValueError(f'Info dict does not provide the necessary information (true and false keys)')
-    
-    # check if the keys are of type str
-    if not isinstance(info['true'], str) or not isinstance(info['false'], str):
-        raise ValueError(f'Info dict keys true and false not of type str')
-    
-    # convert the bool to string
-    if value:
-        return info['true']
-    else:
-        return info['false']
+"""This file provides the value converters of the entity data sources and sinks
+    A converter is a class, it validates its converter_info once when it is created (at entity registration)
+    and then converts values with forward (source -> entity value) and reverse (entity value -> sink).
+    The MQTT subscriber and publisher keep the converter instances in their maps.
+    Further converters can be added with register_value_converter.
+"""
 
+def _to_float(value: any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'Value {value} not of type numeric')
 
 
-def run_value_converter(value: any, converter: str, info: dict, reverse: bool = False) -> any:
-    if converter == "none":
+class ValueConverter(ABC):
+    """ValueConverter class
+        Base class of the value converters
+
+        Attributes:
+            name: The converter_name the converter is registered with
+            info: The converter_info the converter was created with
+
+        Functions:
+            forward: Converts a value received from a data source to the entity value
+            reverse: Converts an entity value to the value sent to a data sink
+    """
+
+    name = None
+
+    def __init__(self, info: dict):
+        self.info = info if info is not None else {}
+        if not isinstance(self.info, dict):
+            raise ValueError(f'Converter {self.name}: converter_info must be a dict')
+
+    @abstractmethod
+    def forward(self, value: any) -> any:
+        ...
+
+    @abstractmethod
+    def reverse(self, value: any) -> any:
+        ...
+
+
+class NoneConverter(ValueConverter):
+    """Passes the values through unchanged
+    """
+
+    name = 'none'
+
+    def forward(self, value: any) -> any:
         return value
 
-    if converter not in VALID_DATA_CONVERTERS:
-        raise ValueError(f'Converter {converter} not in {VALID_DATA_CONVERTERS}')
-    
-    if converter == 'str_to_bool':
-        if reverse:
-            logger.debug(f'str_to_bool - Converting {value} to str with info {info}')
-            return str_to_bool_reverse(value, info)
-        else:
-            logger.debug(f'str_to_bool - Converting {value} to bool with info {info}')
-            return str_to_bool(value, info)
-    else:
-        raise ValueError(f'Converter {converter} not implemented')
-    
\ No newline at end of file
+    def reverse(self, value: any) -> any:
+        return value
+
+
+class StrToBoolConverter(ValueConverter):
+    """Maps two strings to True/False (case insensitive)
+        converter_info: {true: <str>, false: <str>}
+    """
+
+    name = 'str_to_bool'
+
+    def __init__(self, info: dict):
+        super().__init__(info)
+
+        # check if info dict provides the necessary information ('true' and 'false' keys)
+        if 'true' not in self.info or 'false' not in self.info:
+            raise ValueError(f'Info dict does not provide the necessary information (true and false keys)')
+
+        # check if the keys are of type str
+        if not isinstance(self.info['true'], str) or not isinstance(self.info['false'], str):
+            raise ValueError(f'Info dict keys true and false not of type str')
+
+        self.true_str = self.info['true']
+        self.false_str = self.info['false']
+        self.true_lower = self.true_str.lower()
+        self.false_lower = self.false_str.lower()
+
+    def forward(self, value: any) -> bool:
+        if not isinstance(value, str):
+            raise ValueError(f'Value {value} not of type str')
+
+        lower = value.lower()
+        if lower == self.true_lower:
+            return True
+        if lower == self.false_lower:
+            return False
+        raise ValueError(f'Value {value} not convertible to bool with true: {self.true_str} and false: {self.false_str}')
+
+    def reverse(self, value: any) -> str:
+        if not isinstance(value, bool):
+            raise ValueError(f'Value {value} not of type bool')
+
+        return self.true_str if value else self.false_str
+
+
+class ScaleConverter(ValueConverter):
+    """Scales numeric values: entity value = raw value * factor + offset
+        converter_info: {factor: <number> (default 1), offset: <number> (default 0)}
+    """
+
+    name = 'scale'
+
+    def __init__(self, info: dict):
+        super().__init__(info)
+
+        self.factor = self.info.get('factor', 1)
+        self.offset = self.info.get('offset', 0)
+        for key, number in (('factor', self.factor), ('offset', self.offset)):
+            if isinstance(number, bool) or not isinstance(number, (int, float)):
+                raise ValueError(f'Info dict key {key} not of type numeric')
+        if self.factor == 0:
+            raise ValueError(f'Info dict key factor must not be 0')
+
+    def forward(self, value: any) -> float:
+        return _to_float(value) * self.factor + self.offset
+
+    def reverse(self, value: any) -> float:
+        return (_to_float(value) - self.offset) / self.factor
+
+
+class JsonPathConverter(ValueConverter):
+    """Extracts a nested value from a JSON document (or an already parsed dict/list)
+        The path is dot-separated, numeric parts index into lists (eg. 'sensors.0.value').
+        The reverse direction nests the value into an object under the path.
+        converter_info: {path: <str>}
+    """
+
+    name = 'json_path'
+
+    def __init__(self, info: dict):
+        super().__init__(info)
+
+        self.path = self.info.get('path')
+        if not isinstance(self.path, str) or self.path == '':
+            raise ValueError(f'Info dict key path not a non empty string')
+
+        self.key_path = tuple(int(key) if key.isdigit() else key for key in self.path.split('.'))
+
+    def forward(self, value: any) -> any:
+        if isinstance(value, (str, bytes)):
+            value = json_loads(value)
+
+        try:
+            for key in self.key_path:
+                value = value[key]
+        except (KeyError, IndexError, TypeError):
+            raise ValueError(f'Path {self.path} not found in value')
+        return value
+
+    def reverse(self, value: any) -> dict:
+        return nest_data_to_object(self.path, value)
+
+
+class EnumMapConverter(ValueConverter):
+    """Maps raw values to entity values with a lookup table (raw values are compared as strings)
+        converter_info: {map: {<raw>: <value>, ...}}
+    """
+
+    name = 'enum_map'
+
+    def __init__(self, info: dict):
+        super().__init__(info)
+
+        mapping = self.info.get('map')
+        if not isinstance(mapping, dict) or len(mapping) == 0:
+            raise ValueError(f'Info dict key map not a non empty dict')
+
+        self.forward_map = {str(raw): value for raw, value in mapping.items()}
+        self.reverse_map = {}
+        for raw, value in mapping.items():
+            try:
+                self.reverse_map.setdefault(value, raw)     # the first raw value wins if several map to the same value
+            except TypeError:
+                raise ValueError(f'Mapped value {value} not hashable')
+
+    def forward(self, value: any) -> any:
+        try:
+            return self.forward_map[str(value)]
+        except KeyError:
+            raise ValueError(f'Value {value} not in map {list(self.forward_map)}')
+
+    def reverse(self, value: any) -> any:
+        try:
+            return self.reverse_map[value]
+        except (KeyError, TypeError):
+            raise ValueError(f'Value {value} not in map {list(self.reverse_map)}')
+
+
+class ClampConverter(ValueConverter):
+    """Limits numeric values to a range (in both directions)
+        converter_info: {min: <number>, max: <number>} (at least one of them)
+    """
+
+    name = 'clamp'
+
+    def __init__(self, info: dict):
+        super().__init__(info)
+
+        self.min = self.info.get('min')
+        self.max = self.info.get('max')
+        if self.min is None and self.max is None:
+            raise ValueError(f'Info dict does not provide the necessary information (min and/or max keys)')
+        for key, number in (('min', self.min), ('max', self.max)):
+            if number is not None and (isinstance(number, bool) or not isinstance(number, (int, float))):
+                raise ValueError(f'Info dict key {key} not of type numeric')
+        if self.min is not None and self.max is not None and self.min > self.max:
+            raise ValueError(f'Info dict key min greater than max')
+
+    def forward(self, value: any) -> float:
+        value = _to_float(value)
+        if self.min is not None and value < self.min:
+            return float(self.min)
+        if self.max is not None and value > self.max:
+            return float(self.max)
+        return value
+
+    def reverse(self, value: any) -> float:
+        return self.forward(value)
+
+
+VALUE_CONVERTERS = {}
+
+
+def register_value_converter(converter_class: type) -> type:
+    """Registers a converter class under its name (can be used as class decorator)
+
+    Args:
+        converter_class (type): A subclass of ValueConverter
+    Returns:
+        type: The converter class
+    """
+
+    if not isinstance(converter_class, type) or not issubclass(converter_class, ValueConverter) or not converter_class.name:
+        raise ValueError(f'Converter {converter_class} is not a named ValueConverter subclass')
+    if converter_class.__abstractmethods__:
+        raise ValueError(f'Converter {converter_class.name} does not implement {sorted(converter_class.__abstractmethods__)}')
+
+    VALUE_CONVERTERS[converter_class.name] = converter_class
+    return converter_class
+
+
+for _converter_class in (NoneConverter, StrToBoolConverter, ScaleConverter, JsonPathConverter, EnumMapConverter, ClampConverter):
+    register_value_converter(_converter_class)
+
+# kept for compatibility, the names of the registered converters
+VALID_DATA_CONVERTERS = VALUE_CONVERTERS.keys()
+
+
+def create_value_converter(converter: str, info: dict) -> ValueConverter:
+    """Creates a converter instance (validating the converter info once)
+
+    Args:
+        converter (str): The converter name ('' or None is the same as 'none')
+        info (dict): The converter info
+    Returns:
+        ValueConverter: The converter
+    Raises:
+        ValueError: If the converter is unknown or the info is invalid
+    """
+
+    converter_class = VALUE_CONVERTERS.get(converter or 'none')
+    if converter_class is None:
+        raise ValueError(f'Converter {converter} not in {list(VALUE_CONVERTERS)}')
+
+    try:
+        return converter_class(info)
+    except TypeError as e:
+        raise ValueError(f'Converter {converter} cannot be created: {e}')
+
+
+def run_value_converter(value: any, converter: str, info: dict, reverse: bool = False) -> any:
+    """Converts a single value
+        The converter is created (and its info validated) on every call, keep a converter from create_value_converter instead.
+
+    Args:
+        value (any): The value to convert
+        converter (str): The converter name
+        info (dict): The converter info
+        reverse (bool): Whether to convert in reverse direction (entity value -> sink)
+    Returns:
+        any: The converted value
+    """
+
+    converter = create_value_converter(converter, info)
+    return converter.reverse(value) if reverse else converter.forward(value)
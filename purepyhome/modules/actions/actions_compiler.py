@@ -0,0 +1,261 @@
+from purepyhome.core.core import get_entity, update_entity
+
+import operator
+
+"""This file provides the actions compiler
+    The actions of an entity (yaml syntax, stored as a dict) are compiled once when the entity is registered.
+    Every step, condition and variable reference is turned into a python closure, so running an action on an update
+    only walks the closure tree and does not split or join any strings.
+
+    Operands:
+        'text'          string constant (compared as number if the other operand is numeric and the text is a number, eg. '20')
+        20, 20.5        numeric constant
+        $name           temporary variable (only valid during one run of the action)
+        value           the new value of the entity the action belongs to
+        <entity_id>     the current value of an other entity
+
+    While compiling, the entities an action reads and writes are collected (used for the dependency index of the rule engine).
+"""
+
+# the order is used when a condition contains more than one operator (same as the ActionsPhraser)
+OPERATORS = {'<': operator.lt,
+             '>': operator.gt,
+             '<=': operator.le,
+             '>=': operator.ge,
+             '==': operator.eq,
+             '!=': operator.ne
+             }
+
+
+class ActionContext:
+    """The state of a single run of an action
+    """
+
+    __slots__ = ('value', 'temp_vars', 'callstack', 'logger')
+
+    def __init__(self, value, callstack: list, logger):
+        self.value = value
+        self.temp_vars = {}
+        self.callstack = callstack
+        self.logger = logger
+
+
+class CompiledAction:
+    """CompiledAction class
+        An action that was compiled into a closure tree
+
+        Attributes:
+            steps: The compiled steps of the action
+            reads: The ids of the other entities the action reads
+            writes: The ids of the entities the action sets
+
+        Functions:
+            run: Runs the action for an update
+    """
+
+    def __init__(self, action_yaml: list):
+        self.reads = set()
+        self.writes = set()
+        self.steps = _compile_block(action_yaml, self)
+
+
+    def run(self, logger, value, callstack: list) -> bool:
+        """Runs the action for an update
+
+        Args:
+            logger: The logger used to report errors
+            value (any): The new value of the entity
+            callstack (list): The callstack of the update
+        Returns:
+            bool: False if the action was aborted by an error
+        """
+
+        return _run_block(self.steps, ActionContext(value, callstack, logger))
+
+
+def _run_block(steps: list, ctx: ActionContext) -> bool:
+    """Runs a list of compiled steps, an error aborts the remaining steps of the block
+    """
+
+    for step in steps:
+        try:
+            step(ctx)
+        except Exception as e:
+            ctx.logger.error(f'action_compiler::: Error: {e}')
+            return False
+    return True
+
+
+def _compile_block(action_yaml: list, deps: CompiledAction) -> list:
+    """Compiles a list of action steps (set/if)
+    """
+
+    if action_yaml is None:
+        return []
+    if not isinstance(action_yaml, list):
+        raise ValueError(f'Invalid action: {action_yaml} (expected a list of steps)')
+
+    steps = []
+    for step in action_yaml:
+        if not isinstance(step, dict) or len(step) == 0:
+            raise ValueError(f'Invalid action step: {step}')
+
+        step_type = next(iter(step))
+        if step_type == 'set':
+            steps.append(_compile_set(step['set'], deps))
+        elif step_type == 'if':
+            # the condition/then/else keys may be nested under 'if' or be siblings of an empty 'if' key
+            steps.append(_compile_if(step['if'] if step['if'] is not None else step, deps))
+        else:
+            raise ValueError(f'Invalid action step type: {step_type}')
+    return steps
+
+
+def _compile_set(set_str: str, deps: CompiledAction):
+    """Compiles a set statement: '<variable> = <operand>'
+    """
+
+    if not isinstance(set_str, str) or set_str.count(' = ') != 1:
+        raise ValueError(f'Invalid set statement: {set_str}')
+
+    variable, value_str = (part.strip() for part in set_str.split(' = '))
+    if len(variable) == 0 or ' ' in variable:
+        raise ValueError(f'Invalid set statement: {set_str}')
+
+    get_value, _ = _compile_operand(value_str, deps)
+
+    if variable[0] == '$':
+        def set_temp_var(ctx):
+            ctx.temp_vars[variable] = get_value(ctx)
+        return set_temp_var
+
+    deps.writes.add(variable)
+
+    def set_entity(ctx):
+        update_entity(__name__, entity_id=variable, value=get_value(ctx), callstack=ctx.callstack)
+    return set_entity
+
+
+def _compile_if(if_yaml: dict, deps: CompiledAction):
+    """Compiles an if statement with condition, then and else
+    """
+
+    if not isinstance(if_yaml, dict) or 'condition' not in if_yaml:
+        raise ValueError(f'Invalid if statement: {if_yaml}')
+
+    condition = _compile_condition(if_yaml['condition'].split(), deps)
+    then_steps = _compile_block(if_yaml.get('then'), deps)
+    else_steps = _compile_block(if_yaml.get('else'), deps)
+
+    def run_if(ctx):
+        _run_block(then_steps if condition(ctx) else else_steps, ctx)
+    return run_if
+
+
+def _compile_condition(parts: list, deps: CompiledAction):
+    """Compiles a condition, OR binds weaker than AND, AND binds weaker than the comparison operators
+    """
+
+    for keyword, combine in (('OR', _any), ('AND', _all)):
+        if keyword in parts:
+            index = parts.index(keyword)
+            return combine(_compile_condition(parts[:index], deps), _compile_condition(parts[index+1:], deps))
+
+    for op_str, op in OPERATORS.items():
+        if op_str in parts:
+            index = parts.index(op_str)
+            return _compile_compare(op, _compile_operand(' '.join(parts[:index]), deps), _compile_operand(' '.join(parts[index+1:]), deps))
+
+    raise ValueError(f'Invalid condition: {" ".join(parts)}')
+
+
+def _any(left, right):
+    return lambda ctx: left(ctx) or right(ctx)
+
+
+def _all(left, right):
+    return lambda ctx: left(ctx) and right(ctx)
+
+
+def _compile_compare(op, left: tuple, right: tuple):
+    """Compiles a comparison of two operands.
+        If a string constant holds a number, it is compared as number when the other operand is numeric.
+    """
+
+    get_left, left_number = left
+    get_right, right_number = right
+
+    if left_number is None and right_number is None:
+        return lambda ctx: op(get_left(ctx), get_right(ctx))
+
+    def compare(ctx):
+        left_value = get_left(ctx)
+        right_value = get_right(ctx)
+        if right_number is not None and _is_number(left_value):
+            right_value = right_number
+        if left_number is not None and _is_number(right_value):
+            left_value = left_number
+        return op(left_value, right_value)
+    return compare
+
+
+def _compile_operand(operand: str, deps: CompiledAction) -> tuple:
+    """Compiles an operand into a getter function
+
+    Returns:
+        tuple: (getter, numeric value of a string constant or None)
+    """
+
+    if len(operand) == 0:
+        raise ValueError('Invalid operand: empty')
+
+    # string constant
+    if len(operand) >= 2 and operand[0] == "'" and operand[-1] == "'":
+        constant = operand[1:-1]
+        return (lambda ctx: constant), _to_number(constant)
+
+    # numeric constant
+    number = _to_number(operand)
+    if number is not None:
+        return (lambda ctx: number), None
+
+    # temp variable
+    if operand[0] == '$':
+        def get_temp_var(ctx):
+            try:
+                return ctx.temp_vars[operand]
+            except KeyError:
+                raise Exception(f'Variable {operand} not found')
+        return get_temp_var, None
+
+    # value of the entity the action belongs to
+    if operand == 'value':
+        return (lambda ctx: ctx.value), None
+
+    if ' ' in operand:
+        raise ValueError(f'Invalid operand: {operand}')
+
+    # current value of an other entity
+    deps.reads.add(operand)
+
+    def get_entity_value(ctx):
+        entity = get_entity(operand)
+        if entity is None:
+            raise Exception(f'Entity {operand} not found')
+        return entity.current_value
+    return get_entity_value, None
+
+
+def _to_number(text: str):
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
@@ -1,34 +1,85 @@
 from purepyhome.core.signals.register_entity import connect_to_register_entity
 from purepyhome.core.signals.remove_entity import connect_to_remove_entity
-from purepyhome.core.signals.update_entity import connect_to_update_entity
+from purepyhome.core.signals.update_entity import connect_to_update_entity, disconnect_from_update_entity
 from purepyhome.core.logger import get_module_logger
+from purepyhome.core.tracing import tracer
 
-from .actions_phraser import ActionsPhraser
+from purepyhome.core.core import get_entity
+
+from .actions_compiler import CompiledAction
+
+import heapq
+import threading
 
 logger = get_module_logger(__name__)
 
+
+class _RuleWave:
+    """The rules affected by one propagation (an update and the updates made by its actions)
+        Every rule runs at most once per propagation, in rank order. As a rule only triggers rules
+        of a higher rank, a rule has seen all updates of the propagation that affect it when it runs.
+    """
+
+    def __init__(self):
+        self.queue = []         # heap of [rank, seq, rule, changed, callstack]
+        self.scheduled = {}     # id(rule) -> queue entry
+        self.done = set()       # id(rule) of the rules that ran
+        self.values = {}        # entity id -> value of its latest update in this propagation
+        self.seq = 0
+
+    def add(self, entity_id, value, last_value, callstack, dependents):
+        self.values[entity_id] = value
+        changed = value != last_value
+        for rule in dependents.get(entity_id, ()):
+            if id(rule) in self.done:
+                continue
+            entry = self.scheduled.get(id(rule))
+            if entry is None:
+                self.seq += 1
+                entry = self.scheduled[id(rule)] = [rule["rank"], self.seq, rule, changed, callstack]
+                heapq.heappush(self.queue, entry)
+            else:
+                entry[3] = entry[3] or changed
+                entry[4] = callstack
+
+    def next(self):
+        if len(self.queue) == 0:
+            return None
+        entry = heapq.heappop(self.queue)
+        del self.scheduled[id(entry[2])]
+        self.done.add(id(entry[2]))
+        return entry
+
 class Actions:
     """Actions class
-        It handles the execution of actions for entities, whenever an entity is updated
+        It handles the execution of actions for entities.
+        An action (rule) runs whenever its entity or one of the entities it reads is updated.
+        It subscribes to the update_entity signal only for the entities that trigger rules.
+        The updates made by the actions do not run rules directly, the affected rules are collected
+        and every rule runs once per propagation, in topological order (see _RuleWave).
 
         Attributes:
-            actions: A dictionary that stores the actions for each entity
+            actions: A dictionary that stores the rules (compiled actions) for each entity
+            dependents: A dictionary that maps entity ids to the rules triggered by them, in topological order
         Functions:
             on_register_entity: Signal handler for register_entity signal
             on_remove_entity: Signal handler for remove_entity signal
             on_update_entity: Signal handler for update_entity signal
-            __register_action: Registers an action for an entity
+            __register_action: Compiles and registers an action for an entity
             __unregister_action: Unregisters an action for an entity
-            __run_actions: Runs the actions for an entity
+            __rebuild_index: Rebuilds the dependency index and detects cycles
+            __run_actions: Runs the rules depending on an entity
 
     """
 
     def __init__(self):
         self.actions = {}
+        self.dependents = {}
+
+        self._local = threading.local()
 
         connect_to_register_entity(self.on_register_entity)
         connect_to_remove_entity(self.on_remove_entity)
-        connect_to_update_entity(self.on_update_entity)
 
     
     def on_register_entity(self, sender, **kwargs):
@@ -101,11 +152,14 @@ class Actions:
             logger.error(f'Error getting required parameters: {e}')
             return
         else:
+            started = tracer.start()
             self.__run_actions(entity_id, value, last_value, callstack)
+            tracer.stop('actions', started)
 
 
     def __register_action(self, entity_id, action_type, action):
-        """Registers an action for an entity
+        """Compiles and registers an action for an entity (invalid actions are logged and not registered)
+            Actions that would create a cycle in the dependency graph are rejected.
         Args:
             entity_id: The entity id
             action_type: The action type: on_update, on_change
@@ -114,10 +168,33 @@ class Actions:
             None
         """
 
+        try:
+            compiled_action = CompiledAction(action)
+        except ValueError as e:
+            logger.error(f'Error compiling action {action_type} for entity {entity_id}: {e}')
+            return
+
+        rule = {"entity_id": entity_id,
+                "action_type": action_type,
+                "action": compiled_action,
+                "triggers": {entity_id} | compiled_action.reads,
+                "rank": 0
+                }
+
         if entity_id not in self.actions:
             self.actions[entity_id] = []
-        self.actions[entity_id].append({"action_type": action_type, "action": action})
-        logger.info(f'Registered action {action_type} for entity {entity_id}')
+        self.actions[entity_id].append(rule)
+
+        cycle = self.__rebuild_index()
+        if cycle is not None:
+            self.actions[entity_id].remove(rule)
+            if len(self.actions[entity_id]) == 0:
+                del self.actions[entity_id]
+            self.__rebuild_index()
+            logger.error(f'Error registering action {action_type} for entity {entity_id}: dependency cycle between {cycle}')
+            return
+
+        logger.info(f'Registered action {action_type} for entity {entity_id} (triggered by {sorted(rule["triggers"])})')
 
     def __unregister_action(self, entity_id):
         """Unregisters an action for an entity
@@ -129,28 +206,97 @@ class Actions:
 
         if entity_id in self.actions:
             del self.actions[entity_id]
+            self.__rebuild_index()
             logger.info(f'Unregistered actions for entity {entity_id}')
 
 
+    def __rebuild_index(self):
+        """Rebuilds the reverse index (entity -> dependent rules) and ranks the rules in topological order
+            A rule depends on another rule if it is triggered by an entity the other rule writes.
+            The update_entity subscriptions follow the entities of the index.
+        Args:
+            None
+        Returns:
+            The entities of the rules forming a cycle, or None if the rules are acyclic
+        """
+
+        rules = [rule for entity_rules in self.actions.values() for rule in entity_rules]
+
+        dependents = {}
+        for rule in rules:
+            for trigger in rule["triggers"]:
+                dependents.setdefault(trigger, []).append(rule)
+
+        # Kahn's algorithm, the rank of a rule is the length of the longest chain of rules leading to it
+        in_degree = {id(rule): 0 for rule in rules}
+        for rule in rules:
+            for written in rule["action"].writes:
+                for dependent in dependents.get(written, []):
+                    in_degree[id(dependent)] += 1
+
+        for rule in rules:
+            rule["rank"] = 0
+        ready = [rule for rule in rules if in_degree[id(rule)] == 0]
+        ranked = 0
+        while ready:
+            rule = ready.pop()
+            ranked += 1
+            for written in rule["action"].writes:
+                for dependent in dependents.get(written, []):
+                    dependent["rank"] = max(dependent["rank"], rule["rank"] + 1)
+                    in_degree[id(dependent)] -= 1
+                    if in_degree[id(dependent)] == 0:
+                        ready.append(dependent)
+
+        if ranked < len(rules):
+            return sorted({rule["entity_id"] for rule in rules if in_degree[id(rule)] > 0})
+
+        for entity_rules in dependents.values():
+            entity_rules.sort(key=lambda rule: rule["rank"])
+
+        for entity_id in self.dependents.keys() - dependents.keys():
+            disconnect_from_update_entity(self.on_update_entity, entity_id=entity_id)
+        for entity_id in dependents.keys() - self.dependents.keys():
+            connect_to_update_entity(self.on_update_entity, entity_id=entity_id)
+        self.dependents = dependents
+        return None
+
+
     def __run_actions(self, entity_id, value, last_value, callstack):
-        """Runs the actions for an entity
+        """Runs the rules that depend on an entity, in topological order
+            (the actions of the entity itself and the actions of other entities that read it).
+            An update made by a running action only adds its rules to the current propagation.
         Args:
             entity_id: The entity id
             value: The value of the entity
+            last_value: The last value of the entity
+            callstack: The callstack of the update
         Returns:
             None
         """
 
-        if entity_id in self.actions:
-            for action in self.actions[entity_id]:
-                if action["action_type"] == "on_update":
-                    actions_phraser = ActionsPhraser()
-                    actions_phraser.setup(logger, value, callstack)
-                    actions_phraser.phrase_action(action["action"])
-                elif action["action_type"] == "on_change":
-                    if value != last_value:
-                        actions_phraser = ActionsPhraser()
-                        actions_phraser.setup(logger, value, callstack)
-                        actions_phraser.phrase_action(action["action"])
-
-actions_manager = Actions()
\ No newline at end of file
+        wave = getattr(self._local, 'wave', None)
+        if wave is not None:
+            wave.add(entity_id, value, last_value, callstack, self.dependents)
+            return
+
+        wave = _RuleWave()
+        wave.add(entity_id, value, last_value, callstack, self.dependents)
+        self._local.wave = wave
+        try:
+            while (entry := wave.next()) is not None:
+                _, _, rule, changed, rule_callstack = entry
+                if rule["action_type"] == "on_change" and not changed:
+                    continue
+
+                if rule["entity_id"] in wave.values:
+                    rule_value = wave.values[rule["entity_id"]]
+                else:
+                    entity = get_entity(rule["entity_id"])
+                    rule_value = entity.current_value if entity is not None else None
+
+                rule["action"].run(logger, rule_value, rule_callstack)
+        finally:
+            self._local.wave = None
+
+actions_manager = Actions()
@@ -24,9 +24,12 @@ class ActionsPhraser:
         if variable == 'value':
             return self.value
         
-        # check if the variable is the value of an other entity
+        # check if the variable is the value of an other entity (served from the entity state cache)
         else:
-            return get_entity(variable)['value']
+            entity = get_entity(variable)
+            if entity is None:
+                raise Exception(f'Entity {variable} not found')
+            return entity.current_value
 
 
     def solve_variable_set(self, variable: str, value: str) -> None:
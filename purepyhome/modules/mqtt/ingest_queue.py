@@ -0,0 +1,229 @@
+from purepyhome.core.logger import get_module_logger
+
+from collections import deque
+
+import threading
+import time
+
+logger = get_module_logger(__name__)
+
+"""This file provides the ingest queue of the MqttSubscriber
+    Incomming messages are put into a bounded queue by the MQTT network thread and handled by worker threads,
+    so a slow message handler (db writes, actions, emits) does not stall the MQTT connection.
+    Messages are distributed to the workers by topic, so messages on the same topic are always handled in order.
+"""
+
+INGEST_OVERFLOW_POLICIES = ["drop_oldest", "coalesce", "block"]
+
+
+class _IngestEntry:
+    """A queued message
+    """
+
+    __slots__ = ('topic', 'data', 'enqueued', 'ingress')
+
+    def __init__(self, topic, data, enqueued, ingress):
+        self.topic = topic
+        self.data = data
+        self.enqueued = enqueued
+        self.ingress = ingress
+
+
+class _IngestShard:
+    """The queued messages of one worker
+    """
+
+    def __init__(self, lock):
+        self.entries = deque()
+        self.by_topic = {}
+        self.not_empty = threading.Condition(lock)
+
+
+class IngestQueue:
+    """IngestQueue class
+        A bounded queue of MQTT messages that is drained by worker threads
+
+        Overflow policies (when max_size messages are queued):
+            drop_oldest: the oldest queued message is dropped
+            coalesce: the latest queued message on the same topic is replaced by the new one (latest value wins),
+                      if there is none the oldest queued message is dropped
+            block: the caller (the MQTT network thread) waits until there is space in the queue
+
+        Attributes:
+            handler: The function called with (topic, data, ingress) for every message
+            max_size: The maximum number of queued messages
+            overflow_policy: The overflow policy
+            workers: The number of worker threads
+
+        Functions:
+            start: Starts the worker threads
+            stop: Stops the worker threads
+            put: Queues a message
+            metrics: Returns the queue depth, counters and latency metrics
+    """
+
+    def __init__(self, handler, max_size: int = 1000, overflow_policy: str = "drop_oldest", workers: int = 1):
+
+        if overflow_policy not in INGEST_OVERFLOW_POLICIES:
+            raise ValueError(f'Invalid overflow policy: {overflow_policy} (valid: {INGEST_OVERFLOW_POLICIES})')
+        if not isinstance(max_size, int) or max_size < 1:
+            raise ValueError(f'Invalid ingest queue size: {max_size}')
+        if not isinstance(workers, int) or workers < 1:
+            raise ValueError(f'Invalid number of ingest workers: {workers}')
+
+        self.handler = handler
+        self.max_size = max_size
+        self.overflow_policy = overflow_policy
+        self.workers = workers
+
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._shards = [_IngestShard(self._lock) for _ in range(workers)]
+        self._threads = []
+        self._running = False
+        self._size = 0
+
+        self._counters = {'received': 0, 'processed': 0, 'failed': 0, 'dropped': 0, 'coalesced': 0, 'blocked': 0}
+        self._wait_time = {'total': 0.0, 'max': 0.0}
+        self._handle_time = {'total': 0.0, 'max': 0.0}
+
+
+    def start(self) -> None:
+        """Starts the worker threads
+        """
+
+        if self._running:
+            return
+
+        self._running = True
+        for i, shard in enumerate(self._shards):
+            thread = threading.Thread(target=self.__work, args=(shard,), name=f'mqtt-ingest-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        logger.info(f'Started {self.workers} ingest worker(s) (max size {self.max_size}, overflow policy {self.overflow_policy})')
+
+
+    def stop(self) -> None:
+        """Stops the worker threads (queued messages that were not handled yet are discarded)
+        """
+
+        with self._lock:
+            self._running = False
+            for shard in self._shards:
+                shard.not_empty.notify_all()
+            self._not_full.notify_all()
+
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+
+    def put(self, topic: str, data: str, ingress: int = 0) -> None:
+        """Queues a message, applying the overflow policy if the queue is full
+
+        Args:
+            topic (str): The topic of the message
+            data (str): The message payload
+            ingress (int): The tracing ingress time of the message (0 if tracing is disabled)
+        Returns:
+            None
+        """
+
+        shard = self._shards[hash(topic) % self.workers]
+
+        with self._lock:
+            self._counters['received'] += 1
+
+            if self._size >= self.max_size:
+                if self.overflow_policy == "coalesce":
+                    entry = shard.by_topic.get(topic)
+                    if entry is not None:
+                        entry.data = data
+                        entry.ingress = ingress
+                        self._counters['coalesced'] += 1
+                        return
+
+                if self.overflow_policy == "block":
+                    self._counters['blocked'] += 1
+                    while self._size >= self.max_size and self._running:
+                        self._not_full.wait()
+                else:
+                    self.__drop_oldest()
+
+            entry = _IngestEntry(topic, data, time.monotonic(), ingress)
+            shard.entries.append(entry)
+            if self.overflow_policy == "coalesce":
+                shard.by_topic[topic] = entry
+            self._size += 1
+            shard.not_empty.notify()
+
+
+    def metrics(self) -> dict:
+        """Returns the queue depth, counters and latency metrics
+
+        Args:
+            None
+        Returns:
+            dict: depth, max_size, the message counters and the queue wait/handle times in seconds
+        """
+
+        with self._lock:
+            processed = self._counters['processed'] + self._counters['failed']
+            return {'depth': self._size,
+                    'max_size': self.max_size,
+                    **self._counters,
+                    'wait_time_avg': self._wait_time['total'] / processed if processed else 0.0,
+                    'wait_time_max': self._wait_time['max'],
+                    'handle_time_avg': self._handle_time['total'] / processed if processed else 0.0,
+                    'handle_time_max': self._handle_time['max']
+                    }
+
+
+    def __drop_oldest(self) -> None:
+        """Drops the oldest queued message (must be called with the lock held)
+        """
+
+        shard = min((shard for shard in self._shards if shard.entries), key=lambda shard: shard.entries[0].enqueued)
+        entry = shard.entries.popleft()
+        if shard.by_topic.get(entry.topic) is entry:
+            del shard.by_topic[entry.topic]
+        self._size -= 1
+        self._counters['dropped'] += 1
+        logger.warning('Ingest queue full, dropped message on topic %s', entry.topic)
+
+
+    def __work(self, shard: _IngestShard) -> None:
+        """Worker loop: takes the messages of a shard and calls the handler
+        """
+
+        while True:
+            with self._lock:
+                while not shard.entries and self._running:
+                    shard.not_empty.wait()
+                if not self._running:
+                    return
+
+                entry = shard.entries.popleft()
+                if shard.by_topic.get(entry.topic) is entry:
+                    del shard.by_topic[entry.topic]
+                self._size -= 1
+                self._not_full.notify()
+
+            started = time.monotonic()
+            failed = False
+            try:
+                self.handler(entry.topic, entry.data, entry.ingress)
+            except Exception as e:
+                failed = True
+                logger.error(f'Error handling message on topic {entry.topic}: {e}')
+            finished = time.monotonic()
+
+            with self._lock:
+                self._counters['failed' if failed else 'processed'] += 1
+                wait_time = started - entry.enqueued
+                handle_time = finished - started
+                self._wait_time['total'] += wait_time
+                self._wait_time['max'] = max(self._wait_time['max'], wait_time)
+                self._handle_time['total'] += handle_time
+                self._handle_time['max'] = max(self._handle_time['max'], handle_time)
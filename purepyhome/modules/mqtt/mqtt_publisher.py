@@ -1,9 +1,10 @@
 from purepyhome.core.mqtt import mqtt
-from purepyhome.core.value_converters.value_conversers import run_value_converter
+from purepyhome.core.value_converters.value_conversers import create_value_converter
 from purepyhome.core.signals.register_entity import connect_to_register_entity
 from purepyhome.core.signals.remove_entity import connect_to_remove_entity
-from purepyhome.core.signals.update_entity import connect_to_update_entity
+from purepyhome.core.signals.update_entity import connect_to_update_entity, disconnect_from_update_entity
 from purepyhome.core.utils import nest_data_to_object
+from purepyhome.core.tracing import tracer
 from purepyhome.core.logger import get_module_logger
 
 import json
@@ -16,9 +17,10 @@ class MqttPublisher:
         It listens to the signals: 
             register_entity, remove_entity, update_entity
         ... once a new entity is registered, all updates to the entity will be published to the mqtt topic that the entity is mapped to
+        (it subscribes to the update_entity signal only for the mapped entities)
 
         Attributes:
-            map: A dictionary that maps entities to topics and keys
+            map: A dictionary that maps entities to topics, keys and converter instances
 
         Functions:
             on_register_entity: Signal handler for register_entity signal
@@ -35,7 +37,6 @@ class MqttPublisher:
 
         connect_to_register_entity(self.on_register_entity)
         connect_to_remove_entity(self.on_remove_entity)
-        connect_to_update_entity(self.on_update_entity)
 
 
     def on_register_entity(self, sender, **kwargs):
@@ -133,9 +134,16 @@ class MqttPublisher:
             None
         """
 
+        try:
+            converter = create_value_converter(converter_name, converter_info)
+        except ValueError as e:
+            logger.error(f'Error creating converter {converter_name} for entity {entity}: {e}')
+            return
+
         if entity not in self.map:
             self.map[entity] = []
-        self.map[entity].append({"topic": topic, "key": key, "converter_name": converter_name, "converter_info": converter_info})
+            connect_to_update_entity(self.on_update_entity, entity_id=entity)
+        self.map[entity].append({"topic": topic, "key": key, "converter": converter})
         logger.info(f'Mapped entity {entity} to topic {topic} with key {key} (uses converter {converter_name})')
 
 
@@ -150,6 +158,7 @@ class MqttPublisher:
 
         if entity in self.map:
             self.map.pop(entity)
+            disconnect_from_update_entity(self.on_update_entity, entity_id=entity)
             logger.info(f'mqtt_data_publisher::: Unmapped entity {entity}')
 
 
@@ -167,19 +176,26 @@ class MqttPublisher:
             for entry in self.map[entity]:
                 topic = entry["topic"]
                 key = entry["key"]
-                converter_name = entry["converter_name"]
-                converter_info = entry["converter_info"]
 
-                data_conv = run_value_converter(data, converter_name, converter_info, True)
+                try:
+                    data_conv = entry["converter"].reverse(data)
+                except ValueError as e:
+                    logger.error(f'Error converting value {data} for entity {entity}: {e}')
+                    continue
 
                 if key != "":
                     data_obj = nest_data_to_object(key, data_conv)
-                    data = json.dumps(data_obj)
+                    payload = json.dumps(data_obj)
+                elif isinstance(data_conv, (dict, list)):
+                    payload = json.dumps(data_conv)
                 else:
-                    data = str(data_conv)
+                    payload = str(data_conv)
                     
-                logger.info(f'mqtt_data_publisher::: Publishing data {data} to topic {topic}')
-                mqtt.publish(topic, data)
+                logger.info('mqtt_data_publisher::: Publishing data %s to topic %s', payload, topic)
+                started = tracer.start()
+                mqtt.publish(topic, payload)
+                tracer.stop('mqtt.publish', started)
+                tracer.stop_e2e('e2e.mqtt_publish')
 
 
 mqtt_publisher = MqttPublisher()
\ No newline at end of file
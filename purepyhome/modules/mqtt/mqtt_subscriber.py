@@ -1,15 +1,21 @@
 from purepyhome.core.mqtt import mqtt
-from purepyhome.core.value_converters.value_conversers import run_value_converter
+from purepyhome.core.value_converters.value_conversers import create_value_converter
 from purepyhome.core.signals.register_entity import connect_to_register_entity
 from purepyhome.core.signals.remove_entity import connect_to_remove_entity
-from purepyhome.core.core import update_entity
-from purepyhome.core.utils import get_nested_value
+from purepyhome.core.core import update_entities
+from purepyhome.core.utils import compile_key_path, get_compiled_value, json_loads
 from purepyhome.core.logger import get_module_logger
+from purepyhome.core.tracing import tracer
 
-import json
+from .topic_trie import TopicTrie
+from .ingest_queue import IngestQueue
+
+import logging
 
 logger = get_module_logger(__name__)
 
+_NOT_PARSED = object()      # marker for a message payload that was not parsed yet
+
 class MqttSubscriber:
     """MqttSubscriber class
         It handles the subscription to mqtt topics and updates the entities accordingly
@@ -19,19 +25,28 @@ class MqttSubscriber:
             when a mqtt message is received, it updates the entities that are mapped to the topic via the update_entity signal
 
         Attributes:
-            map: A dictionary that maps topics and keys to entities
+            topic_trie: A trie that maps topic filters (with + and # wildcards) to dictionaries that map keys to entities
+                        (each key entry holds the compiled key path and the list of entities with their converter instances)
+            subscriptions: The set of topic filters currently subscribed (the minimal set covering all filters in the trie)
+            ingest_queue: The queue that decouples message handling from the MQTT network thread (None: messages are handled inline)
 
         Functions:
+            init_app: Sets up the ingest queue from the app config
             on_register_entity: Signal handler for register_entity signal
             on_remove_entity: Signal handler for remove_entity signal
             on_mqtt_message: Handler for incomming MQTT messages
-            __handle_mqtt_message: Handles incomming MQTT messages
+            __handle_mqtt_message: Handles incomming MQTT messages (keeps the tracing ingress time)
+            __process_mqtt_message: Collects the values of a message and updates the entities
             __register_entity: Registers an entity to a topic
             __unregister_entity: Unregisters an entity from a topic
+            __update_subscriptions: Subscribes to the minimal set of topic filters
+            __sync_subscriptions: Subscribes/unsubscribes the difference to the minimal set of topic filters
     """
 
     def __init__(self):
-        self.map = {}
+        self.topic_trie = TopicTrie()
+        self.subscriptions = set()
+        self.ingest_queue = None
 
         connect_to_register_entity(self.on_register_entity)
         connect_to_remove_entity(self.on_remove_entity)
@@ -40,6 +55,35 @@ class MqttSubscriber:
         mqtt.on_connect()(self.on_mqtt_connect)
 
 
+    def init_app(self, app):
+        """Sets up the ingest queue from the app config (MQTT_INGEST)
+            With 0 workers the messages are handled inline on the MQTT network thread
+
+        Args:
+            app: The Flask app object
+        Returns:
+            None
+        """
+
+        ingest_config = app.config.get('MQTT_INGEST') or {}
+        workers = ingest_config.get('workers', 1)
+
+        if workers == 0:
+            logger.info(f'No ingest workers configured, handling MQTT messages inline')
+            return
+
+        try:
+            self.ingest_queue = IngestQueue(self.__handle_mqtt_message,
+                                            max_size=ingest_config.get('max_size', 1000),
+                                            overflow_policy=ingest_config.get('overflow_policy', 'drop_oldest'),
+                                            workers=workers)
+        except ValueError as e:
+            logger.error(f'Error setting up the ingest queue: {e}')
+            return
+
+        self.ingest_queue.start()
+
+
     def on_register_entity(self, sender, **kwargs):
         """Signal handler for register_entity signal
             Checks if the entity has a mqtt data source and calls the __register_entity function
@@ -72,8 +116,8 @@ class MqttSubscriber:
                     else:
                         key = ""
 
-                    converter_name = new_entity.data_sink.converter_name
-                    converter_info = new_entity.data_sink.converter_info
+                    converter_name = new_entity.data_source.converter_name
+                    converter_info = new_entity.data_source.converter_info
 
                     self.__register_entity(topic, key, entity_id, converter_name, converter_info)
 
@@ -91,20 +135,12 @@ class MqttSubscriber:
 
         try:
             entity_id = kwargs.get('entity_id')
-            entity_info = kwargs.get('entity')
         except Exception as e:
             logger.error(f'Error getting required parameters: {e}')
             return
         else:
-            if "data_source" in entity_info:
-                if "mqtt" in entity_info["data_source"]:
-                    if "topic" in entity_info["data_source"]["mqtt"]:
-                        topic = entity_info["data_source"]["mqtt"]["topic"]
-                        if "key" in entity_info["data_source"]["mqtt"]:
-                            key = entity_info["data_source"]["mqtt"]["key"]
-                        else:
-                            key = ""
-                        self.__unregister_entity(entity_id)
+            self.__unregister_entity(entity_id)
+
 
     def on_mqtt_connect(self, client, userdata, flags, rc):
         """Handler for MQTT connection
@@ -124,7 +160,8 @@ class MqttSubscriber:
 
     def on_mqtt_message(self, client, userdata, message):
         """Handler for incomming MQTT messages
-            this function reads the message payload and calls the __handle_mqtt_message function
+            this function reads the message payload and queues it for the ingest workers 
+            (or calls the __handle_mqtt_message function directly if there is no ingest queue)
 
         Args:
             client: The client
@@ -135,57 +172,113 @@ class MqttSubscriber:
         """
 
         if message.payload is not None:
+            ingress = tracer.ingress()
             data = message.payload.decode()
             topic = message.topic
 
-            logger.info(f'Received message on topic {topic} with data {data}')
-            self.__handle_mqtt_message(topic, data)
+            logger.debug('Received message on topic %s with data %s', topic, data)
+            if self.ingest_queue is not None:
+                self.ingest_queue.put(topic, data, ingress)
+            else:
+                self.__handle_mqtt_message(topic, data, ingress)
 
 
-    def __handle_mqtt_message(self, topic, data):
+    def __handle_mqtt_message(self, topic, data, ingress=0):
         """Handles incomming MQTT messages
-            this function calls all update_entity signals for the entities that are mapped to the topic
+            With tracing enabled the ingress time of the message is kept for the thread while it is handled
 
         Args:
             topic: The topic
             data: The message data
+            ingress: The tracing ingress time of the message (0 if tracing is disabled)
         Returns:
             None
         """
 
-        logger.debug(f'Map entry for topic {topic}: {self.map[topic]}')
+        if not ingress:
+            self.__process_mqtt_message(topic, data)
+            return
 
-        for key in self.map[topic]:
+        tracer.stop('ingest.wait', ingress)
+        tracer.set_ingress(ingress)
+        started = tracer.start()
+        try:
+            self.__process_mqtt_message(topic, data)
+        finally:
+            tracer.stop('mqtt.handle', started)
+            tracer.set_ingress(0)
 
-            if key != "":
-                try:
-                    data_ext = json.loads(data)
-                except:
-                    logger.error(f'Could not parse message payload to json')
-                    return
-                value = get_nested_value(data_ext, key)
-                logger.debug(f'Extracted value {value} from key {key}')
-            else:
-                value = data
 
-            if value is not None:
-                for entity in self.map[topic][key]:
-                    entity_id = entity["entity_id"]
-                    converter_name = entity["converter_name"]
-                    converter_info = entity["converter_info"]
+    def __process_mqtt_message(self, topic, data):
+        """Processes incomming MQTT messages
+            this function collects the values for all entities that are mapped to a topic filter matching the topic
+            and updates them together in a single database transaction
+
+        Args:
+            topic: The topic
+            data: The message data
+        Returns:
+            None
+        """
 
-                    out_value = run_value_converter(data, converter_name, converter_info, False)
+        key_maps = self.topic_trie.match(topic)
+        if not key_maps:
+            logger.debug('No entity mapped to topic %s', topic)
+            return
 
-                    logger.info(f'Updating entity {entity_id} with value {out_value}')
-                    update_entity(__name__, entity_id=entity_id, value=out_value, callstack=[])
+        updates = []
+        payload = _NOT_PARSED
+        debug = logger.isEnabledFor(logging.DEBUG)
+
+        for key_map in key_maps:
+            if debug:
+                logger.debug('Map entry for topic %s: %s', topic, key_map)
+
+            for key, key_entry in key_map.items():
+
+                if key_entry["key_path"]:
+                    # the payload is parsed only once, no matter how many keys are mapped
+                    if payload is _NOT_PARSED:
+                        started = tracer.start()
+                        try:
+                            payload = json_loads(data)
+                        except ValueError:
+                            logger.error(f'Could not parse message payload to json')
+                            return
+                        tracer.stop('mqtt.decode', started)
+                    value = get_compiled_value(payload, key_entry["key_path"])
+                    if debug:
+                        logger.debug('Extracted value %s from key %s', value, key)
+                else:
+                    value = data
+
+                if value is not None:
+                    for entity in key_entry["entities"]:
+                        entity_id = entity["entity_id"]
+
+                        started = tracer.start()
+                        try:
+                            out_value = entity["converter"].forward(value)
+                        except ValueError as e:
+                            logger.error(f'Error converting value {value} for entity {entity_id}: {e}')
+                            continue
+                        tracer.stop('mqtt.convert', started)
+
+                        if debug:
+                            logger.debug('Updating entity %s with value %s', entity_id, out_value)
+                        updates.append((entity_id, out_value))
+
+        if updates:
+            update_entities(__name__, updates=updates, callstack=[])
 
 
     def __register_entity(self, topic, key, entity_id, converter_name, converter_info):
         """Registers an entity to a topic
-            this function registers the entity to the topic and key in the map and subscribes to the topic
+            this function registers the entity to the topic filter and key in the trie and subscribes to the topic filter,
+            unless it is already covered by a subscribed wildcard filter
 
         Args:
-            topic: The topic
+            topic: The topic filter (may contain + and # wildcards)
             key: The key
             entity_id: The entity_id
             converter_name: The name of the data converter
@@ -194,20 +287,31 @@ class MqttSubscriber:
             None
         """
 
-        if topic not in self.map:   # if the topic is not in the map, add it
-            self.map[topic] = {}
-        if key not in self.map[topic]:    # if the key is not in the map, add it
-            self.map[topic][key] = []
-        self.map[topic][key].append({"entity_id": entity_id, "converter_name": converter_name, "converter_info": converter_info})
+        try:
+            converter = create_value_converter(converter_name, converter_info)
+        except ValueError as e:
+            logger.error(f'Error creating converter {converter_name} for entity {entity_id}: {e}')
+            return
+
+        key_map = self.topic_trie.get(topic)
+        if key_map is None:     # if the topic is not in the trie, add it
+            key_map = {}
+            self.topic_trie.add(topic, key_map)
+        if key not in key_map:    # if the key is not in the map, add it (with the compiled key path)
+            key_map[key] = {"key_path": compile_key_path(key), "entities": []}
+        key_map[key]["entities"].append({"entity_id": entity_id, "converter": converter})
 
         logger.info(f'Mapped topic {topic} with key {key} to entity {entity_id} (using converter {converter_name})')
-        
-        logger.info(f'Subscribing to topic {topic} ...')
-        mqtt.subscribe(topic)  
+
+        # while not connected the subscriptions are made in on_mqtt_connect
+        if mqtt.connected:
+            self.__sync_subscriptions()
+
 
     def __update_subscriptions(self):
         """Updates the subscriptions
-            this function unsubscribes from all topics and subscribes again to all topics in the map
+            this function unsubscribes from all topics and subscribes again to the minimal set of topic filters,
+            filters that are covered by a wildcard filter (eg. sensors/a by sensors/#) are not subscribed separately
 
         Args:
             None
@@ -217,14 +321,37 @@ class MqttSubscriber:
 
         logger.info(f'Updating all MQTT subscriptions ...')
         mqtt.unsubscribe_all()
-        for topic in self.map:
+        self.subscriptions = set(self.topic_trie.minimal_filters())
+        for topic in self.subscriptions:
             mqtt.subscribe(topic)
             logger.info(f'Subscribed to topic {topic}')
 
 
+    def __sync_subscriptions(self):
+        """Subscribes to new and unsubscribes from no longer needed topic filters,
+            so that the subscriptions match the minimal set of topic filters again
+
+        Args:
+            None
+        Returns:
+            None
+        """
+
+        minimal_filters = set(self.topic_trie.minimal_filters())
+
+        for topic in minimal_filters - self.subscriptions:
+            logger.info(f'Subscribing to topic {topic} ...')
+            mqtt.subscribe(topic)
+        for topic in self.subscriptions - minimal_filters:
+            mqtt.unsubscribe(topic)
+            logger.info(f'Unsubscribed from topic {topic}')
+
+        self.subscriptions = minimal_filters
+
+
     def __unregister_entity(self, entity_id):
         """Unregisters an entity from a topic
-            this function unregisters the entity from the topic in the map and unsubscribes from the topic if no entity is left
+            this function unregisters the entity from the topic filters in the trie and unsubscribes from the topic filters no longer needed
 
         Args:
             entity_id: The entity_id
@@ -232,18 +359,26 @@ class MqttSubscriber:
             None
         """
 
-        # search for the entity in the map and remove it
-        for topic in self.map:
-            for key in self.map[topic]:
-                if entity_id in self.map[topic][key]:
-                    self.map[topic][key].remove(entity_id)
-
-                    if len(self.map[topic][key]) == 0:  # if no entity is left, remove the key
-                        del self.map[topic][key]
-                        if len(self.map[topic]) == 0:   # if no key is left, remove the topic and unsubscribe
-                            del self.map[topic]
-                            mqtt.unsubscribe(topic)
-                            logger.info(f'Unsubscribed from topic {topic}') 
+        removed = False
+
+        # search for the entity in the trie and remove it
+        for topic, key_map in self.topic_trie.items():
+            for key in list(key_map):
+                entries = [entry for entry in key_map[key]["entities"] if entry["entity_id"] != entity_id]
+                if len(entries) == len(key_map[key]["entities"]):
+                    continue
+
+                removed = True
+                if len(entries) == 0:   # if no entity is left, remove the key
+                    del key_map[key]
+                else:
+                    key_map[key]["entities"] = entries
+
+            if len(key_map) == 0:   # if no key is left, remove the topic
+                self.topic_trie.remove(topic)
+
+        if removed and mqtt.connected:
+            self.__sync_subscriptions()
 
 
 mqtt_subscriber = MqttSubscriber()
@@ -0,0 +1,286 @@
+
+"""This file provides a trie of MQTT topic filters
+    The filters are split into their levels at '/' and stored level by level,
+    so matching a topic against all registered filters costs O(topic depth) instead of O(number of filters).
+    The MQTT wildcards are supported:
+        + matches exactly one level         eg. zigbee2mqtt/+/state matches zigbee2mqtt/lamp/state
+        # matches any number of levels      eg. sensors/# matches sensors, sensors/a and sensors/a/b
+    Topics starting with '$' (eg. $SYS/...) are not matched by wildcards on the first level.
+"""
+
+class _TopicTrieNode:
+    """A single level of the topic trie
+    """
+
+    __slots__ = ('children', 'value', 'has_value')
+
+    def __init__(self):
+        self.children = {}
+        self.value = None
+        self.has_value = False
+
+
+class TopicTrie:
+    """TopicTrie class
+        It stores a value for each MQTT topic filter and finds the values of all filters matching a topic
+
+        Attributes:
+            root: The root node of the trie
+
+        Functions:
+            add: Sets the value of a topic filter
+            get: Gets the value of a topic filter
+            remove: Removes a topic filter
+            items: Returns all (topic filter, value) pairs
+            match: Returns the values of all topic filters matching a topic
+            is_covered: Checks if a topic filter is covered by another registered filter
+            minimal_filters: Returns the registered filters that are not covered by another one
+            covers: Checks if a topic filter covers another one
+    """
+
+    def __init__(self):
+        self.root = _TopicTrieNode()
+        self.size = 0
+
+
+    def __len__(self) -> int:
+        return self.size
+
+
+    def __contains__(self, topic_filter: str) -> bool:
+        node = self.__find_node(topic_filter)
+        return node is not None and node.has_value
+
+
+    def add(self, topic_filter: str, value: any) -> None:
+        """Sets the value of a topic filter (replaces the existing value)
+
+        Args:
+            topic_filter (str): The topic filter (may contain + and # wildcards)
+            value (any): The value to store for the filter
+        Returns:
+            None
+        """
+
+        levels = topic_filter.split('/')
+        for i, level in enumerate(levels):
+            if level == '#' and i != len(levels) - 1:
+                raise ValueError(f'Invalid topic filter {topic_filter}: # must be the last level')
+
+        node = self.root
+        for level in levels:
+            child = node.children.get(level)
+            if child is None:
+                child = _TopicTrieNode()
+                node.children[level] = child
+            node = child
+
+        if not node.has_value:
+            self.size += 1
+        node.value = value
+        node.has_value = True
+
+
+    def get(self, topic_filter: str, default: any = None) -> any:
+        """Gets the value of a topic filter
+
+        Args:
+            topic_filter (str): The topic filter
+            default (any): The value returned if the filter is not registered
+        Returns:
+            any: The value of the filter
+        """
+
+        node = self.__find_node(topic_filter)
+        if node is None or not node.has_value:
+            return default
+        return node.value
+
+
+    def remove(self, topic_filter: str) -> None:
+        """Removes a topic filter and prunes the nodes that are no longer needed
+
+        Args:
+            topic_filter (str): The topic filter
+        Returns:
+            None
+        """
+
+        path = [self.root]
+        levels = topic_filter.split('/')
+        for level in levels:
+            child = path[-1].children.get(level)
+            if child is None:
+                return
+            path.append(child)
+
+        node = path[-1]
+        if not node.has_value:
+            return
+        node.value = None
+        node.has_value = False
+        self.size -= 1
+
+        for i in range(len(levels) - 1, -1, -1):
+            node = path[i + 1]
+            if node.has_value or node.children:
+                break
+            del path[i].children[levels[i]]
+
+
+    def items(self) -> list:
+        """Returns all (topic filter, value) pairs
+
+        Args:
+            None
+        Returns:
+            list: list of (topic filter, value) tuples
+        """
+
+        result = []
+        stack = [(self.root, [])]
+        while stack:
+            node, levels = stack.pop()
+            if node.has_value:
+                result.append(('/'.join(levels), node.value))
+            for level, child in node.children.items():
+                stack.append((child, levels + [level]))
+        return result
+
+
+    def match(self, topic: str) -> list:
+        """Returns the values of all topic filters matching a topic
+
+        Args:
+            topic (str): The topic of a message (no wildcards)
+        Returns:
+            list: The values of the matching filters
+        """
+
+        result = []
+        nodes = [self.root]
+        wildcards = not topic.startswith('$')
+
+        for level in topic.split('/'):
+            next_nodes = []
+            for node in nodes:
+                children = node.children
+                if wildcards:
+                    multi = children.get('#')
+                    if multi is not None and multi.has_value:
+                        result.append(multi.value)
+                    single = children.get('+')
+                    if single is not None:
+                        next_nodes.append(single)
+                child = children.get(level)
+                if child is not None:
+                    next_nodes.append(child)
+            if not next_nodes:
+                return result
+            nodes = next_nodes
+            wildcards = True
+
+        for node in nodes:
+            if node.has_value:
+                result.append(node.value)
+            # a trailing # also matches the parent level (sensors/# matches sensors)
+            multi = node.children.get('#')
+            if multi is not None and multi.has_value:
+                result.append(multi.value)
+        return result
+
+
+    def is_covered(self, topic_filter: str) -> bool:
+        """Checks if a topic filter is covered by another registered filter
+            (every topic matching topic_filter is also matched by the other filter)
+
+        Args:
+            topic_filter (str): The topic filter
+        Returns:
+            bool: True if another registered filter covers the filter
+        """
+
+        levels = topic_filter.split('/')
+        return self.__is_covered(self.root, levels, 0, True)
+
+
+    def minimal_filters(self) -> list:
+        """Returns the registered filters that are not covered by another registered filter.
+            Subscribing to these filters receives every message that any registered filter matches.
+
+        Args:
+            None
+        Returns:
+            list: The minimal list of topic filters
+        """
+
+        return [topic_filter for topic_filter, _ in self.items() if not self.is_covered(topic_filter)]
+
+
+    @staticmethod
+    def covers(topic_filter: str, other_filter: str) -> bool:
+        """Checks if topic_filter covers other_filter (every topic matching other_filter matches topic_filter)
+
+        Args:
+            topic_filter (str): The (broader) topic filter
+            other_filter (str): The (narrower) topic filter
+        Returns:
+            bool: True if topic_filter covers other_filter
+        """
+
+        levels = topic_filter.split('/')
+        other_levels = other_filter.split('/')
+
+        for i, level in enumerate(levels):
+            if level == '#':
+                return i > 0 or not other_levels[0].startswith('$')
+            if i >= len(other_levels):
+                return False
+            other_level = other_levels[i]
+            if level == '+':
+                if other_level == '#' or (i == 0 and other_level.startswith('$')):
+                    return False
+            elif level != other_level:
+                return False
+
+        return len(levels) == len(other_levels)
+
+
+    def __find_node(self, topic_filter: str) -> _TopicTrieNode:
+        node = self.root
+        for level in topic_filter.split('/'):
+            node = node.children.get(level)
+            if node is None:
+                return None
+        return node
+
+
+    def __is_covered(self, node: _TopicTrieNode, levels: list, i: int, exact: bool) -> bool:
+        """Walks the trie along the levels of a filter, following every filter that covers it.
+            exact is True as long as the walked path is identical to the filter itself (which does not count).
+        """
+
+        wildcards = i > 0 or not levels[0].startswith('$')
+
+        multi = node.children.get('#') if wildcards else None
+        if multi is not None and multi.has_value:
+            if not (exact and i == len(levels) - 1 and levels[i] == '#'):
+                return True
+
+        if i == len(levels):
+            return node.has_value and not exact
+
+        level = levels[i]
+        if level == '#':
+            return False
+
+        single = node.children.get('+') if wildcards else None
+        if single is not None and self.__is_covered(single, levels, i + 1, exact and level == '+'):
+            return True
+
+        if level != '+':
+            child = node.children.get(level)
+            if child is not None and self.__is_covered(child, levels, i + 1, exact):
+                return True
+
+        return False
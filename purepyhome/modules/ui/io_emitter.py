@@ -1,31 +1,98 @@
 from purepyhome.core.socketio import socketio
-from purepyhome.core.signals.update_entity import connect_to_update_entity
+from purepyhome.core.core import get_entity
+from purepyhome.core.signals.update_entity import connect_to_update_entity, disconnect_from_update_entity
 from purepyhome.core.logger import get_module_logger
+from purepyhome.core.tracing import tracer
 
-import json
+from flask import request
+from flask_socketio import emit, join_room, leave_room
+
+import hashlib
+import threading
+import uuid
 
 logger = get_module_logger(__name__)
 
 class SocketIoEmitter:
     """SocketIoEmitter class
-        It handles the emitting all updates to the entities to the socket io clients
-        It listens to the signals: 
+        It handles the emitting of the updates to the entities to the socket io clients
+        It listens to the signals:
             update_entity
-        There is no need to register entities, as all updates are emitted to all clients
+        There is no need to register entities.
+        It subscribes to the update_entity signal only for the entities shown on a connected client.
+        Clients subscribe to the entities shown on their page (event: subscribe_entities, data: {'entity_ids': [...]})
+        and join a room shared by all clients with the same set of entities.
+        Every update carries the sequence number the core assigned to it when it was committed (increasing over all entities),
+        an update that arrives after a later update of the same entity (eg. the outer update of an action rewriting its
+        trigger entity) is stale and dropped. On subscribe the client gets a snapshot of the current values
+        (event: entity_snapshot_from_serv, data: {'epoch', 'seq', 'entities': {entity_id: value}}).
+        A client that reconnects sends its last epoch and seq and only gets the entities updated since then.
+        The updates are collected and emitted every tick as one frame per room (event: entity_updates_from_serv,
+        data: {'seq', 'entities': {entity_id: value}, 'seqs': {entity_id: seq}}), only the latest value of an entity is sent.
+        With the sequence number of each entity a client can recognize the echo of its own update (see SocketIoReceiver).
 
         Attributes:
-            None
+            tick: The emit interval in seconds (0 emits every update directly)
+            epoch: A random id of this server run (sequence numbers of an other run are not valid)
+            seq: The highest sequence number of the followed updates
+            entity_seq: A dictionary that maps entity ids to the sequence number of their latest update
+                        (entities without subscribed clients are not followed and are left out)
+            pending: A dictionary that maps entity ids to their latest not yet emitted value
+            pending_ingress: A dictionary that maps entity ids to the tracing ingress time of their oldest not yet emitted update
+            rooms: A dictionary that maps room names to the subscribed entity ids
+            entity_rooms: A dictionary that maps entity ids to the rooms subscribed to them
+            room_clients: A dictionary that maps room names to the session ids of their clients
+            client_rooms: A dictionary that maps session ids to the room of the client
         Functions:
+            init_app: Reads the configuration and starts the emit task
             on_update_entity: Signal handler for update_entity signal
-            __emit_entity: Emits the entity update to all clients
+            on_subscribe_entities: Event handler for subscribe_entities event
+            on_disconnect: Event handler for disconnect event
+            __snapshot: Collects the current values of entities
+            __leave: Removes a client from its room
+            __emit_loop: Background task emitting the collected updates every tick
+            __emit_pending: Emits the collected updates as one frame per room
     """
 
     def __init__(self):
-        connect_to_update_entity(self.on_update_entity)
+        self.tick = 0.05
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self.entity_seq = {}
+        self.pending = {}
+        self.pending_ingress = {}
+        self.rooms = {}
+        self.entity_rooms = {}
+        self.room_clients = {}
+        self.client_rooms = {}
+
+        self._lock = threading.Lock()
+        self._task = None
+
+        socketio.on_event('subscribe_entities', self.on_subscribe_entities)
+        socketio.on_client_disconnect(self.on_disconnect)
+
+
+    def init_app(self, app):
+        """Reads the emit configuration (app.config['SOCKETIO_EMIT']) and starts the emit task
+
+        Args:
+            app: The Flask app
+        Returns:
+            None
+        """
+
+        config = app.config.get('SOCKETIO_EMIT', {})
+        self.tick = config.get('tick_ms', 50) / 1000
+
+        if self.tick > 0 and self._task is None:
+            self._task = socketio.start_background_task(self.__emit_loop)
+            logger.info(f'Emitting entity updates every {self.tick * 1000:.0f} ms')
 
 
     def on_update_entity(self, sender, **kwargs):
         """Signal handler for update_entity signal
+            Stores the value and sequence number of the update for the next frame (stale updates are dropped)
 
         Args:
             sender: The sender of the signal
@@ -37,24 +104,175 @@ class SocketIoEmitter:
         try:
             entity_id = kwargs.get('entity_id')
             value = kwargs.get('value')
+            seq = kwargs.get('seq')
         except Exception as e:
             logger.error(f'Error getting required parameters: {e}')
             return
         else:
-            self.__emit_entity(entity_id, value)
+            with self._lock:
+                if entity_id not in self.entity_rooms:
+                    return
+                if seq is None:
+                    seq = self.seq + 1
+                elif seq <= self.entity_seq.get(entity_id, 0):
+                    return
+                self.seq = max(self.seq, seq)
+                self.entity_seq[entity_id] = seq
+                self.pending[entity_id] = value
+                if tracer.enabled:
+                    ingress = tracer.get_ingress()
+                    if ingress:
+                        self.pending_ingress.setdefault(entity_id, ingress)
+
+            if self.tick <= 0:
+                self.__emit_pending()
+
+
+    def on_subscribe_entities(self, data):
+        """Event handler for subscribe_entities event
+            Moves the client into the room of its set of entities and sends the snapshot
+
+        Args:
+            data: The event data ({'entity_ids': [...], 'epoch': str (optional), 'last_seq': int (optional)})
+        Returns:
+            None
+        """
+
+        try:
+            entity_ids = frozenset(str(entity_id) for entity_id in data.get('entity_ids'))
+            last_seq = data.get('last_seq')
+            if data.get('epoch') != self.epoch or not isinstance(last_seq, int):
+                last_seq = 0
+        except Exception as e:
+            logger.error(f'Error getting required parameters: {e}')
+            return
+
+        room = 'entities:' + hashlib.sha1('\n'.join(sorted(entity_ids)).encode()).hexdigest()[:16]
+        sid = request.sid
+
+        with self._lock:
+            if self.client_rooms.get(sid) != room:
+                self.__leave(sid)
+
+                if room not in self.rooms:
+                    self.rooms[room] = entity_ids
+                    self.room_clients[room] = set()
+                    for entity_id in entity_ids:
+                        if entity_id not in self.entity_rooms:
+                            self.entity_rooms[entity_id] = set()
+                            connect_to_update_entity(self.on_update_entity, entity_id=entity_id)
+                        self.entity_rooms[entity_id].add(room)
+                self.room_clients[room].add(sid)
+                self.client_rooms[sid] = room
+                join_room(room)
+
+            seq = self.seq
+            # entities without sequence number were not followed (maybe updated in the meantime), they are always sent
+            updated = [entity_id for entity_id in entity_ids if self.entity_seq.get(entity_id, last_seq + 1) > last_seq or last_seq == 0]
 
+        snapshot = self.__snapshot(updated)
+        emit('entity_snapshot_from_serv', {'epoch': self.epoch, 'seq': seq, 'entities': snapshot})
+        logger.debug(f'Client {sid} subscribed to {len(entity_ids)} entities (room {room}), sent {len(snapshot)} values since seq {last_seq}')
 
-    def __emit_entity(self, entity_id, value):
-        """Emits the entity update to all clients
+
+    def on_disconnect(self, *args):
+        """Event handler for disconnect event
+            Removes the client from its room
+
+        Args:
+            None
+        Returns:
+            None
+        """
+
+        with self._lock:
+            self.__leave(request.sid)
+
+
+    def __snapshot(self, entity_ids):
+        """Collects the current values of entities (served from the entity state cache), entities without a value are left out
+
+        Args:
+            entity_ids: The entity ids
+        Returns:
+            dict: The current value of each entity
+        """
+
+        snapshot = {}
+        for entity_id in entity_ids:
+            entity = get_entity(entity_id)
+            if entity is not None and entity.current_value is not None:
+                snapshot[entity_id] = entity.current_value
+        return snapshot
+
+
+    def __leave(self, sid):
+        """Removes a client from its room, rooms without clients are removed (must be called with the lock held)
+        """
+
+        room = self.client_rooms.pop(sid, None)
+        if room is None:
+            return
+
+        leave_room(room, sid=sid)
+        self.room_clients[room].discard(sid)
+        if len(self.room_clients[room]) == 0:
+            for entity_id in self.rooms[room]:
+                self.entity_rooms[entity_id].discard(room)
+                if len(self.entity_rooms[entity_id]) == 0:
+                    del self.entity_rooms[entity_id]
+                    self.entity_seq.pop(entity_id, None)
+                    disconnect_from_update_entity(self.on_update_entity, entity_id=entity_id)
+            del self.rooms[room]
+            del self.room_clients[room]
+
+
+    def __emit_loop(self):
+        """Background task emitting the collected updates every tick
+        """
+
+        while True:
+            socketio.sleep(self.tick)
+            try:
+                self.__emit_pending()
+            except Exception as e:
+                logger.error(f'Error emitting entity updates: {e}')
+
+
+    def __emit_pending(self):
+        """Emits the collected updates as one frame per room
 
         Args:
-            entity_id: The entity id
-            entity_info: The entity information
+            None
         Returns:
             None
         """
 
-        logger.debug(f'Emitting entity update: {entity_id} - {value}')
-        socketio.emit('entity_update_from_serv', {'entity_id': entity_id, 'value': value})
+        with self._lock:
+            if len(self.pending) == 0:
+                return
+            pending = self.pending
+            self.pending = {}
+            pending_ingress = self.pending_ingress
+            self.pending_ingress = {}
+            seq = self.seq
+
+            frames = {}
+            for entity_id, value in pending.items():
+                entity_seq = self.entity_seq.get(entity_id, seq)
+                for room in self.entity_rooms.get(entity_id, ()):
+                    frame = frames.get(room)
+                    if frame is None:
+                        frame = frames[room] = {'seq': seq, 'entities': {}, 'seqs': {}}
+                    frame['entities'][entity_id] = value
+                    frame['seqs'][entity_id] = entity_seq
+
+        started = tracer.start()
+        for room, frame in frames.items():
+            socketio.emit('entity_updates_from_serv', frame, to=room)
+        tracer.stop('ui.emit', started)
+        for ingress in pending_ingress.values():
+            tracer.stop_e2e('e2e.ui_emit', ingress)
+        logger.debug('Emitted %d entity updates in %d frame(s)', len(pending), len(frames))
 
-ui_io_emitter = SocketIoEmitter()
\ No newline at end of file
+ui_io_emitter = SocketIoEmitter()
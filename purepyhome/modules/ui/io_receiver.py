@@ -2,7 +2,10 @@ from purepyhome.core.socketio import socketio
 from purepyhome.core.core import update_entity
 from purepyhome.core.logger import get_module_logger
 
-import json
+from flask import request
+
+import threading
+import time
 
 logger = get_module_logger(__name__)
 
@@ -10,23 +13,58 @@ class SocketIoReceiver:
     """SocketIoReceiver class
         It handles the receiving of all updates to the entities from the socket io clients
         Likewise to the Emitter there is no need to register entities
+        The updates are coalesced per client and entity: the first update is committed directly and opens a window
+        of interval seconds, further updates inside the window replace the pending value, which is committed when
+        the window ends. So dragging a slider commits at most one value per interval (the latest one).
+        After a commit the client gets an ack (event: entity_ack_from_serv, data: {'entity_id', 'write_id', 'seq'})
+        with the sequence number the core assigned to this update (None if the core dropped or deferred it),
+        so the client can ignore the echo of its own update but not a later update of the entity (see SocketIoEmitter).
 
         Attributes:
-            None
+            interval: The coalescing window in seconds (0 commits every update directly)
+            pending: A dictionary that maps (session id, entity id) to the latest pending (value, write id)
+            window_end: A dictionary that maps (session id, entity id) to the end of the current window (monotonic time)
         Functions:
+            init_app: Reads the configuration
             on_update_entity: Event handler for update_entity event
-            __update_entity: Updates the entity in the database
+            on_disconnect: Event handler for disconnect event
+            stats: Returns the number of received, committed and coalesced updates
+            __flush: Commits the pending update of a client and entity when the window ends
+            __update_entity: Updates the entity in the database and sends the ack
     """
 
     def __init__(self):
+        self.interval = 0.1
+        self.pending = {}
+        self.window_end = {}
+
+        self._lock = threading.Lock()
+        self._received = 0
+        self._committed = 0
+        self._coalesced = 0
+
         socketio.on_event('update_entity_to_serv', self.on_update_entity)
+        socketio.on_client_disconnect(self.on_disconnect)
+
+
+    def init_app(self, app):
+        """Reads the receive configuration (app.config['SOCKETIO_RECEIVE'])
+
+        Args:
+            app: The Flask app
+        Returns:
+            None
+        """
+
+        config = app.config.get('SOCKETIO_RECEIVE', {})
+        self.interval = config.get('interval_ms', 100) / 1000
 
 
     def on_update_entity(self, data):
         """Event handler for update_entity event
 
         Args:
-            data: The event data
+            data: The event data ({'entity_id', 'value', 'write_id' (optional)})
         Returns:
             None
         """
@@ -34,24 +72,95 @@ class SocketIoReceiver:
         try:
             entity_id = data.get('entity_id')
             value = data.get('value')
+            write_id = data.get('write_id')
         except Exception as e:
             logger.error(f'Error getting required parameters: {e}')
             return
-        else:
-            self.__update_entity(entity_id, value)
 
+        sid = request.sid
+        key = (sid, entity_id)
+        self._received += 1
+
+        if self.interval > 0:
+            now = time.monotonic()
+            with self._lock:
+                if key in self.pending or now < self.window_end.get(key, 0.0):
+                    if key in self.pending:
+                        self._coalesced += 1
+                    else:
+                        socketio.start_background_task(self.__flush, key, self.window_end[key] - now)
+                    self.pending[key] = (value, write_id)
+                    return
+                self.window_end[key] = now + self.interval
+
+        self.__update_entity(sid, entity_id, value, write_id)
+
+
+    def on_disconnect(self, *args):
+        """Event handler for disconnect event
+            Removes the windows of the client (pending updates are still committed)
+
+        Args:
+            None
+        Returns:
+            None
+        """
+
+        sid = request.sid
+        with self._lock:
+            for key in [key for key in self.window_end if key[0] == sid]:
+                del self.window_end[key]
+
+
+    def stats(self) -> dict:
+        """Returns the number of received, committed and coalesced (merged) updates
+
+        Args:
+            None
+        Returns:
+            dict: received, committed, coalesced and pending counts
+        """
+
+        return {'received': self._received, 'committed': self._committed, 'coalesced': self._coalesced, 'pending': len(self.pending)}
+
+
+    def __flush(self, key, delay):
+        """Commits the pending update of a client and entity when the window ends and opens the next window
+            (runs as background task)
+        """
+
+        socketio.sleep(delay)
+        with self._lock:
+            update = self.pending.pop(key, None)
+            if update is None:
+                return
+            if key in self.window_end:
+                self.window_end[key] = time.monotonic() + self.interval
+
+        sid, entity_id = key
+        value, write_id = update
+        try:
+            self.__update_entity(sid, entity_id, value, write_id)
+        except Exception as e:
+            logger.error(f'Error committing coalesced update of entity {entity_id}: {e}')
 
-    def __update_entity(self, entity_id, value):
-        """Updates the entity in the database
+
+    def __update_entity(self, sid, entity_id, value, write_id):
+        """Updates the entity in the database and sends the ack to the client
 
         Args:
+            sid: The session id of the client
             entity_id: The entity id
             value: The new value
+            write_id: The id the client gave the update
         Returns:
             None
         """
 
-        logger.debug(f'Updating entity: {entity_id} - {value}')
-        update_entity("__name__", entity_id, value, [])
+        logger.debug('Updating entity: %s - %s', entity_id, value)
+        seq = update_entity(__name__, entity_id, value, [])
+        self._committed += 1
+
+        socketio.emit('entity_ack_from_serv', {'entity_id': entity_id, 'write_id': write_id, 'seq': seq}, to=sid)
 
-ui_io_receiver = SocketIoReceiver()
\ No newline at end of file
+ui_io_receiver = SocketIoReceiver()
@@ -5,6 +5,8 @@ from purepyhome.core.db.entity_db import entity_db
 from purepyhome.core.mqtt import mqtt
 from purepyhome.core.socketio import socketio
 from purepyhome.core.logger import setup_logger, get_logger
+from purepyhome.core.tracing import tracer
+from purepyhome.core.signals.update_entity import init_update_entity
 
 from purepyhome.core.core import create_entity
 from purepyhome.core.data_types.creation_info import EntityCreationInfo, EntityDataSinkInfo, EntityDataSourceInfo
@@ -16,9 +18,14 @@ from purepyhome.modules.ui.io_receiver import ui_io_receiver
 from purepyhome.modules.actions.actions_manager import actions_manager
 
 from purepyhome.web.flask.ui_blueprints import ui_blueprints
+from purepyhome.web.flask.metrics_blueprints import metrics_blueprints
+from purepyhome.web.flask.layout_cache import layout_cache
+from purepyhome.web.flask.static_files import precompress_static_files, send_static_file, static_url
+from purepyhome.web.flask.icon_sprite import icon_sprite
 
 from flask import Flask
 
+import os
 import yaml
 
 logger = get_logger()
@@ -44,6 +51,7 @@ def configure_app(app, config_path='./config.yaml'):
 
     # Parse config file
     try:
+        app.config['CONFIG_PATH'] = config_path
         app.config['DEBUG'] = True
         app.config['SECRET'] = 'my secret key'
 
@@ -53,17 +61,56 @@ def configure_app(app, config_path='./config.yaml'):
         app.config['MQTT_PASSWORD']     = config['mqtt']['password']
         app.config['MQTT_KEEPALIVE']    = config['mqtt']['keepalive']
         app.config['MQTT_TLS_ENABLED']  = config['mqtt']['tls_enabled']
+        app.config['MQTT_INGEST']       = config['mqtt'].get('ingest', {})
 
-        app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:///:memory:"
-        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        configure_database(app, config.get('database', {}))
+
+        app.config['SOCKETIO_EMIT']  = config.get('socketio', {}).get('emit', {})
+        app.config['SOCKETIO_RECEIVE'] = config.get('socketio', {}).get('receive', {})
+
+        app.config['LOGGING']        = config.get('logging', {})
+        app.config['TRACING']        = config.get('tracing', {})
+        app.config['SIGNAL_DISPATCH'] = config.get('dispatch', {})
 
         app.config['UI_PAGES']       = config['ui']
 
+        app.config['STATIC_MAX_AGE']    = config.get('web', {}).get('static_max_age', 2592000)
+        app.config['STATIC_PRECOMPRESS'] = config.get('web', {}).get('precompress', True)
+
         app.config['ENTITIES']       = config['entities']
     except Exception as e:
         logger.error(f'Error reading values from config: {e}')
 
 
+def configure_database(app, db_config):
+    """ Configure the database from the database section of the configuration file
+        Without a database section an in-memory database is used, which is reset on every start.
+
+    Args:
+        app (Flask): The Flask app object
+        db_config (dict): The database configuration
+    Returns:
+        None
+    """
+
+    uri = db_config.get('uri', 'sqlite:///:memory:')
+
+    # relative SQLite paths are relative to the working directory (like all other paths in the config)
+    if uri.startswith('sqlite:///') and uri != 'sqlite:///:memory:':
+        path = os.path.abspath(uri[len('sqlite:///'):])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        uri = 'sqlite:///' + path
+
+        # one pool of connections shared by all threads (the connections are only used by one thread at a time)
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_size': db_config.get('pool_size', 5),
+                                                   'connect_args': {'check_same_thread': False}}
+        app.config['SQLITE_PRAGMAS'] = db_config.get('pragmas', {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'mmap_size': 268435456})
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['DATABASE_RESET'] = db_config.get('reset', uri == 'sqlite:///:memory:')
+
+
 def setup_blueprints(app):
     """ Setup the templates
 
@@ -74,6 +121,34 @@ def setup_blueprints(app):
     """
 
     app.register_blueprint(ui_blueprints)
+    app.register_blueprint(metrics_blueprints)
+
+    # parse the dashboard layouts once at startup (reloaded by the layout cache when a file changes)
+    for page, page_config in app.config['UI_PAGES'].items():
+        if page_config['type'] == 'dashboard':
+            try:
+                layout_cache.load(page_config['layout'])
+            except Exception as e:
+                logger.error(f'Error loading layout of page {page}: {e}')
+
+
+def setup_static_files(app):
+    """ Setup the serving of the static files: content hashed URLs with long-lived cache headers and precompressed variants,
+        and the icon sprite with the icons referenced by the config
+
+    Args:
+        app (Flask): The Flask app object
+    Returns:
+        None
+    """
+
+    app.view_functions['static'] = send_static_file
+    app.jinja_env.globals['static_url'] = static_url
+
+    if app.config['STATIC_PRECOMPRESS']:
+        precompress_static_files(app.static_folder)
+
+    icon_sprite.init_app(app, app.config['CONFIG_PATH'])
 
 
 def setup_db(app):
@@ -85,11 +160,17 @@ def setup_db(app):
         None
     """
 
-    # Drop all tables and create new ones
+    # Create the missing tables (the existing tables and their data are kept, unless a reset is configured)
     with app.app_context():
-        db.drop_all()
+        if app.config['DATABASE_RESET']:
+            db.drop_all()
         db.create_all()  
 
+        # create_all skips existing tables, so indexes added to the models later are created here
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(db.engine, checkfirst=True)
+
 
 def setup_entities(app):
     """ Setup the entities reads all entity yaml files and registers the entities via the signal
@@ -145,7 +226,7 @@ def setup_entities(app):
                     creation_info.data_source = EntityDataSourceInfo(
                         source_type=data_source_type,
                         source_info=entity['data_source'][data_source_type],
-                        converter_name="",
+                        converter_name="none",
                         converter_info={}
                     )
                     if 'converter_name' in entity['data_source'][data_source_type]:
@@ -156,7 +237,7 @@ def setup_entities(app):
                     creation_info.data_source = EntityDataSourceInfo(
                         source_type='none',
                         source_info=None,
-                        converter_name="",
+                        converter_name="none",
                         converter_info={}
                     )
 
@@ -166,6 +247,12 @@ def setup_entities(app):
                 if 'actions' in entity:
                     creation_info.actions = entity['actions']
 
+                if 'coalesce_ms' in entity:
+                    creation_info.coalesce_ms = entity['coalesce_ms']
+
+                if 'min_delta' in entity:
+                    creation_info.min_delta = entity['min_delta']
+
                 create_entity(creation_info)
 
 
@@ -184,11 +271,22 @@ def init_app(debug=False):
 
     configure_app(app)
 
+    try:
+        setup_logger(app.config.get('LOGGING'))
+    except ValueError as e:
+        logger.error(f'Error setting up logging: {e}')
+
+    tracer.init_app(app)
+    init_update_entity(app)
+
     db.init_app(app)
     mqtt.init_app(app)
     socketio.init_app(app)
 
     entity_db.init_app(app)
+    mqtt_subscriber.init_app(app)
+    ui_io_emitter.init_app(app)
+    ui_io_receiver.init_app(app)
 
     setup_db(app)
 
@@ -197,6 +295,8 @@ def init_app(debug=False):
     entity_db.dbg_printout_db()
 
     setup_blueprints(app)
+
+    setup_static_files(app)
     
     return app
 
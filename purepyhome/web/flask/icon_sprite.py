@@ -0,0 +1,239 @@
+from purepyhome.core.logger import get_logger
+from purepyhome.web.flask.layout_cache import layout_cache
+
+from flask import request, make_response, redirect
+
+import gzip
+import hashlib
+import os
+import re
+import sys
+import threading
+
+logger = get_logger()
+
+"""This file provides the icon sprite of the UI
+    The config file and the dashboard layouts are scanned for icon references (MD::<name>, CSS::<class>).
+    The SVGs of the referenced material symbols (rounded, weight 400) are combined into a single SVG sprite
+    of <symbol id="md-<name>"> elements, which is served under a content hashed URL with immutable cache headers.
+    So the browser loads one small file instead of the material symbols font, and the image does not need the
+    material symbols tree except the svg/400/rounded folder.
+    The CSS:: icons are classes of css/css-symbols.css and are not part of the sprite.
+    When the layout cache parses a modified layout again, the sprite is rebuilt (with a new version and URL if it changed).
+
+    Usage as build step (from the repository root):
+        python -m purepyhome.web.flask.icon_sprite [config.yaml] [output.svg]
+"""
+
+ICON_REFERENCE_PATTERN = re.compile(r'\b(MD|CSS)::([A-Za-z0-9_-]+)')
+SVG_PATTERN = re.compile(r'<svg\b[^>]*\bviewBox="([^"]+)"[^>]*>(.*)</svg>', re.DOTALL)
+
+MD_ICON_FOLDER = os.path.join('material-symbols-main', 'svg', '400', 'rounded')     # relative to the static folder
+SPRITE_MAX_AGE = 31536000
+
+
+def scan_icon_references(paths: list) -> dict:
+    """Collects the icon references (MD::<name>, CSS::<class>) of the config files
+
+    Args:
+        paths (list): The paths of the config and layout files (files that cannot be read are skipped)
+    Returns:
+        dict: prefix ('MD', 'CSS') -> set of icon names
+    """
+
+    references = {'MD': set(), 'CSS': set()}
+    for path in paths:
+        try:
+            with open(path, 'r') as f:
+                text = f.read()
+        except OSError as e:
+            logger.error(f'Error scanning {path} for icons: {e}')
+            continue
+
+        for prefix, name in ICON_REFERENCE_PATTERN.findall(text):
+            references[prefix].add(name)
+    return references
+
+
+def build_icon_sprite(names, icon_folder: str) -> tuple:
+    """Combines the SVGs of the icons into a sprite of <symbol> elements
+
+    Args:
+        names: The icon names (the file names in icon_folder without .svg)
+        icon_folder (str): The folder with the icon SVGs
+    Returns:
+        tuple: (sprite (bytes), the names of the missing icons (list))
+    """
+
+    symbols = []
+    missing = []
+    for name in sorted(names):
+        try:
+            with open(os.path.join(icon_folder, name + '.svg'), 'r') as f:
+                match = SVG_PATTERN.search(f.read())
+        except OSError:
+            match = None
+
+        if match is None:
+            missing.append(name)
+            continue
+        symbols.append(f'<symbol id="md-{name}" viewBox="{match.group(1)}">{match.group(2)}</symbol>')
+
+    sprite = '<svg xmlns="http://www.w3.org/2000/svg">' + ''.join(symbols) + '</svg>'
+    return sprite.encode(), missing
+
+
+class IconSprite:
+    """IconSprite class
+        It keeps the icon sprite of the UI and serves it
+
+        Attributes:
+            svg: The sprite
+            gzipped: The gzip compressed sprite
+            version: The content hash of the sprite (part of its URL)
+            icons: The names of the icons in the sprite
+            missing: The referenced icons that were not found
+            paths: The scanned files (the config file and the dashboard layouts)
+            icon_folder: The folder with the icon SVGs
+
+        Functions:
+            init_app: Builds the sprite from the config file and the layouts and registers its URL
+            build: Builds the sprite from the scanned files
+            on_layout_reload: Rebuilds the sprite when a layout was modified
+            url: Returns the URL of the sprite
+            send: View function serving the sprite
+    """
+
+    def __init__(self):
+        self.svg = b''
+        self.gzipped = b''
+        self.version = ''
+        self.icons = []
+        self.missing = []
+        self.paths = []
+        self.icon_folder = None
+
+        self._app = None
+        self._lock = threading.Lock()
+
+
+    def init_app(self, app, config_path: str):
+        """Builds the sprite from the icons referenced in the config file and the dashboard layouts
+            and registers its URL (/icons/sprite-<version>.svg) and the template global icon_sprite_url
+
+        Args:
+            app: The Flask app
+            config_path (str): The path of the config file
+        Returns:
+            None
+        """
+
+        self._app = app
+        self.paths = [config_path] + [page['layout'] for page in app.config['UI_PAGES'].values() if page['type'] == 'dashboard']
+        self.icon_folder = os.path.join(app.static_folder, MD_ICON_FOLDER)
+        self.build()
+
+        app.add_url_rule('/icons/sprite-<version>.svg', 'icon_sprite', self.send)
+        layout_cache.add_reload_listener(self.on_layout_reload)
+
+
+    def build(self) -> bool:
+        """Builds the sprite from the icons referenced in the scanned files and sets the template global icon_sprite_url
+
+        Args:
+            None
+        Returns:
+            bool: True if the sprite changed (new version)
+        """
+
+        references = scan_icon_references(self.paths)
+        svg, missing = build_icon_sprite(references['MD'], self.icon_folder)
+        version = hashlib.sha1(svg).hexdigest()[:12]
+
+        with self._lock:
+            if version == self.version:
+                return False
+            self.svg, self.missing = svg, missing
+            self.gzipped = gzip.compress(svg, compresslevel=9, mtime=0)
+            self.icons = sorted(references['MD'] - set(missing))
+            self.version = version
+            self._app.jinja_env.globals['icon_sprite_url'] = self.url()
+
+        for name in missing:
+            logger.warning(f'Icon MD::{name} not found in {MD_ICON_FOLDER}')
+        logger.info(f'Built icon sprite with {len(self.icons)} icon(s) ({len(svg)} bytes)')
+        return True
+
+
+    def on_layout_reload(self, path: str) -> None:
+        """Rebuilds the sprite when a layout was parsed again, the cached pages are dropped if the sprite URL changed
+
+        Args:
+            path (str): The path of the reloaded layout
+        Returns:
+            None
+        """
+
+        if path in self.paths and self.build():
+            layout_cache.clear_rendered()
+
+
+    def url(self) -> str:
+        """Returns the URL of the sprite (changes with its content)
+        """
+
+        return f'/icons/sprite-{self.version}.svg'
+
+
+    def send(self, version: str):
+        """View function serving the sprite (an outdated version is redirected to the current one)
+
+        Args:
+            version (str): The requested version
+        Returns:
+            Response: The sprite
+        """
+
+        if version != self.version:
+            response = redirect(self.url())
+            response.cache_control.no_cache = True
+            return response
+
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response = make_response(self.gzipped)
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = make_response(self.svg)
+        response.mimetype = 'image/svg+xml'
+        response.vary.add('Accept-Encoding')
+        response.set_etag(self.version)
+        response.cache_control.public = True
+        response.cache_control.max_age = SPRITE_MAX_AGE
+        response.cache_control.immutable = True
+        return response.make_conditional(request)
+
+
+icon_sprite = IconSprite()
+
+
+if __name__ == '__main__':
+    import yaml
+
+    config_path = sys.argv[1] if len(sys.argv) > 1 else './config.yaml'
+    output_path = sys.argv[2] if len(sys.argv) > 2 else None
+
+    with open(config_path, 'r') as f:
+        pages = yaml.safe_load(f.read())['ui']
+    references = scan_icon_references([config_path] + [page['layout'] for page in pages.values() if page['type'] == 'dashboard'])
+
+    static_folder = os.path.join(os.path.dirname(__file__), '..', 'static')
+    sprite, missing = build_icon_sprite(references['MD'], os.path.join(static_folder, MD_ICON_FOLDER))
+
+    print(f'MD icons: {sorted(references["MD"])}, missing: {missing}')
+    print(f'CSS icons: {sorted(references["CSS"])}')
+    print(f'sprite: {len(sprite)} bytes')
+    if output_path:
+        with open(output_path, 'wb') as f:
+            f.write(sprite)
+    if missing:
+        sys.exit(1)
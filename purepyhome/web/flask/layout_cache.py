@@ -0,0 +1,159 @@
+from purepyhome.core.logger import get_logger
+
+from dataclasses import dataclass, field
+
+import hashlib
+import os
+import threading
+import yaml
+
+logger = get_logger()
+
+"""This file provides the cache of the dashboard layouts
+    The layout files are parsed once and only reloaded when their modification time changes.
+    The rendered HTML of a page is cached with the layout (together with its ETag), so it is only rendered again
+    after the layout file was changed.
+    The binding table (entity id -> widgets showing it) is built with the layout and rendered into the page as JSON,
+    so the dashboard does not need to search the DOM for the widgets of an entity on every update.
+    Functions registered with add_reload_listener are called when a modified layout file was parsed again
+    (eg. the icon sprite is rebuilt with the icons of the new layout).
+"""
+
+@dataclass
+class CachedLayout:
+    path: str                           # the path of the layout file
+    mtime: float                        # the modification time of the file when it was parsed
+    layout: list                        # the parsed layout
+    entity_ids: list                    # the ids of all entities shown on the layout
+    bindings: dict                      # entity id -> list of widget descriptors (see layout_bindings)
+    rendered: dict = field(default_factory=dict)  # page -> (html, etag)
+
+
+class LayoutCache:
+    """LayoutCache class
+        It keeps the parsed layouts and the rendered pages
+
+        Attributes:
+            entries: A dictionary that maps layout file paths to CachedLayout objects
+            reload_listeners: Functions called with the path of a layout file after it was parsed again
+
+        Functions:
+            load: Gets a layout, parsing the file if it is new or was modified
+            render: Gets the rendered HTML and ETag of a page, rendering it if needed
+            add_reload_listener: Registers a function called after a modified layout file was parsed again
+            clear_rendered: Drops the rendered pages of all layouts
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.reload_listeners = []
+        self._lock = threading.Lock()
+
+
+    def load(self, path: str) -> CachedLayout:
+        """Gets a layout, parsing the file if it is not cached or its modification time changed
+
+        Args:
+            path (str): The path of the layout file
+        Returns:
+            CachedLayout: The cached layout
+        Raises:
+            OSError, yaml.YAMLError: If the file cannot be read or parsed
+        """
+
+        mtime = os.stat(path).st_mtime
+        entry = self.entries.get(path)
+        if entry is not None and entry.mtime == mtime:
+            return entry
+
+        with open(path, 'r') as f:
+            layout = yaml.safe_load(f.read())
+
+        bindings = layout_bindings(layout)
+        entry = CachedLayout(path=path, mtime=mtime, layout=layout, entity_ids=sorted(bindings), bindings=bindings)
+        with self._lock:
+            reloaded = path in self.entries
+            self.entries[path] = entry
+
+        if reloaded:
+            for listener in self.reload_listeners:
+                try:
+                    listener(path)
+                except Exception as e:
+                    logger.error(f'Error handling the reload of layout {path}: {e}')
+        return entry
+
+
+    def add_reload_listener(self, listener) -> None:
+        """Registers a function that is called with the path of a layout file after the modified file was parsed again
+
+        Args:
+            listener: The function
+        Returns:
+            None
+        """
+
+        self.reload_listeners.append(listener)
+
+
+    def clear_rendered(self) -> None:
+        """Drops the rendered pages of all layouts (eg. when a value used by the templates changed)
+        """
+
+        with self._lock:
+            for entry in self.entries.values():
+                entry.rendered = {}
+
+
+    def render(self, page: str, path: str, render) -> tuple:
+        """Gets the rendered HTML of a page (rendered again if the layout file was modified)
+
+        Args:
+            page (str): The name of the page
+            path (str): The path of the layout file
+            render: Function called with the CachedLayout that returns the HTML
+        Returns:
+            tuple: (html, etag)
+        """
+
+        entry = self.load(path)
+        rendered = entry.rendered.get(page)
+        if rendered is None:
+            html = render(entry)
+            rendered = (html, hashlib.sha1(html.encode()).hexdigest())
+            entry.rendered[page] = rendered
+        return rendered
+
+
+WIDGET_BINDING_KEYS = ('min', 'max', 'payload_on', 'payload_off')
+
+
+def layout_bindings(layout) -> dict:
+    """Builds the binding table of a dashboard layout: the widgets showing each entity (components with a 'data' key)
+            eg. {'buero.light.state': [{'type': 'mini-card', 'id': 'mini-card4', 'payload_on': 'on', 'payload_off': 'off'}]}
+
+    Args:
+        layout: The parsed layout
+    Returns:
+        dict: entity id -> list of widget descriptors (type, id and the min/max/payload settings of the widget), in layout order
+    """
+
+    bindings = {}
+    stack = [layout]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            for widget_type, widget in node.items():
+                if isinstance(widget, dict) and isinstance(widget.get('data'), str):
+                    descriptor = {'type': widget_type, 'id': widget.get('id')}
+                    for key in WIDGET_BINDING_KEYS:
+                        if key in widget:
+                            descriptor[key] = widget[key]
+                    bindings.setdefault(widget['data'], []).append(descriptor)
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+    return bindings
+
+
+layout_cache = LayoutCache()
@@ -0,0 +1,110 @@
+# Flask modules
+from flask import Blueprint, render_template, make_response
+
+from purepyhome.core.tracing import tracer
+from purepyhome.core.core import update_coalescer
+from purepyhome.core.signals.update_entity import _update_entity
+from purepyhome.core.db.entity_db import entity_db
+from purepyhome.modules.mqtt.mqtt_subscriber import mqtt_subscriber
+from purepyhome.modules.ui.io_receiver import ui_io_receiver
+
+metrics_blueprints = Blueprint('metrics', __name__)
+
+"""This file provides the metrics endpoints
+    /metrics: the stage latencies and the counters of the ingest queue, the update coalescer, the UI receiver, the receiver pool and the state cache
+              in the Prometheus text format
+    /debug/latency: the same values as HTML page
+"""
+
+
+def collect_counters() -> dict:
+    """Collects the counters of the ingest queue, the update coalescer, the UI receiver, the receiver pool and the state cache
+
+    Args:
+        None
+    Returns:
+        dict: section -> {name: value} (sections without data are left out)
+    """
+
+    counters = {'coalescer': update_coalescer.stats(), 'ui_receive': ui_io_receiver.stats()}
+    if mqtt_subscriber.ingest_queue is not None:
+        counters['ingest'] = mqtt_subscriber.ingest_queue.metrics()
+    if _update_entity.pool is not None:
+        counters['dispatch'] = _update_entity.pool.stats()
+    if entity_db.state_cache is not None:
+        counters['state_cache'] = entity_db.state_cache.stats()
+    return counters
+
+
+def prometheus_text() -> str:
+    """Builds the Prometheus text exposition of the metrics
+
+    Args:
+        None
+    Returns:
+        str: The metrics in the Prometheus text format (version 0.0.4)
+    """
+
+    lines = tracer.prometheus_lines()
+    counters = collect_counters()
+
+    coalescer = counters['coalescer']
+    lines += ['# HELP purepyhome_coalescer_updates_total Updates merged (coalesced) or dropped (suppressed) by the update coalescer',
+              '# TYPE purepyhome_coalescer_updates_total counter',
+              f'purepyhome_coalescer_updates_total{{result="coalesced"}} {coalescer["coalesced"]}',
+              f'purepyhome_coalescer_updates_total{{result="suppressed"}} {coalescer["suppressed"]}',
+              '# HELP purepyhome_coalescer_pending Updates waiting for the end of their coalescing window',
+              '# TYPE purepyhome_coalescer_pending gauge',
+              f'purepyhome_coalescer_pending {coalescer["pending"]}']
+
+    ui_receive = counters['ui_receive']
+    lines += ['# HELP purepyhome_ui_updates_total Entity updates received from the UI clients by their outcome',
+              '# TYPE purepyhome_ui_updates_total counter']
+    for result in ('received', 'committed', 'coalesced'):
+        lines.append(f'purepyhome_ui_updates_total{{result="{result}"}} {ui_receive[result]}')
+
+    dispatch = counters.get('dispatch')
+    if dispatch is not None:
+        lines += ['# HELP purepyhome_dispatch_calls_total Calls of the update receivers on the receiver pool by their outcome',
+                  '# TYPE purepyhome_dispatch_calls_total counter',
+                  f'purepyhome_dispatch_calls_total{{result="all"}} {dispatch["calls"]}',
+                  f'purepyhome_dispatch_calls_total{{result="error"}} {dispatch["errors"]}',
+                  f'purepyhome_dispatch_calls_total{{result="timeout"}} {dispatch["timeouts"]}']
+
+    ingest = counters.get('ingest')
+    if ingest is not None:
+        lines += ['# HELP purepyhome_ingest_queue_depth Messages waiting in the MQTT ingest queue',
+                  '# TYPE purepyhome_ingest_queue_depth gauge',
+                  f'purepyhome_ingest_queue_depth {ingest["depth"]}',
+                  '# HELP purepyhome_ingest_messages_total MQTT messages by their outcome in the ingest queue',
+                  '# TYPE purepyhome_ingest_messages_total counter']
+        for result in ('received', 'processed', 'failed', 'dropped', 'coalesced', 'blocked'):
+            lines.append(f'purepyhome_ingest_messages_total{{result="{result}"}} {ingest[result]}')
+
+    state_cache = counters.get('state_cache')
+    if state_cache is not None:
+        lines += ['# HELP purepyhome_state_cache_lookups_total Lookups of the entity state cache',
+                  '# TYPE purepyhome_state_cache_lookups_total counter',
+                  f'purepyhome_state_cache_lookups_total{{result="hit"}} {state_cache["hits"]}',
+                  f'purepyhome_state_cache_lookups_total{{result="miss"}} {state_cache["misses"]}']
+
+    return '\n'.join(lines) + '\n'
+
+
+@metrics_blueprints.route('/metrics')
+def metrics():
+    response = make_response(prometheus_text())
+    response.mimetype = 'text/plain'
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    response.cache_control.no_store = True
+    return response
+
+
+@metrics_blueprints.route('/debug/latency')
+def debug_latency():
+    response = make_response(render_template('debug_latency.html',
+                                             tracing_enabled=tracer.enabled,
+                                             stages=tracer.snapshot(),
+                                             counters=collect_counters()))
+    response.cache_control.no_store = True
+    return response
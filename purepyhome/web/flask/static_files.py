@@ -0,0 +1,165 @@
+from purepyhome.core.logger import get_logger
+
+from flask import current_app, request, send_from_directory
+
+import gzip
+import hashlib
+import mimetypes
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = get_logger()
+
+"""This file provides the serving of the static files
+    Text assets (js, css, ...) are precompressed once at startup (.gz, and .br if brotli is installed)
+    and the compressed variant is served to clients that accept it (by the q-values of Accept-Encoding).
+    The templates link the assets with static_url, which appends the content hash (?v=<hash>). Only these versioned
+    URLs are served with long-lived cache headers (STATIC_MAX_AGE), all other requests are served with no-cache
+    and an ETag, so the browser revalidates them and gets a changed file right away.
+"""
+
+PRECOMPRESS_EXTENSIONS = ('.js', '.mjs', '.css', '.html', '.json')
+PRECOMPRESS_MIN_SIZE = 1024
+
+# folders that are not precompressed (the material symbols svg folder alone holds >100k files)
+PRECOMPRESS_EXCLUDE = ('material-symbols-main/svg',)
+
+
+def precompress_static_files(static_folder: str) -> int:
+    """Writes the .gz (and .br) variants of the text assets that are missing or older than the asset
+
+    Args:
+        static_folder (str): The static folder of the app
+    Returns:
+        int: The number of written files
+    """
+
+    written = 0
+    for dirpath, dirnames, filenames in os.walk(static_folder):
+        relpath = os.path.relpath(dirpath, static_folder)
+        dirnames[:] = [d for d in dirnames if os.path.normpath(os.path.join(relpath, d)) not in PRECOMPRESS_EXCLUDE]
+
+        for filename in filenames:
+            if not filename.endswith(PRECOMPRESS_EXTENSIONS):
+                continue
+            path = os.path.join(dirpath, filename)
+            stat = os.stat(path)
+            if stat.st_size < PRECOMPRESS_MIN_SIZE:
+                continue
+
+            variants = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                variants.append(('.br', lambda data: brotli.compress(data, quality=11)))
+
+            data = None
+            for suffix, compress in variants:
+                target = path + suffix
+                if os.path.exists(target) and os.stat(target).st_mtime >= stat.st_mtime:
+                    continue
+                if data is None:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                with open(target, 'wb') as f:
+                    f.write(compress(data))
+                written += 1
+
+    logger.info(f'Precompressed {written} static file variant(s) in {static_folder}')
+    return written
+
+
+_static_versions = {}     # path -> (mtime, size, content hash)
+
+
+def static_version(filename: str) -> str:
+    """Returns the content hash of a static file (cached until the file changes)
+
+    Args:
+        filename (str): The file (relative to the static folder)
+    Returns:
+        str: The first 12 hex digits of the sha1 of the file, '' if the file does not exist
+    """
+
+    path = os.path.join(current_app.static_folder, filename)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return ''
+
+    cached = _static_versions.get(path)
+    if cached is not None and cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+        return cached[2]
+
+    with open(path, 'rb') as f:
+        version = hashlib.sha1(f.read()).hexdigest()[:12]
+    _static_versions[path] = (stat.st_mtime, stat.st_size, version)
+    return version
+
+
+def static_url(filename: str) -> str:
+    """Template function returning the versioned URL of a static file (/<filename>?v=<content hash>)
+
+    Args:
+        filename (str): The file (relative to the static folder)
+    Returns:
+        str: The URL
+    """
+
+    filename = filename.lstrip('/')
+    version = static_version(filename)
+    return f'/{filename}?v={version}' if version else f'/{filename}'
+
+
+def _preferred_encodings(filename: str) -> list:
+    """Returns the precompressed variants the client accepts, the highest q-value first (br before gzip on a tie)
+    """
+
+    if not filename.endswith(PRECOMPRESS_EXTENSIONS):
+        return []
+
+    accepted = request.accept_encodings
+    encodings = [(accepted[encoding], -index, encoding, suffix)
+                 for index, (encoding, suffix) in enumerate((('br', '.br'), ('gzip', '.gz')))]
+    return [(encoding, suffix) for quality, _, encoding, suffix in sorted(encodings, reverse=True) if quality > 0]
+
+
+def send_static_file(filename: str):
+    """View function for the static files (replaces the Flask static view)
+        Serves the precompressed variant of a file if the client accepts it.
+        Requests with the current content hash (?v=) are cached long, all others are revalidated (no-cache + ETag).
+
+    Args:
+        filename (str): The requested file (relative to the static folder)
+    Returns:
+        Response: The file response
+    """
+
+    static_folder = current_app.static_folder
+    version = request.args.get('v')
+    versioned = version is not None and version != '' and version == static_version(filename)
+    max_age = current_app.config.get('STATIC_MAX_AGE') if versioned else 0
+
+    response = None
+    for encoding, suffix in _preferred_encodings(filename):
+        if not os.path.isfile(os.path.join(static_folder, filename + suffix)):
+            continue
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_from_directory(static_folder, filename + suffix, mimetype=mimetype, max_age=max_age)
+        response.headers['Content-Encoding'] = encoding
+        break
+
+    if response is None:
+        response = send_from_directory(static_folder, filename, max_age=max_age)
+
+    if filename.endswith(PRECOMPRESS_EXTENSIONS):
+        response.vary.add('Accept-Encoding')
+    if versioned:
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.max_age = None
+        response.cache_control.no_cache = True
+    return response
@@ -1,6 +1,7 @@
 # Flask modules
-from flask import Blueprint, redirect, url_for, render_template, flash, current_app, flash
-import yaml
+from flask import Blueprint, redirect, url_for, render_template, flash, current_app, flash, make_response, request
+
+from purepyhome.web.flask.layout_cache import layout_cache
 
 ui_blueprints = Blueprint('dashboard', __name__, url_prefix='/ui')
 
@@ -19,7 +20,7 @@ def ui(page=None):
         if pages[page]['type'] == 'iframe':
             return iframe(pages[page]['url'])
         elif pages[page]['type'] == 'dashboard':
-            return dashboard(pages[page]['layout'])
+            return dashboard(page, pages[page]['layout'])
         else:
             not_found(page)
 
@@ -32,14 +33,16 @@ def not_found(page):
 def iframe(url):
     return render_template('iframe.html', page=url)
 
-def dashboard(layout_path):
+def dashboard(page, layout_path):
     try:
-        with open(layout_path, 'r') as f:
-            layout_raw = f.read()
-            layout = yaml.safe_load(layout_raw)
+        html, etag = layout_cache.render(page, layout_path, lambda entry: render_template('dashboard.html', layout=entry.layout, bindings=entry.bindings))
     except Exception as e:
         error_message = f'Error reading file: {e}'
         current_app.logger.error(error_message)
         return render_template('error.html', error_message=error_message)
-    
-    return render_template('dashboard.html', layout=layout)
\ No newline at end of file
+
+    # the browser revalidates the page with its ETag and gets a 304 as long as the layout is unchanged
+    response = make_response(html)
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)